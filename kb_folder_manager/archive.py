@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import datetime as _dt
+import hashlib
+import heapq
+import json
+import os
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import profiling
+from .config import ARCHIVE_FORMATS
+from .index_model import CompactIndex
+from .utils import Logger, to_extended_path, write_json
+
+ARCHIVE_MANIFEST_NAME = '.kb_archive.json'
+SEVEN_ZIP_NAMES = ('7z', '7za', '7zz')
+VOLUME_PREFIX = 'part-'
+_TAR_MODES = {'tar': 'w', 'tar.gz': 'w:gz', 'tar.xz': 'w:xz'}
+_CHUNK = 1024 * 1024
+
+
+@dataclass
+class ArchiveVolume:
+    name: str
+    members: list[str] = field(default_factory=list)
+    bytes: int = 0
+
+
+def find_7zip() -> str | None:
+    import shutil
+    for name in SEVEN_ZIP_NAMES:
+        found = shutil.which(name)
+        if found:
+            return found
+    if os.name == 'nt':
+        for base in (os.environ.get('ProgramFiles'), os.environ.get('ProgramFiles(x86)')):
+            if base and os.path.isfile(os.path.join(base, '7-Zip', '7z.exe')):
+                return os.path.join(base, '7-Zip', '7z.exe')
+    return None
+
+
+def _suffix_key(rel_path: str) -> tuple[str, str]:
+    name = rel_path.rpartition('/')[2]
+    dot = name.rfind('.')
+    return (name[dot:].lower() if dot > 0 else '', rel_path)
+
+
+def plan_volumes(files: Mapping, volume_bytes: int, extension: str) -> list[ArchiveVolume]:
+    """Shard files into size-balanced volumes.
+
+    The volume count is the total size divided by ``volume_bytes``; files
+    are placed largest first onto the lightest volume so parallel writers
+    finish together. Within a volume members are ordered by extension and
+    path, which keeps similar content adjacent in solid archives.
+    """
+    sizes = [(entry.get('size') or 0, rel_path) for rel_path, entry in files.items()]
+    if not sizes:
+        return []
+    total = sum(size for size, _ in sizes)
+    count = min(len(sizes), max(1, -(-total // max(1, volume_bytes))))
+    volumes = [ArchiveVolume(f'{VOLUME_PREFIX}{i + 1:04d}{extension}') for i in range(count)]
+    heap = [(0, i) for i in range(count)]
+    for size, rel_path in sorted(sizes, key=lambda item: (-item[0], item[1])):
+        load, i = heapq.heappop(heap)
+        volumes[i].members.append(rel_path)
+        volumes[i].bytes += size
+        heapq.heappush(heap, (load + size, i))
+    for volume in volumes:
+        volume.members.sort(key=_suffix_key)
+    return volumes
+
+
+def _stream_member(src: str, dst, algorithm: str) -> str:
+    h = hashlib.new(algorithm)
+    read = 0
+    with open(src, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b''):
+            h.update(chunk)
+            dst.write(chunk)
+            read += len(chunk)
+    profiling.count('bytes_read', read)
+    return h.hexdigest()
+
+
+class _HashingReader:
+    def __init__(self, f, algorithm: str) -> None:
+        self._f = f
+        self.hash = hashlib.new(algorithm)
+        self.read_bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.hash.update(data)
+        self.read_bytes += len(data)
+        return data
+
+
+def _write_zip(volume_path: Path, root: Path, members: list[str], algorithm: str) -> dict[str, dict]:
+    import zipfile
+    records: dict[str, dict] = {}
+    with zipfile.ZipFile(to_extended_path(volume_path), 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for rel_path in members:
+            src = to_extended_path(root / rel_path)
+            info = zipfile.ZipInfo.from_file(src, arcname=rel_path)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(info, 'w', force_zip64=True) as dst:
+                digest = _stream_member(src, dst, algorithm)
+            records[rel_path] = {'hash': digest, 'crc32': info.CRC}
+    return records
+
+
+def _write_tar(volume_path: Path, root: Path, members: list[str], algorithm: str, fmt: str) -> dict[str, dict]:
+    import tarfile
+    records: dict[str, dict] = {}
+    with tarfile.open(to_extended_path(volume_path), _TAR_MODES[fmt]) as tf:
+        for rel_path in members:
+            src = to_extended_path(root / rel_path)
+            info = tf.gettarinfo(src, arcname=rel_path)
+            with open(src, 'rb') as f:
+                reader = _HashingReader(f, algorithm)
+                tf.addfile(info, reader)
+            profiling.count('bytes_read', reader.read_bytes)
+            records[rel_path] = {'hash': reader.hash.hexdigest(), 'crc32': None}
+    return records
+
+
+def list_7z(exe: str, volume_path: Path) -> dict[str, tuple[int, int | None]]:
+    """Return ``{member: (size, crc32)}`` from ``7z l -slt`` without extracting anything."""
+    import subprocess
+    result = subprocess.run(
+        [exe, 'l', '-slt', '-ba', '-sccUTF-8', to_extended_path(volume_path)],
+        capture_output=True, check=True,
+    )
+    listing: dict[str, tuple[int, int | None]] = {}
+    block: dict[str, str] = {}
+    for line in result.stdout.decode('utf-8', errors='replace').splitlines() + ['']:
+        if not line.strip():
+            if block.get('Path') and block.get('Folder') != '+':
+                crc = block.get('CRC')
+                listing[block['Path'].replace('\\', '/')] = (
+                    int(block.get('Size') or 0), int(crc, 16) if crc else None
+                )
+            block = {}
+            continue
+        key, sep, value = line.partition(' = ')
+        if sep:
+            block[key.strip()] = value
+    return listing
+
+
+def _write_7z(exe: str, volume_path: Path, root: Path, members: list[str]) -> dict[str, dict]:
+    import subprocess
+    import tempfile
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.lst', delete=False) as lst:
+        for rel_path in members:
+            lst.write(rel_path.replace('/', os.sep) + '\n')
+    try:
+        # solid archive, multithreaded; relative paths are resolved against root
+        subprocess.run(
+            [exe, 'a', '-t7z', '-ms=on', '-mmt=on', '-bd', '-y', '-sccUTF-8', '-scsUTF-8',
+             to_extended_path(volume_path), f'@{lst.name}'],
+            cwd=to_extended_path(root), capture_output=True, check=True,
+        )
+    finally:
+        os.unlink(lst.name)
+    listing = list_7z(exe, volume_path)
+    return {rel_path: {'hash': None, 'crc32': listing.get(rel_path, (0, None))[1]} for rel_path in members}
+
+
+def read_listing(volume_path: Path) -> dict[str, tuple[int, int | None]]:
+    """Return ``{member: (size, crc32)}`` for a volume from its headers only.
+
+    Zip volumes use the central directory and 7z volumes ``7z l``; neither
+    decompresses member data. Tar has no index, so its headers are read in
+    sequence (compressed tarballs must be decompressed to reach them) and
+    carry no CRC.
+    """
+    name = volume_path.name.lower()
+    path = to_extended_path(volume_path)
+    if name.endswith('.zip'):
+        import zipfile
+        with zipfile.ZipFile(path) as zf:
+            return {info.filename: (info.file_size, info.CRC) for info in zf.infolist() if not info.is_dir()}
+    if name.endswith('.7z'):
+        exe = find_7zip()
+        if exe is None:
+            raise RuntimeError(f'7-Zip executable not found; cannot list {volume_path}')
+        return list_7z(exe, volume_path)
+    import tarfile
+    with tarfile.open(path, 'r:*') as tf:
+        return {member.name: (member.size, None) for member in tf.getmembers() if member.isfile()}
+
+
+def load_manifest(archive_dir: Path) -> dict:
+    with open(to_extended_path(archive_dir / ARCHIVE_MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('files'), dict):
+        raise ValueError(f'not a kb archive manifest: {archive_dir / ARCHIVE_MANIFEST_NAME}')
+    return manifest
+
+
+def check_volumes(manifest: Mapping, archive_dir: Path) -> list[str]:
+    """Compare every manifest entry with the volume listings; return problem descriptions."""
+    problems: list[str] = []
+    by_volume: dict[str, list[str]] = {}
+    for rel_path, entry in manifest.get('files', {}).items():
+        by_volume.setdefault(entry.get('volume') or '', []).append(rel_path)
+    for volume in manifest.get('metadata', {}).get('volumes', []):
+        by_volume.setdefault(volume['name'], [])
+    for volume_name, members in sorted(by_volume.items()):
+        volume_path = archive_dir / volume_name
+        if not volume_name or not os.path.isfile(to_extended_path(volume_path)):
+            problems.extend(f'archive volume missing: {volume_name or "(none)"} for {m}' for m in members)
+            continue
+        try:
+            listing = read_listing(volume_path)
+        except Exception as exc:
+            problems.append(f'archive volume unreadable: {volume_name} ({exc})')
+            continue
+        for rel_path in members:
+            entry = manifest['files'][rel_path]
+            found = listing.pop(rel_path, None)
+            if found is None:
+                problems.append(f'archive member missing: {volume_name}: {rel_path}')
+            elif found[0] != entry.get('size'):
+                problems.append(f'archive member size mismatch: {volume_name}: {rel_path}')
+            elif found[1] is not None and entry.get('crc32') is not None and found[1] != entry['crc32']:
+                problems.append(f'archive member crc mismatch: {volume_name}: {rel_path}')
+        problems.extend(f'archive member not in manifest: {volume_name}: {m}' for m in sorted(listing))
+    return problems
+
+
+def mount_archive(
+    index: CompactIndex, archive_dir: Path, prefix: str, placeholder_suffix: str, logger: Logger | None = None
+) -> int:
+    """Add the archived tree under ``archive_dir`` to ``index`` at ``prefix``; return the file count.
+
+    Entries come from the manifest, after checking them against the volume
+    listings, so nothing is extracted or re-hashed. Placeholders the
+    manifest records without a suffix get ``placeholder_suffix``. A manifest
+    that cannot be loaded raises OSError or ValueError before ``index`` is
+    touched.
+    """
+    if not placeholder_suffix:
+        raise ValueError('placeholder suffix is required to mount an archive')
+    manifest = load_manifest(archive_dir)
+    problems = check_volumes(manifest, archive_dir)
+    if problems and logger is None:
+        raise ValueError(problems[0])
+    for problem in problems:
+        logger.error(problem)
+    base = prefix.rstrip('/')
+    lead = base + '/' if base else ''
+    for rel_dir in manifest.get('dirs', {}):
+        index.add_dir(lead + rel_dir)
+    for rel_path, entry in manifest.get('placeholders', {}).items():
+        parent, _, name = (lead + rel_path).rpartition('/')
+        index.add_placeholder(index.add_dir(parent), name, entry.get('placeholder_suffix') or placeholder_suffix)
+    for rel_path, entry in manifest['files'].items():
+        parent, _, name = (lead + rel_path).rpartition('/')
+        index.add_file(
+            index.add_dir(parent), name, entry.get('size') or 0, entry.get('mtime') or 0.0,
+            entry.get('hash'), entry.get('hash_alg'),
+        )
+    index.metadata.setdefault('archived', []).append(base)
+    if logger:
+        volumes = len(manifest.get('metadata', {}).get('volumes', []))
+        logger.info(f'mounted archive: {archive_dir} files={len(manifest["files"])} volumes={volumes}')
+    return len(manifest['files'])
+
+
+def archive_tree(
+    root: Path,
+    archive_dir: Path,
+    index: Mapping,
+    use_7zip: bool,
+    fmt: str,
+    volume_bytes: int,
+    workers: int,
+    logger: Logger,
+) -> dict:
+    """Pack every file of ``index`` (taken from ``root``) into volumes under ``archive_dir``.
+
+    Volumes are written in parallel. The manifest written next to them is a
+    regular index whose file entries also name their volume and CRC-32, so
+    the archived tree can be verified from the manifest and the archive
+    listings alone. Streaming backends hash members while packing and report
+    files that changed since ``index`` was built; the 7z backend reuses the
+    index hashes.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f'unsupported archive format: {fmt}')
+    exe = find_7zip() if use_7zip else None
+    if use_7zip and exe is None:
+        logger.warning(f'use_7zip is set but no 7-Zip executable was found; falling back to {fmt}')
+    backend = '7z' if exe else fmt
+    files = index.get('files', {})
+    volumes = plan_volumes(files, volume_bytes, '.' + backend)
+    os.makedirs(to_extended_path(archive_dir), exist_ok=True)
+    logger.info(
+        f'archive started: backend={backend} files={len(files)} volumes={len(volumes)} workers={workers}'
+    )
+
+    def write_volume(volume: ArchiveVolume) -> dict[str, dict]:
+        volume_path = archive_dir / volume.name
+        if exe:
+            return _write_7z(exe, volume_path, root, volume.members)
+        algorithm = next(
+            (files[m].get('hash_alg') for m in volume.members if files[m].get('hash_alg')), 'sha256'
+        )
+        if backend == 'zip':
+            return _write_zip(volume_path, root, volume.members, algorithm)
+        return _write_tar(volume_path, root, volume.members, algorithm, backend)
+
+    manifest_files: dict[str, dict] = {}
+    volume_meta: list[dict] = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for volume, records in zip(volumes, pool.map(write_volume, volumes)):
+            archive_bytes = os.path.getsize(to_extended_path(archive_dir / volume.name))
+            profiling.count('bytes_written', archive_bytes)
+            volume_meta.append({
+                'name': volume.name,
+                'members': len(volume.members),
+                'bytes': volume.bytes,
+                'archive_bytes': archive_bytes,
+            })
+            logger.info(
+                f'archive volume written: {volume.name} members={len(volume.members)} '
+                f'bytes={volume.bytes} archive_bytes={archive_bytes}'
+            )
+            for rel_path in volume.members:
+                entry = dict(files[rel_path])
+                record = records[rel_path]
+                if record['hash'] is not None and entry.get('hash') not in (None, record['hash']):
+                    logger.error(f'archive: file changed since indexing: {rel_path}')
+                    entry['hash'] = record['hash']
+                entry['volume'] = volume.name
+                entry['crc32'] = record['crc32']
+                manifest_files[rel_path] = entry
+
+    metadata = dict(index.get('metadata', {}))
+    metadata.update({
+        'generated_at': _dt.datetime.now().isoformat(timespec='seconds'),
+        'archive_format': backend,
+        'volumes': volume_meta,
+    })
+    manifest = {
+        'files': {rel_path: manifest_files[rel_path] for rel_path in files},
+        'dirs': dict(index.get('dirs', {})),
+        'placeholders': dict(index.get('placeholders', {})),
+        'metadata': metadata,
+    }
+    write_json(archive_dir / ARCHIVE_MANIFEST_NAME, manifest)
+    logger.info(f'archive complete: {archive_dir}')
+    return manifest
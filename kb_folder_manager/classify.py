@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+from itertools import compress
+
+from .index_model import CompactIndex
+from .utils import derive_placeholder_original
+
+
+class TypeClassifier:
+    """Batch "is this a specified type?" answers for file names.
+
+    Decisions are memoised per raw (case-preserved) suffix, so each file
+    costs one ``rfind`` and one dict lookup; the lowercase comparison runs
+    once per distinct suffix. The result matches ``utils.is_specified_type``
+    (``Path(name.lower()).suffix`` semantics) exactly: lowercasing never
+    adds or removes a dot, nor empties a character, so the suffix position
+    is the same before and after lowering.
+    """
+
+    def __init__(self, specified_types: Iterable[str]) -> None:
+        self.specified_types = frozenset(specified_types)
+        self._table: dict[str, int] = {}
+
+    def _lookup(self, raw_suffix: str) -> int:
+        flag = self._table.get(raw_suffix)
+        if flag is None:
+            flag = self._table[raw_suffix] = int(raw_suffix.lower() in self.specified_types)
+        return flag
+
+    def is_specified(self, name: str) -> bool:
+        dot = name.rfind('.')
+        return 0 < dot < len(name) - 1 and bool(self._lookup(name[dot:]))
+
+    def classify(self, names: Iterable[str]) -> bytearray:
+        """Return one flag per name: 1 for a specified type, 0 otherwise."""
+        table = self._table
+        lookup = self._lookup
+        flags = bytearray()
+        append = flags.append
+        for name in names:
+            dot = name.rfind('.')
+            if 0 < dot < len(name) - 1:
+                raw = name[dot:]
+                flag = table.get(raw)
+                append(lookup(raw) if flag is None else flag)
+            else:
+                append(0)
+        return flags
+
+
+def _basenames(paths: Iterable[str]) -> Iterable[str]:
+    return (rel_path.rpartition('/')[2] for rel_path in paths)
+
+
+def classify_index(index: Mapping, specified_types: Iterable[str]) -> bytearray:
+    """Type flags for every file of ``index`` in its iteration order.
+
+    Results are cached on CompactIndex instances per set of types, so the
+    split planner and the validators share one classification pass.
+    """
+    key = ('files', frozenset(specified_types))
+    if isinstance(index, CompactIndex):
+        flags = index.classifications.get(key)
+        if flags is None:
+            flags = index.classifications[key] = TypeClassifier(key[1]).classify(index.file_names())
+        return flags
+    return TypeClassifier(key[1]).classify(_basenames(index.get('files', {})))
+
+
+def classify_placeholders(index: Mapping, specified_types: Iterable[str], placeholder_suffix: str) -> bytearray:
+    """Type flags for the original name behind every placeholder of ``index``."""
+    key = ('placeholders', frozenset(specified_types), placeholder_suffix)
+    if isinstance(index, CompactIndex):
+        flags = index.classifications.get(key)
+        if flags is None:
+            names = (derive_placeholder_original(n, placeholder_suffix) for n in index.placeholder_names())
+            flags = index.classifications[key] = TypeClassifier(key[1]).classify(names)
+        return flags
+    names = (derive_placeholder_original(n, placeholder_suffix) for n in _basenames(index.get('placeholders', {})))
+    return TypeClassifier(key[1]).classify(names)
+
+
+def specified_files(index: Mapping, specified_types: Iterable[str]) -> list[str]:
+    """Relative paths of the files in ``index`` that are of a specified type."""
+    return list(compress(index.get('files', {}), classify_index(index, specified_types)))
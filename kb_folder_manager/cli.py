@@ -1,18 +1,9 @@
 from __future__ import annotations
 
 import argparse
-import sys
 from pathlib import Path
 
 from .config import DEFAULT_CONFIG_NAME, load_config
-from .operations import (
-    compare_operation,
-    index_operation,
-    merge_operation,
-    split_operation,
-    validate_mutual_operation,
-    validate_operation,
-)
 from .utils import FatalError, now_timestamp
 
 
@@ -20,23 +11,79 @@ def _parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='KB Folder Manager')
     parser.add_argument('--config', type=Path, default=Path(DEFAULT_CONFIG_NAME), help='Path to config.yaml')
     parser.add_argument('--yes', action='store_true', help='Auto-confirm prompts')
+    parser.add_argument(
+        '--profile', action='store_true', help='Dump cProfile stats and timing.json into the log directory'
+    )
     sub = parser.add_subparsers(dest='command', required=True)
 
     split = sub.add_parser('split', help='Split complete folder into doc/res')
     split.add_argument('--source', type=Path, required=True, help='Complete folder path')
     split.add_argument('--output-root', type=Path, required=True, help='Output root folder')
     split.add_argument('--force', action='store_true', help='Allow non-empty output root')
+    split.add_argument(
+        '--archive', action='store_true', help='Pack res into archive volumes under <output-root>/res_archive'
+    )
+    split.add_argument(
+        '--dry-run', action='store_true', help='Print sizes, counts and an estimated duration without copying'
+    )
+    split.add_argument('--plan', type=Path, help='With --dry-run, save the split plan as JSON')
 
     merge = sub.add_parser('merge', help='Merge doc/res into complete')
     merge.add_argument('--doc', type=Path, required=True, help='Doc folder path')
     merge.add_argument('--res', type=Path, required=True, help='Res folder path')
     merge.add_argument('--output-root', type=Path, required=True, help='Output root folder')
     merge.add_argument('--force', action='store_true', help='Allow non-empty output root')
+    merge.add_argument(
+        '--doc-index', type=Path, help='Index saved by split for --doc (default: <split output>/index/doc/.kb_index.json)'
+    )
+    merge.add_argument(
+        '--res-index', type=Path, help='Index saved by split for --res (default: <split output>/index/res/.kb_index.json)'
+    )
 
     index = sub.add_parser('index', help='Generate index for a folder')
     index.add_argument('--target', type=Path, required=True, help='Target folder path')
     index.add_argument('--output', type=Path, required=True, help='Output index file path')
     index.add_argument('--log-dir', type=Path, required=True, help='Directory to store logs')
+    index.add_argument(
+        '--subtree', help='Write a shard: where --target sits in the whole tree (POSIX relative path, "." for the root)'
+    )
+    index.add_argument(
+        '--exclude', action='append', default=[], help='Subtree (whole-tree path) left to another shard (repeatable)'
+    )
+
+    index_merge = sub.add_parser('index-merge', help='Combine shard indexes written by index --subtree')
+    index_merge.add_argument('shards', type=Path, nargs='+', help='Shard index files')
+    index_merge.add_argument('--output', type=Path, required=True, help='Output index file path')
+    index_merge.add_argument('--log-dir', type=Path, required=True, help='Directory to store logs')
+
+    archive = sub.add_parser('archive', help='Pack a folder into parallel archive volumes with a manifest')
+    archive.add_argument('--target', type=Path, required=True, help='Folder to archive (usually a res folder)')
+    archive.add_argument('--output', type=Path, required=True, help='Directory for the volumes and .kb_archive.json')
+    archive.add_argument('--log-dir', type=Path, required=True, help='Directory to store logs')
+
+    verify = sub.add_parser('verify', help='Check whole-tree equality via Merkle root hashes')
+    verify.add_argument('--target', type=Path, required=True, help='Folder or saved index file to verify')
+    verify.add_argument('--root-hash', help='Expected root hash (metadata.root_hash of a known-good index)')
+    verify.add_argument('--against', type=Path, help='Second folder or index file that should be identical')
+    verify.add_argument('--log-dir', type=Path, required=True, help='Directory to store logs')
+
+    dedup = sub.add_parser('dedup', help='Report duplicate files across folders and indexes')
+    dedup.add_argument('--root', type=Path, action='append', default=[], help='Folder to scan (repeatable)')
+    dedup.add_argument(
+        '--res', type=Path, action='append', default=[], help='Res folder to scan; eligible for --hardlink (repeatable)'
+    )
+    dedup.add_argument('--index', type=Path, action='append', default=[], help='Saved index file (repeatable)')
+    dedup.add_argument('--report', type=Path, help='Write the duplicate groups as JSON')
+    dedup.add_argument('--hardlink', action='store_true', help='Replace duplicates inside each --res folder with hardlinks')
+    dedup.add_argument('--log-dir', type=Path, required=True, help='Directory to store logs')
+
+    placeholders = sub.add_parser('placeholders', help='Convert placeholders between directories and manifests')
+    placeholders.add_argument('--target', type=Path, required=True, help='Doc or res folder')
+    placeholders.add_argument(
+        '--to', choices=['dirs', 'manifest'], required=True,
+        help='dirs: one empty directory per placeholder; manifest: .kb_placeholders.json per directory',
+    )
+    placeholders.add_argument('--log-dir', type=Path, required=True, help='Directory to store logs')
 
     validate = sub.add_parser('validate', help='Validate a folder or pair of folders')
     validate.add_argument('--mode', choices=['class1', 'class2', 'mutual', 'compare'], required=True, help='Validation mode')
@@ -46,6 +93,8 @@ def _parse_args() -> argparse.Namespace:
     validate.add_argument('--res', type=Path, help='Res folder path (mutual)')
     validate.add_argument('--old', type=Path, help='Old folder path (compare)')
     validate.add_argument('--new', type=Path, help='New folder path (compare)')
+    validate.add_argument('--old-index', type=Path, help='Old saved index file (compare, instead of --old)')
+    validate.add_argument('--new-index', type=Path, help='New saved index file (compare, instead of --new)')
     validate.add_argument('--log-dir', type=Path, required=True, help='Directory to store logs')
 
     return parser.parse_args()
@@ -54,28 +103,100 @@ def _parse_args() -> argparse.Namespace:
 def main() -> int:
     args = _parse_args()
     try:
+        if args.command == 'split' and args.plan is not None and not args.dry_run:
+            raise FatalError('split --plan requires --dry-run (a real split saves its plan under <output-root>/index)')
+        if args.command == 'split' and args.archive and args.dry_run:
+            raise FatalError('split --archive cannot be combined with --dry-run')
         config = load_config(args.config)
-        if args.command == 'split':
-            split_operation(args.source, args.output_root, config, args.force, args.yes)
+        if args.command == 'split' and args.dry_run:
+            from .operations import split_dry_run_operation
+
+            split_dry_run_operation(args.source, args.output_root, config, args.plan)
+        elif args.command == 'split':
+            from .operations import split_operation
+
+            split_operation(
+                args.source, args.output_root, config, args.force, args.yes, profile=args.profile, archive=args.archive
+            )
         elif args.command == 'merge':
-            merge_operation(args.doc, args.res, args.output_root, config, args.force, args.yes)
+            from .operations import merge_operation
+
+            merge_operation(
+                args.doc,
+                args.res,
+                args.output_root,
+                config,
+                args.force,
+                args.yes,
+                profile=args.profile,
+                doc_index_path=args.doc_index,
+                res_index_path=args.res_index,
+            )
         elif args.command == 'index':
+            from .operations import index_operation
+
             log_dir = args.log_dir / now_timestamp()
-            index_operation(args.target, args.output, config, log_dir)
+            index_operation(
+                args.target, args.output, config, log_dir, profile=args.profile,
+                subtree=args.subtree, exclude=args.exclude,
+            )
+        elif args.command == 'index-merge':
+            from .operations import index_merge_operation
+
+            log_dir = args.log_dir / now_timestamp()
+            index_merge_operation(args.shards, args.output, log_dir, profile=args.profile)
+        elif args.command == 'archive':
+            from .operations import archive_operation
+
+            log_dir = args.log_dir / now_timestamp()
+            archive_operation(args.target, args.output, config, log_dir, profile=args.profile)
+        elif args.command == 'verify':
+            from .operations import verify_operation
+
+            log_dir = args.log_dir / now_timestamp()
+            verify_operation(
+                args.target, config, log_dir, args.root_hash, args.against, profile=args.profile
+            )
+        elif args.command == 'dedup':
+            from .operations import dedup_operation
+
+            if not (args.root or args.res or args.index):
+                raise FatalError('dedup requires at least one --root, --res or --index')
+            log_dir = args.log_dir / now_timestamp()
+            dedup_operation(
+                args.root, args.res, args.index, config, log_dir, args.report, args.hardlink, profile=args.profile
+            )
+        elif args.command == 'placeholders':
+            from .operations import convert_placeholders_operation
+
+            log_dir = args.log_dir / now_timestamp()
+            convert_placeholders_operation(args.target, args.to, config, log_dir, profile=args.profile)
         elif args.command == 'validate':
             log_dir = args.log_dir / now_timestamp()
             if args.mode in ('class1', 'class2'):
+                from .operations import validate_operation
+
                 if not args.target:
                     raise FatalError('validate mode class1/class2 requires --target')
-                validate_operation(args.target, args.mode, config, log_dir, args.role)
+                validate_operation(args.target, args.mode, config, log_dir, args.role, profile=args.profile)
             elif args.mode == 'mutual':
+                from .operations import validate_mutual_operation
+
                 if not args.doc or not args.res:
                     raise FatalError('validate mode mutual requires --doc and --res')
-                validate_mutual_operation(args.doc, args.res, config, log_dir)
+                validate_mutual_operation(args.doc, args.res, config, log_dir, profile=args.profile)
+            elif args.mode == 'compare' and (args.old_index or args.new_index):
+                from .operations import compare_index_files_operation
+
+                if not args.old_index or not args.new_index:
+                    raise FatalError('validate mode compare requires both --old-index and --new-index')
+                compare_index_files_operation(args.old_index, args.new_index, log_dir, profile=args.profile)
             elif args.mode == 'compare':
+                from .operations import compare_operation
+
                 if not args.old or not args.new:
                     raise FatalError('validate mode compare requires --old and --new')
-                compare_operation(args.old, args.new, config, log_dir)
+                compare_operation(args.old, args.new, config, log_dir, profile=args.profile)
             else:
                 raise FatalError(f'unknown validate mode: {args.mode}')
         else:
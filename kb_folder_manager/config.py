@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import json
+import os
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any
 
-from .utils import normalize_specified_types, validate_placeholder_suffix
+from .utils import (
+    CACHE_HINT_MODES,
+    PLACEHOLDER_MODES,
+    CacheHints,
+    normalize_specified_types,
+    validate_placeholder_suffix,
+)
 
 
 @dataclass
@@ -13,9 +21,32 @@ class Config:
     placeholder_suffix: str
     hash_algorithm: str
     use_7zip: bool
+    archive_format: str = 'zip'
+    archive_volume_mb: int = 2048
+    archive_workers: int = 4
+    mkdir_workers: int = 4
+    overlap_hashing: bool = False
+    processes: int = 1
+    walk_workers: int = 1
+    case_conflict_nfc: bool = False
+    placeholder_mode: str = 'dirs'
+    cache_hints: str = 'none'
+    direct_io_min_mb: int = 0
+
+    @property
+    def placeholder_manifests(self) -> bool:
+        """Whether placeholders are read from per-directory manifests while walking."""
+        return self.placeholder_mode == 'manifest'
+
+    @property
+    def cache_policy(self) -> CacheHints:
+        """The page-cache hints file hashing and copying run under."""
+        return CacheHints(self.cache_hints, self.direct_io_min_mb * 1024 * 1024)
 
 
 DEFAULT_CONFIG_NAME = 'config.yaml'
+CONFIG_CACHE_SUFFIX = '.cache.json'
+ARCHIVE_FORMATS = ('zip', 'tar', 'tar.gz', 'tar.xz')
 
 
 def _load_yaml(path: Path) -> dict[str, Any]:
@@ -32,11 +63,85 @@ def _load_yaml(path: Path) -> dict[str, Any]:
     return data
 
 
-def load_config(path: Path) -> Config:
+def _cache_path(path: Path) -> Path:
+    return path.with_name(f'.{path.name}{CONFIG_CACHE_SUFFIX}')
+
+
+def _load_cached(path: Path) -> dict[str, Any]:
+    """Parse ``path`` once and reuse a JSON sidecar while its mtime and size are unchanged.
+
+    Loading from the sidecar skips importing PyYAML, which dominates the
+    startup of short CLI runs. A missing, stale or unreadable sidecar just
+    falls back to parsing the YAML, and failing to write one is ignored.
+    """
+    st = os.stat(path)
+    stamp = [st.st_mtime_ns, st.st_size]
+    cache = _cache_path(path)
+    try:
+        with open(cache, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached['stamp'] == stamp and isinstance(cached['data'], dict):
+            return cached['data']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
     data = _load_yaml(path)
+    try:
+        text = json.dumps({'stamp': stamp, 'data': data}, ensure_ascii=False)
+        with open(cache, 'w', encoding='utf-8') as f:
+            f.write(text)
+    except (OSError, TypeError, ValueError):
+        pass
+    return data
+
+
+def load_config(path: Path) -> Config:
+    data = _load_cached(path)
     specified_types = normalize_specified_types(data.get('specified_types', []))
     placeholder_suffix = data.get('placeholder_suffix', '')
     validate_placeholder_suffix(placeholder_suffix)
     hash_algorithm = data.get('hash_algorithm', 'sha256')
     use_7zip = bool(data.get('use_7zip', False))
-    return Config(set(specified_types), placeholder_suffix, hash_algorithm, use_7zip)
+    archive_format = data.get('archive_format', 'zip')
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f'archive_format must be one of {", ".join(ARCHIVE_FORMATS)}')
+    archive_volume_mb = int(data.get('archive_volume_mb', 2048))
+    archive_workers = int(data.get('archive_workers', 4))
+    if archive_volume_mb <= 0 or archive_workers <= 0:
+        raise ValueError('archive_volume_mb and archive_workers must be positive')
+    mkdir_workers = int(data.get('mkdir_workers', 4))
+    if mkdir_workers <= 0:
+        raise ValueError('mkdir_workers must be positive')
+    overlap_hashing = bool(data.get('overlap_hashing', False))
+    processes = int(data.get('processes', 1))
+    if processes <= 0:
+        raise ValueError('processes must be positive')
+    walk_workers = int(data.get('walk_workers', 1))
+    if walk_workers <= 0:
+        raise ValueError('walk_workers must be positive')
+    case_conflict_nfc = bool(data.get('case_conflict_nfc', False))
+    placeholder_mode = str(data.get('placeholder_mode', 'dirs'))
+    if placeholder_mode not in PLACEHOLDER_MODES:
+        raise ValueError(f'placeholder_mode must be one of: {", ".join(PLACEHOLDER_MODES)}')
+    cache_hints = str(data.get('cache_hints', 'none'))
+    if cache_hints not in CACHE_HINT_MODES:
+        raise ValueError(f'cache_hints must be one of: {", ".join(CACHE_HINT_MODES)}')
+    direct_io_min_mb = int(data.get('direct_io_min_mb', 0))
+    if direct_io_min_mb < 0:
+        raise ValueError('direct_io_min_mb must not be negative')
+    return Config(
+        set(specified_types),
+        placeholder_suffix,
+        hash_algorithm,
+        use_7zip,
+        archive_format,
+        archive_volume_mb,
+        archive_workers,
+        mkdir_workers,
+        overlap_hashing,
+        processes,
+        walk_workers,
+        case_conflict_nfc,
+        placeholder_mode,
+        cache_hints,
+        direct_io_min_mb,
+    )
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import profiling
+from .archive import ARCHIVE_MANIFEST_NAME, load_manifest
+from .utils import NO_CACHE_HINTS, CacheHints, Logger, file_size, hash_file, iter_walk, to_extended_path
+
+PARTIAL_CHUNK = 64 * 1024
+
+
+@dataclass
+class DedupEntry:
+    source: str
+    rel_path: str
+    size: int
+    path: Path | None = None
+    hash: str | None = None
+    hash_alg: str | None = None
+    linkable: bool = False
+
+
+@dataclass
+class DuplicateGroup:
+    size: int
+    hash: str
+    hash_alg: str
+    entries: list[DedupEntry] = field(default_factory=list)
+
+    @property
+    def wasted_bytes(self) -> int:
+        return self.size * (len(self.entries) - 1)
+
+
+def collect_root(
+    root: Path, placeholder_suffix: str, linkable: bool = False, mount_archives: bool = False,
+    logger: Logger | None = None, placeholder_manifests: bool = False,
+) -> list[DedupEntry]:
+    """Collect sizes for every file under ``root``; nothing is hashed here.
+
+    With ``mount_archives`` an archived subtree contributes its manifest
+    entries (with their recorded hashes) instead of the volume files. With
+    ``placeholder_manifests`` a placeholder manifest is not collected as a file.
+    """
+    entries: list[DedupEntry] = []
+    walk = iter_walk(root, placeholder_suffix, placeholder_manifests=placeholder_manifests)
+    for rel_root, current_norm, dirs, files, _placeholders, _manifest in walk:
+        if mount_archives and ARCHIVE_MANIFEST_NAME in files:
+            prefix = '' if rel_root.as_posix() == '.' else rel_root.as_posix() + '/'
+            try:
+                manifest = load_manifest(current_norm)
+            except (OSError, ValueError) as exc:
+                if logger is None:
+                    raise
+                logger.error(f'invalid archive manifest: {prefix}{ARCHIVE_MANIFEST_NAME} ({exc})')
+            else:
+                for rel_path, entry in manifest['files'].items():
+                    entries.append(DedupEntry(
+                        source=str(root),
+                        rel_path=prefix + rel_path,
+                        size=entry.get('size') or 0,
+                        hash=entry.get('hash'),
+                        hash_alg=entry.get('hash_alg'),
+                    ))
+                dirs.clear()
+                continue
+        for fname in files:
+            fpath = current_norm / fname
+            entries.append(DedupEntry(
+                source=str(root),
+                rel_path=(rel_root / fname).as_posix(),
+                size=file_size(fpath),
+                path=fpath,
+                linkable=linkable,
+            ))
+    return entries
+
+
+def collect_index(index: dict, source: str) -> list[DedupEntry]:
+    """Collect entries (with full hashes) from a saved index; files are read only if still present."""
+    root_path = index.get('metadata', {}).get('root_path')
+    root = Path(root_path) if root_path else None
+    entries: list[DedupEntry] = []
+    for rel_path, entry in index.get('files', {}).items():
+        path = root / rel_path if root is not None else None
+        entries.append(DedupEntry(
+            source=source,
+            rel_path=rel_path,
+            size=entry.get('size') or 0,
+            path=path,
+            hash=entry.get('hash'),
+            hash_alg=entry.get('hash_alg'),
+        ))
+    return entries
+
+
+def partial_hash(path: Path, size: int, algorithm: str) -> str:
+    """Hash the first and last PARTIAL_CHUNK bytes.
+
+    Files of up to ``2 * PARTIAL_CHUNK`` bytes are hashed whole, so the
+    digest equals ``hash_file``'s.
+    """
+    h = hashlib.new(algorithm)
+    with open(to_extended_path(path), 'rb') as f:
+        if size > 2 * PARTIAL_CHUNK:
+            h.update(f.read(PARTIAL_CHUNK))
+            f.seek(size - PARTIAL_CHUNK)
+            h.update(f.read(PARTIAL_CHUNK))
+            read = 2 * PARTIAL_CHUNK
+        else:
+            data = f.read()
+            h.update(data)
+            read = len(data)
+            profiling.count('files_hashed')
+    profiling.count('bytes_read', read)
+    return h.hexdigest()
+
+
+def _readable(entry: DedupEntry) -> bool:
+    return entry.path is not None and os.path.isfile(to_extended_path(entry.path))
+
+
+def find_duplicates(
+    entries: list[DedupEntry], hash_algorithm: str, logger: Logger | None = None, hints: CacheHints = NO_CACHE_HINTS
+) -> list[DuplicateGroup]:
+    """Group identical files: by size, then partial hash, then full hash.
+
+    Files with a unique size are never read. Full hashes recorded in an
+    index are reused when they use ``hash_algorithm`` and such files are not
+    read at all. Small files are read once, their partial hash being the
+    full one; larger files get a full hash only if their partial hash
+    collides with another candidate's, or if a recorded hash of the same
+    size could match them.
+    """
+    by_size: dict[int, list[DedupEntry]] = defaultdict(list)
+    for entry in entries:
+        if entry.size > 0:
+            by_size[entry.size].append(entry)
+
+    groups: list[DuplicateGroup] = []
+    partial_hashed = 0
+    full_hashed = 0
+    for size, members in by_size.items():
+        if len(members) < 2:
+            continue
+        for entry in members:
+            if entry.hash_alg != hash_algorithm:
+                entry.hash = None
+        pending = [e for e in members if e.hash is None and _readable(e)]
+        if size <= 2 * PARTIAL_CHUNK:
+            # the partial hash of a small file covers all of it and is its full hash
+            for entry in pending:
+                entry.hash = partial_hash(entry.path, size, hash_algorithm)
+                entry.hash_alg = hash_algorithm
+                full_hashed += 1
+        elif any(e.hash is not None for e in members):
+            # a recorded full hash can match any pending file, so partial hashes cannot rule one out
+            for entry in pending:
+                entry.hash = hash_file(entry.path, hash_algorithm, hints)
+                entry.hash_alg = hash_algorithm
+                full_hashed += 1
+        else:
+            by_partial: dict[str, list[DedupEntry]] = defaultdict(list)
+            for entry in pending:
+                by_partial[partial_hash(entry.path, size, hash_algorithm)].append(entry)
+                partial_hashed += 1
+            for bucket in by_partial.values():
+                if len(bucket) < 2:
+                    continue
+                for entry in bucket:
+                    entry.hash = hash_file(entry.path, hash_algorithm, hints)
+                    entry.hash_alg = hash_algorithm
+                    full_hashed += 1
+        by_hash: dict[str, list[DedupEntry]] = defaultdict(list)
+        for entry in members:
+            if entry.hash is not None:
+                by_hash[entry.hash].append(entry)
+        for digest, same in by_hash.items():
+            if len(same) >= 2:
+                same.sort(key=lambda e: (e.source, e.rel_path))
+                groups.append(DuplicateGroup(size, digest, hash_algorithm, same))
+
+    if logger:
+        logger.info(
+            f'dedup: candidates={len(entries)} size_groups={sum(1 for m in by_size.values() if len(m) > 1)} '
+            f'partial_hashed={partial_hashed} full_hashed={full_hashed}'
+        )
+    groups.sort(key=lambda g: (-g.wasted_bytes, g.hash))
+    return groups
+
+
+def hardlink_duplicates(group: DuplicateGroup, logger: Logger) -> int:
+    """Replace linkable duplicates with hardlinks to the first linkable copy on the same device."""
+    reclaimed = 0
+    keepers: dict[tuple[str, int], DedupEntry] = {}
+    for entry in group.entries:
+        if not entry.linkable or entry.path is None:
+            continue
+        src = to_extended_path(entry.path)
+        st = os.stat(src)
+        key = (entry.source, st.st_dev)
+        keeper = keepers.get(key)
+        if keeper is None:
+            keepers[key] = entry
+            continue
+        keeper_path = to_extended_path(keeper.path)
+        if os.path.samefile(keeper_path, src):
+            continue
+        tmp = src + '.kb_dedup_tmp'
+        try:
+            os.link(keeper_path, tmp)
+            os.replace(tmp, src)
+        except OSError as exc:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            logger.error(f'dedup: failed to hardlink {entry.rel_path} -> {keeper.rel_path} ({exc})')
+            continue
+        reclaimed += group.size
+        logger.info(f'dedup: hardlinked {entry.source}: {entry.rel_path} -> {keeper.rel_path}')
+    return reclaimed
+
+
+def group_report(group: DuplicateGroup) -> dict:
+    return {
+        'size': group.size,
+        'hash': group.hash,
+        'hash_alg': group.hash_alg,
+        'copies': len(group.entries),
+        'wasted_bytes': group.wasted_bytes,
+        'files': [{'source': e.source, 'path': e.rel_path} for e in group.entries],
+    }
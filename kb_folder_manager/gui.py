@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import queue
 import threading
+import time
 from pathlib import Path
 from tkinter import filedialog, messagebox
 from tkinter.scrolledtext import ScrolledText
@@ -12,14 +13,6 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 
 from .config import Config, load_config, DEFAULT_CONFIG_NAME
-from .operations import (
-    compare_operation,
-    index_operation,
-    merge_operation,
-    split_operation,
-    validate_mutual_operation,
-    validate_operation,
-)
 from .utils import FatalError, now_timestamp
 
 
@@ -116,58 +109,110 @@ class KBFolderManagerGUI:
     
     VERSION = "3.0"
     
-    def __init__(self, root: ttk.Window):
+    def __init__(self, root: ttk.Window, started: float | None = None):
         self.root = root
         self.root.title(f"KB Folder Manager v{self.VERSION}")
         self.root.geometry("900x700")
         
-        # Load config
+        # Startup timing (seconds since launch_gui started, or since __init__)
+        self.started = started if started is not None else time.perf_counter()
+        self.startup_metrics: dict[str, float] = {'window': time.perf_counter() - self.started}
+        
+        # Config is loaded on a background thread once the window is up
         self.config: Config | None = None
         self.config_path = Path(DEFAULT_CONFIG_NAME)
-        self.load_config()
+        self.config_loading = False
+        self._config_queue: queue.Queue = queue.Queue()
         
         # Operation state
         self.operation_running = False
         self.result_queue: queue.Queue = queue.Queue()
         
-        # Setup UI
+        # Setup UI; tabs other than the first are built on first activation
+        self.built_tabs: set[str] = set()
         self.setup_ui()
+        self.startup_metrics['ui'] = time.perf_counter() - self.started
+        self.load_config()
+        self.root.after_idle(self._record_first_paint)
         
         # Check for operation results periodically
         self.check_operation_results()
         
-    def load_config(self) -> None:
-        """Load configuration file."""
+    def load_config(self, notify: bool = False) -> None:
+        """Load configuration file on a background thread."""
+        if self.config_loading:
+            return
+        self.config_loading = True
+        self.status_label.config(text="Loading configuration...")
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start(15)
+        
+        def worker() -> None:
+            try:
+                self._config_queue.put(('ok', load_config(self.config_path)))
+            except Exception as e:
+                self._config_queue.put(('error', e))
+                
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(20, self._poll_config, notify)
+        
+    def _poll_config(self, notify: bool) -> None:
+        """Apply the background config load result on the Tk thread."""
         try:
-            self.config = load_config(self.config_path)
-        except Exception as e:
-            messagebox.showerror("Config Error", f"Failed to load config: {e}")
+            result_type, value = self._config_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(20, self._poll_config, notify)
+            return
+        self.config_loading = False
+        self.progress_bar.stop()
+        self.progress_bar.config(mode="determinate")
+        self.progress_var.set(0)
+        self.startup_metrics.setdefault('config', time.perf_counter() - self.started)
+        if result_type == 'ok':
+            self.config = value
+            self.set_status("Ready")
+            if notify:
+                messagebox.showinfo("Config Reloaded", "Configuration reloaded successfully!")
+        else:
+            self.set_status("Config error")
+            messagebox.showerror("Config Error", f"Failed to load config: {value}")
+        if 'settings' in self.built_tabs:
+            self._refresh_settings_tab()
             
+    def _record_first_paint(self) -> None:
+        """Record time to first paint once the initial layout has been drawn."""
+        self.root.update_idletasks()
+        self.startup_metrics['first_paint'] = time.perf_counter() - self.started
+        self.log_message(
+            "[INFO] startup: " + " ".join(f"{k}={v:.3f}s" for k, v in self.startup_metrics.items())
+        )
+        
     def setup_ui(self) -> None:
         """Setup main UI components."""
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root, bootstyle="primary")
         self.notebook.pack(fill=BOTH, expand=YES, padx=10, pady=10)
         
-        # Create tabs
+        # Create tabs; their contents are built on first activation
         self.split_frame = ttk.Frame(self.notebook)
         self.merge_frame = ttk.Frame(self.notebook)
         self.validate_frame = ttk.Frame(self.notebook)
         self.index_frame = ttk.Frame(self.notebook)
         self.settings_frame = ttk.Frame(self.notebook)
+        self.tab_builders: dict[str, tuple[ttk.Frame, Callable[[], None]]] = {
+            'split': (self.split_frame, self.setup_split_tab),
+            'merge': (self.merge_frame, self.setup_merge_tab),
+            'validate': (self.validate_frame, self.setup_validate_tab),
+            'index': (self.index_frame, self.setup_index_tab),
+            'settings': (self.settings_frame, self.setup_settings_tab),
+        }
         
         self.notebook.add(self.split_frame, text="Split")
         self.notebook.add(self.merge_frame, text="Merge")
         self.notebook.add(self.validate_frame, text="Validate")
         self.notebook.add(self.index_frame, text="Index")
         self.notebook.add(self.settings_frame, text="Settings")
-        
-        # Setup each tab
-        self.setup_split_tab()
-        self.setup_merge_tab()
-        self.setup_validate_tab()
-        self.setup_index_tab()
-        self.setup_settings_tab()
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
         
         # Progress bar (shared across all tabs)
         progress_frame = ttk.Frame(self.root)
@@ -193,6 +238,24 @@ class KBFolderManagerGUI:
         self.log_text = ScrolledText(log_frame, height=10, wrap=WORD, state=NORMAL)
         self.log_text.pack(fill=BOTH, expand=YES, padx=5, pady=5)
         
+        # The visible tab is needed for the first paint
+        self.ensure_tab('split')
+        
+    def ensure_tab(self, name: str) -> None:
+        """Build a tab's widgets the first time it is needed."""
+        if name in self.built_tabs:
+            return
+        self.built_tabs.add(name)
+        self.tab_builders[name][1]()
+        
+    def _on_tab_changed(self, event: Any) -> None:
+        """Build the newly selected tab on first activation."""
+        selected = self.notebook.select()
+        for name, (frame, _builder) in self.tab_builders.items():
+            if str(frame) == selected:
+                self.ensure_tab(name)
+                break
+                
     def setup_split_tab(self) -> None:
         """Setup Split operation tab."""
         frame = self.split_frame
@@ -500,6 +563,8 @@ class KBFolderManagerGUI:
             config_text.insert(END, f"\nPlaceholder Suffix: {self.config.placeholder_suffix}\n")
             config_text.insert(END, f"Hash Algorithm: {self.config.hash_algorithm}\n")
             config_text.insert(END, f"Use 7-Zip: {self.config.use_7zip}\n")
+        elif self.config_loading:
+            config_text.insert(END, "Loading configuration...")
         else:
             config_text.insert(END, "Configuration not loaded!")
             
@@ -668,6 +733,16 @@ class KBFolderManagerGUI:
         """Set status label text."""
         self.status_label.config(text=message)
         
+    def require_config(self) -> bool:
+        """Return True when the configuration is ready, otherwise tell the user why not."""
+        if self.config:
+            return True
+        if self.config_loading:
+            messagebox.showinfo("Config Loading", "Configuration is still loading, please try again.")
+        else:
+            messagebox.showerror("Config Error", "Configuration not loaded!")
+        return False
+        
     def execute_split(self) -> None:
         """Execute split operation."""
         if self.operation_running:
@@ -681,8 +756,7 @@ class KBFolderManagerGUI:
             messagebox.showerror("Input Error", "Please specify source and output folders!")
             return
             
-        if not self.config:
-            messagebox.showerror("Config Error", "Configuration not loaded!")
+        if not self.require_config():
             return
             
         self.clear_log()
@@ -698,6 +772,8 @@ class KBFolderManagerGUI:
         )
         
         # Start operation in thread
+        from .operations import split_operation
+        
         thread = OperationThread(
             split_operation,
             self.result_queue,
@@ -726,8 +802,7 @@ class KBFolderManagerGUI:
             messagebox.showerror("Input Error", "Please specify doc, res, and output folders!")
             return
             
-        if not self.config:
-            messagebox.showerror("Config Error", "Configuration not loaded!")
+        if not self.require_config():
             return
             
         self.clear_log()
@@ -743,6 +818,8 @@ class KBFolderManagerGUI:
         )
         
         # Start operation in thread
+        from .operations import merge_operation
+        
         thread = OperationThread(
             merge_operation,
             self.result_queue,
@@ -771,8 +848,7 @@ class KBFolderManagerGUI:
             messagebox.showerror("Input Error", "Please specify log directory!")
             return
             
-        if not self.config:
-            messagebox.showerror("Config Error", "Configuration not loaded!")
+        if not self.require_config():
             return
             
         log_dir_path = Path(log_dir) / now_timestamp()
@@ -790,6 +866,8 @@ class KBFolderManagerGUI:
         )
         
         # Prepare arguments based on mode
+        from .operations import compare_operation, validate_mutual_operation, validate_operation
+        
         if mode in ('class1', 'class2'):
             target = self.validate_widgets.get('target')
             role = self.validate_widgets.get('role')
@@ -861,8 +939,7 @@ class KBFolderManagerGUI:
             messagebox.showerror("Input Error", "Please specify target, output, and log directory!")
             return
             
-        if not self.config:
-            messagebox.showerror("Config Error", "Configuration not loaded!")
+        if not self.require_config():
             return
             
         log_dir_path = Path(log_dir) / now_timestamp()
@@ -880,6 +957,8 @@ class KBFolderManagerGUI:
         )
         
         # Start operation in thread
+        from .operations import index_operation
+        
         thread = OperationThread(
             index_operation,
             self.result_queue,
@@ -919,10 +998,13 @@ class KBFolderManagerGUI:
         self.root.after(100, self.check_operation_results)
         
     def reload_config(self) -> None:
-        """Reload configuration file."""
-        self.load_config()
-        messagebox.showinfo("Config Reloaded", "Configuration reloaded successfully!")
-        # Refresh settings tab
+        """Reload configuration file; the settings tab refreshes when loading finishes."""
+        self.load_config(notify=True)
+        
+    def _refresh_settings_tab(self) -> None:
+        """Rebuild the settings tab with the current configuration."""
+        for widget in self.settings_frame.winfo_children():
+            widget.destroy()
         self.setup_settings_tab()
         
     def open_config_file(self) -> None:
@@ -941,8 +1023,9 @@ class KBFolderManagerGUI:
 
 def launch_gui() -> None:
     """Launch the GUI application."""
+    started = time.perf_counter()
     root = ttk.Window(themename="cosmo")  # Modern theme
-    app = KBFolderManagerGUI(root)
+    app = KBFolderManagerGUI(root, started=started)
     root.mainloop()
 
 
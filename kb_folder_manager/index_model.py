@@ -0,0 +1,437 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import ItemsView, Mapping, ValuesView
+from typing import Iterator
+
+_NO_HASH = 255
+
+
+class CompactIndex(Mapping):
+    """Memory-lean index that reads like the ``build_index`` dict.
+
+    Files and placeholders are stored as parallel arrays of directory id,
+    basename and scalar fields instead of one dict per entry keyed by the
+    full POSIX path. Digests are packed as raw bytes at a fixed stride, and
+    hash algorithm and placeholder suffix strings live in small interned
+    tables. ``index['files']`` and friends are read-only mapping views that
+    build the familiar ``{'kind': 'file', ...}`` entry dicts on access, so
+    existing callers keep working unchanged.
+    """
+
+    SECTIONS = ('files', 'dirs', 'placeholders', 'metadata')
+
+    def __init__(self) -> None:
+        # directory table; id 0 is the root and is not listed in 'dirs'
+        self._dir_paths: list[str] = ['']
+        self._dir_ids: dict[str, int] = {'': 0}
+        # files
+        self._f_dir = array('I')
+        self._f_name: list[str] = []
+        self._f_size = array('q')
+        self._f_mtime = array('d')
+        self._f_alg = array('B')
+        self._hash_buf = bytearray()
+        self._hash_width = 0
+        self._hash_overflow: dict[int, str] = {}
+        self._algs: list[str] = []
+        # placeholders
+        self._p_dir = array('I')
+        self._p_name: list[str] = []
+        self._p_suffix = array('B')
+        self._suffixes: list[str] = []
+        # per-directory sorted names for path lookups (see _lookup_table), built on first use and dropped on mutation
+        self._file_order: tuple[array, list[str], array] | None = None
+        self._placeholder_order: tuple[array, list[str], array] | None = None
+        self.metadata: dict = {}
+        # DirNode tree built on demand by tree.index_tree(); dropped on mutation
+        self.tree = None
+        # per dir id (root at 0): Merkle digests and stamps, child dir ids, and the file
+        # ordinals grouped by dir (dir_files[dir_file_starts[d]:dir_file_starts[d + 1]]);
+        # all filled by tree.record_tree_hashes() and dropped with the tree on mutation
+        self.dir_hashes: list[str] | None = None
+        self.dir_stamps: list[str] | None = None
+        self.dir_children: list[list[int]] | None = None
+        self.dir_files: array | None = None
+        self.dir_file_starts: array | None = None
+        # per-file type flags cached by classify.classify_index(); dropped on mutation
+        self.classifications: dict = {}
+
+    # -- building -----------------------------------------------------------
+
+    def _drop_tree(self) -> None:
+        self.tree = None
+        self.dir_hashes = self.dir_stamps = self.dir_children = None
+        self.dir_files = self.dir_file_starts = None
+
+    def add_dir(self, rel_path: str) -> int:
+        dir_id = self._dir_ids.get(rel_path)
+        if dir_id is None:
+            dir_id = len(self._dir_paths)
+            self._dir_paths.append(rel_path)
+            self._dir_ids[rel_path] = dir_id
+            self._drop_tree()
+        return dir_id
+
+    def dir_id(self, rel_path: str) -> int:
+        return self._dir_ids[rel_path]
+
+    def dir_path(self, dir_id: int) -> str:
+        return self._dir_paths[dir_id]
+
+    def _intern(self, table: list[str], value: str) -> int:
+        try:
+            return table.index(value)
+        except ValueError:
+            if len(table) >= _NO_HASH:
+                raise ValueError(f'too many distinct values in index table: {value}')
+            table.append(sys.intern(value))
+            return len(table) - 1
+
+    def add_file(self, dir_id: int, name: str, size: int, mtime: float, digest: str | None, algorithm: str | None) -> None:
+        ordinal = len(self._f_name)
+        self._file_order = None
+        self._drop_tree()
+        self.classifications.clear()
+        self._f_dir.append(dir_id)
+        self._f_name.append(name)
+        self._f_size.append(size)
+        self._f_mtime.append(mtime)
+        if digest is None or algorithm is None:
+            self._f_alg.append(_NO_HASH)
+            self._hash_buf.extend(bytes(self._hash_width))
+            return
+        raw = bytes.fromhex(digest)
+        if not self._hash_width:
+            # first digest fixes the stride; earlier unhashed entries get zero padding
+            self._hash_width = len(raw)
+            self._hash_buf.extend(bytes(self._hash_width * ordinal))
+        self._f_alg.append(self._intern(self._algs, algorithm))
+        if len(raw) == self._hash_width:
+            self._hash_buf.extend(raw)
+        else:
+            self._hash_overflow[ordinal] = digest
+            self._hash_buf.extend(bytes(self._hash_width))
+
+    def set_file_hash(self, ordinal: int, digest: str, algorithm: str) -> None:
+        """Record the digest of a file added without one (see ``indexer.hash_index``)."""
+        raw = bytes.fromhex(digest)
+        if not self._hash_width:
+            self._hash_width = len(raw)
+            self._hash_buf = bytearray(self._hash_width * len(self._f_name))
+        width = self._hash_width
+        self._f_alg[ordinal] = self._intern(self._algs, algorithm)
+        if len(raw) == width:
+            self._hash_buf[ordinal * width:(ordinal + 1) * width] = raw
+            self._hash_overflow.pop(ordinal, None)
+        else:
+            self._hash_overflow[ordinal] = digest
+        self._drop_tree()
+
+    def add_placeholder(self, dir_id: int, name: str, suffix: str) -> None:
+        self._p_dir.append(dir_id)
+        self._p_name.append(name)
+        self._p_suffix.append(self._intern(self._suffixes, suffix))
+        self._placeholder_order = None
+        self._drop_tree()
+        self.classifications.clear()
+
+    def extend(self, other: CompactIndex) -> None:
+        """Append every entry of ``other``, an index of a disjoint part of the same root.
+
+        Directories already present (e.g. a shard's top-level dir) are shared.
+        The arrays are copied in bulk with only the directory ids and the
+        small interned tables remapped; ``other.metadata['archived']`` is
+        carried over.
+        """
+        dir_map = array('I', [0])
+        for rel_path in other._dir_paths[1:]:
+            dir_map.append(self.add_dir(rel_path))
+        alg_map = bytearray(range(256))
+        for i, alg in enumerate(other._algs):
+            alg_map[i] = self._intern(self._algs, alg)
+        suffix_map = bytearray(range(256))
+        for i, suffix in enumerate(other._suffixes):
+            suffix_map[i] = self._intern(self._suffixes, suffix)
+
+        base = len(self._f_name)
+        count = len(other._f_name)
+        if other._hash_width and other._hash_width != self._hash_width:
+            if self._hash_width:
+                # differing digest widths: keep the shorter stride, the rest go to the overflow table
+                for ordinal in range(count):
+                    digest = other.file_hash(ordinal)
+                    if digest is not None:
+                        self._hash_overflow[base + ordinal] = digest
+                self._hash_buf.extend(bytes(self._hash_width * count))
+            else:
+                self._hash_width = other._hash_width
+                self._hash_buf = bytearray(self._hash_width * base) + other._hash_buf
+        else:
+            self._hash_buf.extend(other._hash_buf if other._hash_width else bytes(self._hash_width * count))
+        for ordinal, digest in other._hash_overflow.items():
+            self._hash_overflow[base + ordinal] = digest
+
+        self._f_dir.extend(array('I', map(dir_map.__getitem__, other._f_dir)))
+        self._f_name.extend(other._f_name)
+        self._f_size.extend(other._f_size)
+        self._f_mtime.extend(other._f_mtime)
+        self._f_alg.frombytes(other._f_alg.tobytes().translate(alg_map))
+        self._p_dir.extend(array('I', map(dir_map.__getitem__, other._p_dir)))
+        self._p_name.extend(other._p_name)
+        self._p_suffix.frombytes(other._p_suffix.tobytes().translate(suffix_map))
+        if other.metadata.get('archived'):
+            self.metadata.setdefault('archived', []).extend(other.metadata['archived'])
+        self._file_order = None
+        self._placeholder_order = None
+        self._drop_tree()
+        self.classifications.clear()
+
+    # -- entry access -------------------------------------------------------
+
+    def _join(self, dir_id: int, name: str) -> str:
+        parent = self._dir_paths[dir_id]
+        return f'{parent}/{name}' if parent else name
+
+    def file_path(self, ordinal: int) -> str:
+        return self._join(self._f_dir[ordinal], self._f_name[ordinal])
+
+    def file_size(self, ordinal: int) -> int:
+        return self._f_size[ordinal]
+
+    def file_hash(self, ordinal: int) -> str | None:
+        alg = self._f_alg[ordinal]
+        if alg == _NO_HASH:
+            return None
+        overflow = self._hash_overflow.get(ordinal)
+        if overflow is not None:
+            return overflow
+        width = self._hash_width
+        return self._hash_buf[ordinal * width:(ordinal + 1) * width].hex()
+
+    def file_entry(self, ordinal: int) -> dict:
+        entry = {
+            'kind': 'file',
+            'size': self._f_size[ordinal],
+            'mtime': self._f_mtime[ordinal],
+        }
+        alg = self._f_alg[ordinal]
+        if alg != _NO_HASH:
+            entry['hash'] = self.file_hash(ordinal)
+            entry['hash_alg'] = self._algs[alg]
+        return entry
+
+    def placeholder_path(self, ordinal: int) -> str:
+        return self._join(self._p_dir[ordinal], self._p_name[ordinal])
+
+    def placeholder_entry(self, ordinal: int) -> dict:
+        name = self._p_name[ordinal]
+        suffix = self._suffixes[self._p_suffix[ordinal]]
+        return {
+            'kind': 'placeholder_dir',
+            'placeholder_for_name': name[: -len(suffix)] if name.endswith(suffix) else name,
+            'placeholder_suffix': suffix,
+        }
+
+    def _lookup_table(self, dirs: array, names: list[str]) -> tuple[array, list[str], array]:
+        """Ordinals sorted by (dir id, name), their names, and where each dir id's run starts."""
+        # stable sorts: by name, then by dir id, so no per-entry key tuples are built
+        order = sorted(range(len(names)), key=names.__getitem__)
+        order.sort(key=dirs.__getitem__)
+        starts = array('I', bytes(4 * (len(self._dir_paths) + 1)))
+        for dir_id in dirs:
+            starts[dir_id + 1] += 1
+        for dir_id in range(len(self._dir_paths)):
+            starts[dir_id + 1] += starts[dir_id]
+        return array('I', order), [names[ordinal] for ordinal in order], starts
+
+    def _find(self, table: tuple[array, list[str], array], rel_path: str) -> int:
+        """Binary search the names of ``rel_path``'s directory in ``table`` (see ``_lookup_table``)."""
+        if not isinstance(rel_path, str):
+            raise KeyError(rel_path)
+        parent, _, name = rel_path.rpartition('/')
+        order, sorted_names, starts = table
+        dir_id = self._dir_ids.get(parent)
+        if dir_id is None or dir_id + 1 >= len(starts):
+            raise KeyError(rel_path)
+        end = starts[dir_id + 1]
+        i = bisect_left(sorted_names, name, starts[dir_id], end)
+        if i == end or sorted_names[i] != name:
+            raise KeyError(rel_path)
+        return order[i]
+
+    def file_ordinal(self, rel_path: str) -> int:
+        if self._file_order is None:
+            self._file_order = self._lookup_table(self._f_dir, self._f_name)
+        return self._find(self._file_order, rel_path)
+
+    def placeholder_ordinal(self, rel_path: str) -> int:
+        if self._placeholder_order is None:
+            self._placeholder_order = self._lookup_table(self._p_dir, self._p_name)
+        return self._find(self._placeholder_order, rel_path)
+
+    def dir_entry(self, dir_id: int) -> dict:
+        if self.dir_hashes is None:
+            return {'kind': 'dir'}
+        return {'kind': 'dir', 'tree_hash': self.dir_hashes[dir_id], 'tree_stamp': self.dir_stamps[dir_id]}
+
+    def dir_file_ordinals(self, dir_id: int) -> array:
+        """Ordinals of the files directly in ``dir_id``; needs the layout from ``tree.record_tree_hashes``."""
+        starts = self.dir_file_starts
+        return self.dir_files[starts[dir_id]:starts[dir_id + 1]]
+
+    def parent_id(self, dir_id: int) -> int:
+        parent, _, _name = self._dir_paths[dir_id].rpartition('/')
+        return self._dir_ids[parent]
+
+    def file_records(self) -> Iterator[tuple[int, str, int, float, str | None]]:
+        """Yield ``(dir_id, name, size, mtime, hash)`` for every file in insertion order."""
+        for ordinal, name in enumerate(self._f_name):
+            yield self._f_dir[ordinal], name, self._f_size[ordinal], self._f_mtime[ordinal], self.file_hash(ordinal)
+
+    def placeholder_records(self) -> Iterator[tuple[int, str]]:
+        return zip(self._p_dir, self._p_name)
+
+    def file_names(self) -> list[str]:
+        """Basenames of all files in insertion order (the internal list; do not modify)."""
+        return self._f_name
+
+    def placeholder_names(self) -> list[str]:
+        """Basenames of all placeholder dirs in insertion order (the internal list; do not modify)."""
+        return self._p_name
+
+    @property
+    def file_count(self) -> int:
+        return len(self._f_name)
+
+    @property
+    def dir_count(self) -> int:
+        return len(self._dir_paths) - 1
+
+    @property
+    def placeholder_count(self) -> int:
+        return len(self._p_name)
+
+    # -- dict compatibility -------------------------------------------------
+
+    def __getitem__(self, key: str):
+        if key == 'files':
+            return _FileSection(self)
+        if key == 'dirs':
+            return _DirSection(self)
+        if key == 'placeholders':
+            return _PlaceholderSection(self)
+        if key == 'metadata':
+            return self.metadata
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.SECTIONS)
+
+    def __len__(self) -> int:
+        return len(self.SECTIONS)
+
+    def to_dict(self) -> dict:
+        return {key: dict(self[key]) for key in self.SECTIONS}
+
+
+class _Section(Mapping):
+    def __init__(self, index: CompactIndex) -> None:
+        self._index = index
+
+    def _entry_items(self) -> Iterator[tuple[str, dict]]:
+        raise NotImplementedError
+
+    def items(self) -> ItemsView:
+        return _SectionItems(self)
+
+    def values(self) -> ValuesView:
+        return _SectionValues(self)
+
+
+class _SectionItems(ItemsView):
+    def __iter__(self):
+        return self._mapping._entry_items()
+
+
+class _SectionValues(ValuesView):
+    def __iter__(self):
+        for _key, value in self._mapping._entry_items():
+            yield value
+
+
+class _FileSection(_Section):
+    def __iter__(self) -> Iterator[str]:
+        index = self._index
+        paths = index._dir_paths
+        for dir_id, name in zip(index._f_dir, index._f_name):
+            parent = paths[dir_id]
+            yield f'{parent}/{name}' if parent else name
+
+    def __len__(self) -> int:
+        return self._index.file_count
+
+    def __getitem__(self, rel_path: str) -> dict:
+        return self._index.file_entry(self._index.file_ordinal(rel_path))
+
+    def __contains__(self, rel_path: object) -> bool:
+        try:
+            self._index.file_ordinal(rel_path)  # type: ignore[arg-type]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def _entry_items(self) -> Iterator[tuple[str, dict]]:
+        index = self._index
+        for ordinal, rel_path in enumerate(self):
+            yield rel_path, index.file_entry(ordinal)
+
+
+class _DirSection(_Section):
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index._dir_paths[1:])
+
+    def __len__(self) -> int:
+        return self._index.dir_count
+
+    def __getitem__(self, rel_path: str) -> dict:
+        if not rel_path or rel_path not in self._index._dir_ids:
+            raise KeyError(rel_path)
+        return self._index.dir_entry(self._index._dir_ids[rel_path])
+
+    def __contains__(self, rel_path: object) -> bool:
+        return bool(rel_path) and rel_path in self._index._dir_ids
+
+    def _entry_items(self) -> Iterator[tuple[str, dict]]:
+        index = self._index
+        for dir_id, rel_path in enumerate(index._dir_paths[1:], start=1):
+            yield rel_path, index.dir_entry(dir_id)
+
+
+class _PlaceholderSection(_Section):
+    def __iter__(self) -> Iterator[str]:
+        index = self._index
+        paths = index._dir_paths
+        for dir_id, name in zip(index._p_dir, index._p_name):
+            parent = paths[dir_id]
+            yield f'{parent}/{name}' if parent else name
+
+    def __len__(self) -> int:
+        return self._index.placeholder_count
+
+    def __getitem__(self, rel_path: str) -> dict:
+        return self._index.placeholder_entry(self._index.placeholder_ordinal(rel_path))
+
+    def __contains__(self, rel_path: object) -> bool:
+        try:
+            self._index.placeholder_ordinal(rel_path)  # type: ignore[arg-type]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def _entry_items(self) -> Iterator[tuple[str, dict]]:
+        index = self._index
+        for ordinal, rel_path in enumerate(self):
+            yield rel_path, index.placeholder_entry(ordinal)
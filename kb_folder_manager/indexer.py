@@ -1,84 +1,503 @@
 from __future__ import annotations
 
 import datetime as _dt
+import json
+import re
+import threading
+from collections.abc import Collection, Iterator, Mapping
 from pathlib import Path
 
+from .archive import ARCHIVE_MANIFEST_NAME, mount_archive
+from .index_model import CompactIndex
+from .tree import record_tree_hashes
 from .utils import (
+    NO_CACHE_HINTS,
+    CacheHints,
     Logger,
-    derive_placeholder_original,
-    file_mtime,
-    file_size,
+    PathContext,
+    PlaceholderManifest,
     hash_file,
     iter_walk,
-    rel_path_key,
+    stat_file,
+    to_extended_path,
     write_json,
 )
 
 
-def build_index(root: Path, placeholder_suffix: str, hash_algorithm: str, logger: Logger | None = None) -> dict:
-    files: dict[str, dict] = {}
-    dirs: dict[str, dict] = {}
-    placeholders: dict[str, dict] = {}
+# files re-hashed to check a prior index before its digests are reused
+REUSE_SAMPLE_FILES = 16
+
+
+class _Scanner:
+    """Adds what one ``iter_walk`` step sees to ``index``; shared by build_index and the shard workers."""
+
     progress_every = 10  # Reduced from 200 to 10 for more frequent GUI updates
-    file_count = 0
-    dir_count = 0
-    placeholder_count = 0
 
-    if logger:
-        logger.info(f'indexing started: {root}')
+    def __init__(
+        self,
+        index: CompactIndex,
+        root: Path,
+        placeholder_suffix: str,
+        hash_algorithm: str,
+        logger: Logger | None = None,
+        hash_files: bool = True,
+        hints: CacheHints = NO_CACHE_HINTS,
+        mount_archives: bool = False,
+    ) -> None:
+        self.index = index
+        self.ctx = PathContext(root)
+        self.placeholder_suffix = placeholder_suffix
+        self.hash_algorithm = hash_algorithm
+        self.logger = logger
+        self.hash_files = hash_files
+        self.hints = hints
+        self.mount_archives = mount_archives
+        self.file_count = 0
+        self.dir_count = 0
+        self.placeholder_count = 0
 
-    for rel_root, current_norm, dirs_list, files_list, placeholder_dirs in iter_walk(root, placeholder_suffix):
-        if rel_root != Path('.'):
-            key = rel_root.as_posix()
-            dirs[key] = {'kind': 'dir'}
+    def visit(
+        self,
+        rel_root: Path,
+        current_norm: Path,
+        dirs_list: list,
+        files_list: list,
+        placeholder_dirs: list,
+        manifest: PlaceholderManifest | None = None,
+    ) -> None:
+        index = self.index
+        logger = self.logger
+        rel_key = rel_root.as_posix()
+        parent_id = index.add_dir('' if rel_key == '.' else rel_key)
+        prefix = '' if rel_key == '.' else rel_key + '/'
+        if self.mount_archives and ARCHIVE_MANIFEST_NAME in files_list:
+            # an archived subtree: index the manifest instead of the volume files, and stop descending
+            try:
+                mounted = mount_archive(index, current_norm, prefix, self.placeholder_suffix, logger)
+            except (OSError, ValueError) as exc:
+                if logger is None:
+                    raise
+                # indexed as an ordinary directory, so the volumes show up as what is on disk
+                logger.error(f'invalid archive manifest: {prefix}{ARCHIVE_MANIFEST_NAME} ({exc})')
+            else:
+                self.file_count += mounted
+                dirs_list.clear()
+                return
         for d in dirs_list:
-            rel_path = (rel_root / d).as_posix()
-            dirs[rel_path] = {'kind': 'dir'}
-            dir_count += 1
-        for d in placeholder_dirs:
-            rel_path = (rel_root / d).as_posix()
-            placeholders[rel_path] = {
-                'kind': 'placeholder_dir',
-                'placeholder_for_name': derive_placeholder_original(d, placeholder_suffix),
-                'placeholder_suffix': placeholder_suffix,
-            }
-            placeholder_count += 1
+            index.add_dir(prefix + d)
+            self.dir_count += 1
+        for d in placeholder_dirs + manifest.names if manifest is not None else placeholder_dirs:
+            index.add_placeholder(parent_id, d, self.placeholder_suffix)
+            self.placeholder_count += 1
         for fname in files_list:
-            fpath = current_norm / fname
+            fpath = self.ctx.path(prefix + fname)
             try:
-                size = file_size(fpath)
-                mtime = file_mtime(fpath)
-                files[rel_path_key(root, fpath)] = {
-                    'kind': 'file',
-                    'size': size,
-                    'mtime': mtime,
-                    'hash': hash_file(fpath, hash_algorithm),
-                    'hash_alg': hash_algorithm,
-                }
-                file_count += 1
-                if logger and file_count % progress_every == 0:
+                st = stat_file(fpath)
+                size = st.st_size
+                mtime = st.st_mtime
+                if self.hash_files:
+                    digest = hash_file(fpath, self.hash_algorithm, self.hints)
+                    index.add_file(parent_id, fname, size, mtime, digest, self.hash_algorithm)
+                else:
+                    index.add_file(parent_id, fname, size, mtime, None, None)
+                self.file_count += 1
+                if logger and self.file_count % self.progress_every == 0:
                     logger.info(
-                        f'indexing progress: files={file_count} dirs={dir_count} placeholders={placeholder_count}'
+                        f'indexing progress: files={self.file_count} dirs={self.dir_count} '
+                        f'placeholders={self.placeholder_count}'
                     )
             except Exception as exc:
                 if logger:
                     logger.error(f'failed to index file: {fpath} ({exc})')
                 raise
 
-    return {
-        'files': files,
-        'dirs': dirs,
-        'placeholders': placeholders,
-        'metadata': {
+    def finish(self, root: Path) -> None:
+        self.index.metadata.update({
             'root_path': str(root),
             'generated_at': _dt.datetime.now().isoformat(timespec='seconds'),
-        },
-    }
+        })
+        record_tree_hashes(self.index)
+        if self.logger:
+            self.logger.info(
+                f'indexing complete: files={self.file_count} dirs={self.dir_count} placeholders={self.placeholder_count}'
+            )
+
+
+def build_index(
+    root: Path,
+    placeholder_suffix: str,
+    hash_algorithm: str,
+    logger: Logger | None = None,
+    hash_files: bool = True,
+    exclude: Collection[str] = (),
+    walk_workers: int = 1,
+    placeholder_manifests: bool = False,
+    hints: CacheHints = NO_CACHE_HINTS,
+    mount_archives: bool = False,
+) -> CompactIndex:
+    """Index ``root``; with ``hash_files=False`` only sizes and mtimes are recorded.
+
+    Directories in ``exclude`` (POSIX paths relative to ``root``) are listed
+    but not descended into. ``walk_workers`` directory listings run
+    concurrently (see ``utils.walk_tree``); ``placeholder_manifests`` reads
+    placeholders from per-directory manifests as well. Files are hashed
+    under the page-cache ``hints``. With ``mount_archives`` a directory
+    holding an archive manifest is indexed from the manifest (see
+    ``archive.mount_archive``) and recorded in ``metadata['archived']``;
+    otherwise it is an ordinary directory.
+    """
+    if logger:
+        logger.info(f'indexing started: {root}')
+    scanner = _Scanner(
+        CompactIndex(), root, placeholder_suffix, hash_algorithm, logger, hash_files, hints, mount_archives
+    )
+    for entry in iter_walk(root, placeholder_suffix, workers=walk_workers, placeholder_manifests=placeholder_manifests):
+        scanner.visit(*entry)
+        if exclude:
+            rel_key = entry[0].as_posix()
+            prefix = '' if rel_key == '.' else rel_key + '/'
+            entry[2][:] = [d for d in entry[2] if prefix + d not in exclude]
+    scanner.finish(root)
+    return scanner.index
+
+
+# a shard worker hashes files in batches of up to this many files or bytes
+HASH_BATCH_FILES = 256
+HASH_BATCH_BYTES = 64 * 1024 * 1024
+
+
+def _hash_batch(task: tuple) -> tuple[list[str], tuple[int, BaseException] | None]:
+    """Worker: hash ``paths`` in order; stops at the first failure and returns its position."""
+    paths, hash_algorithm, hints = task
+    digests: list[str] = []
+    for pos, path in enumerate(paths):
+        try:
+            digests.append(hash_file(path, hash_algorithm, hints))
+        except Exception as exc:
+            return digests, (pos, exc)
+    return digests, None
+
+
+def _batches(index: CompactIndex, pending: list[int]) -> Iterator[list[int]]:
+    batch: list[int] = []
+    size = 0
+    for ordinal in pending:
+        batch.append(ordinal)
+        size += index.file_size(ordinal)
+        if len(batch) >= HASH_BATCH_FILES or size >= HASH_BATCH_BYTES:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+def hash_index(
+    index: CompactIndex,
+    root: Path,
+    hash_algorithm: str,
+    logger: Logger | None = None,
+    stop: threading.Event | None = None,
+    processes: int = 1,
+    hints: CacheHints = NO_CACHE_HINTS,
+) -> bool:
+    """Hash the files of a ``build_index(..., hash_files=False)`` index in place.
+
+    Files that already have a digest (e.g. mounted from an archive manifest)
+    are skipped. With ``processes > 1`` the files are hashed in batches by a
+    process pool; either way under the page-cache ``hints``. Returns False if ``stop`` was set before every file was
+    hashed; the tree hashes are only recorded once all digests are in.
+    """
+    ctx = PathContext(root)
+    pending = [i for i in range(index.file_count) if index.file_hash(i) is None]
+    total = len(pending)
     if logger:
-        logger.info(
-            f'indexing complete: files={file_count} dirs={dir_count} placeholders={placeholder_count}'
-        )
+        logger.info(f'hashing started: {root} files={total}')
+    if processes > 1 and total > 1:
+        done = _hash_pending_parallel(index, ctx, pending, hash_algorithm, logger, stop, processes, hints)
+        if done < total:
+            if logger:
+                logger.info(f'hashing stopped: {root} files={done}/{total}')
+            return False
+        record_tree_hashes(index)
+        return True
+    for done, ordinal in enumerate(pending, start=1):
+        if stop is not None and stop.is_set():
+            if logger:
+                logger.info(f'hashing stopped: {root} files={done - 1}/{total}')
+            return False
+        rel_path = index.file_path(ordinal)
+        try:
+            index.set_file_hash(ordinal, hash_file(ctx.path(rel_path), hash_algorithm, hints), hash_algorithm)
+        except Exception as exc:
+            if logger:
+                logger.error(f'failed to hash file: {rel_path} ({exc})')
+            raise
+        if logger and (done % 10 == 0 or done == total):
+            logger.info(f'hashing progress: {done}/{total}')
+    record_tree_hashes(index)
+    return True
+
+
+def _hash_pending_parallel(
+    index: CompactIndex,
+    ctx: PathContext,
+    pending: list[int],
+    hash_algorithm: str,
+    logger: Logger | None,
+    stop: threading.Event | None,
+    processes: int,
+    hints: CacheHints,
+) -> int:
+    """``hash_index`` over a process pool; returns how many files were hashed before ``stop`` was set."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    total = len(pending)
+    done = 0
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        batches = list(_batches(index, pending))
+        futures = [
+            pool.submit(_hash_batch, ([ctx.path(index.file_path(o)) for o in batch], hash_algorithm, hints))
+            for batch in batches
+        ]
+        try:
+            # collected in submission order, so the index is filled the way the serial loop fills it
+            for batch, future in zip(batches, futures):
+                if stop is not None and stop.is_set():
+                    return done
+                digests, failure = future.result()
+                for ordinal, digest in zip(batch, digests):
+                    index.set_file_hash(ordinal, digest, hash_algorithm)
+                done += len(digests)
+                if failure is not None:
+                    pos, exc = failure
+                    if logger:
+                        logger.error(f'failed to hash file: {index.file_path(batch[pos])} ({exc})')
+                    raise exc
+                if logger:
+                    logger.info(f'hashing progress: {done}/{total}')
+        finally:
+            for future in futures:
+                future.cancel()
+    return done
+
+
+def fill_hashes(index: CompactIndex, digests: Mapping[str, str], hash_algorithm: str) -> int:
+    """Set known ``digests`` (keyed by relative path) on files that have none; return how many were set."""
+    filled = 0
+    for ordinal in range(index.file_count):
+        if index.file_hash(ordinal) is None:
+            digest = digests.get(index.file_path(ordinal))
+            if digest is not None:
+                index.set_file_hash(ordinal, digest, hash_algorithm)
+                filled += 1
+    return filled
+
+
+def reuse_hashes(
+    index: CompactIndex,
+    prior: Mapping,
+    root: Path,
+    hash_algorithm: str,
+    logger: Logger | None = None,
+    sample: int = REUSE_SAMPLE_FILES,
+) -> int:
+    """Take digests from a previously saved index for files whose size and mtime are unchanged.
+
+    Up to ``sample`` of those files, spread over the index, are hashed
+    first; if any digest differs the prior index is not used at all.
+    Returns the number of digests taken over; ``hash_index`` then hashes
+    the rest.
+    """
+    prior_files = prior.get('files', {})
+    reusable: dict[str, str] = {}
+    for ordinal, (_dir_id, _name, size, mtime, digest) in enumerate(index.file_records()):
+        if digest is not None:
+            continue
+        rel_path = index.file_path(ordinal)
+        entry = prior_files.get(rel_path)
+        if (
+            entry
+            and entry.get('hash')
+            and entry.get('hash_alg') == hash_algorithm
+            and entry.get('size') == size
+            and entry.get('mtime') == mtime
+        ):
+            reusable[rel_path] = entry['hash']
+
+    ctx = PathContext(root)
+    candidates = list(reusable.items())
+    checked = candidates[::max(1, len(candidates) // sample)][:sample] if sample > 0 else []
+    for rel_path, digest in checked:
+        if hash_file(ctx.path(rel_path), hash_algorithm) != digest:
+            if logger:
+                logger.warning(f'prior index is stale (sampled hash differs: {rel_path}); hashing all files of {root}')
+            return 0
+    filled = fill_hashes(index, reusable, hash_algorithm)
+    if logger:
+        logger.info(f'reused prior hashes: {root} files={filled}/{index.file_count} sampled={len(checked)}')
+    return filled
+
+
+class _SortedSection(Mapping):
+    def __init__(self, section: Mapping) -> None:
+        self._section = section
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self._section))
+
+    def __len__(self) -> int:
+        return len(self._section)
+
+    def __getitem__(self, key: str):
+        return self._section[key]
+
+
+class _SortedIndex(Mapping):
+    """Write view of an index: metadata first, then every section in path order."""
+
+    SECTIONS = ('metadata', 'files', 'dirs', 'placeholders')
+
+    def __init__(self, index: Mapping) -> None:
+        self._index = index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.SECTIONS)
+
+    def __len__(self) -> int:
+        return len(self.SECTIONS)
+
+    def __getitem__(self, key: str):
+        if key == 'metadata':
+            return dict(self._index.get('metadata', {}), sorted=True)
+        return _SortedSection(self._index.get(key, {}))
+
+
+def write_index(path: Path, index: Mapping) -> None:
+    """Save ``index`` with metadata first and entries sorted by path (``metadata.sorted``)."""
+    write_json(path, _SortedIndex(index))
+
+
+def load_index(path: Path) -> dict:
+    with open(to_extended_path(path), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get('files'), dict):
+        raise ValueError(f'not a kb index file: {path}')
+    return data
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class IndexReader:
+    """Reads a saved index one entry at a time instead of loading it whole.
+
+    Metadata is available up front when it is the first key, as
+    ``write_index`` writes it. Sections are then read in file order with
+    ``section(name)``, each iterator being exhausted before the next section
+    is requested. Memory use is bounded by the read chunk, not the index size.
+    """
+
+    CHUNK_CHARS = 1024 * 1024
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._f = open(to_extended_path(path), 'r', encoding='utf-8')
+        self._buf = ''
+        self._pos = 0
+        self._decode = json.JSONDecoder().raw_decode
+        self.metadata: dict = {}
+        try:
+            self._expect('{')
+            self._next_key = None if self._end_of('}') else self._key()
+            if self._next_key == 'metadata':
+                self.metadata = self._value()
+                self._next_key = self._next_member()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self) -> IndexReader:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._f.close()
+
+    @property
+    def is_sorted(self) -> bool:
+        return self.metadata.get('sorted') is True
+
+    def section(self, name: str) -> Iterator[tuple[str, dict]]:
+        if self._next_key != name:
+            raise ValueError(f'expected section {name!r} in {self.path}, found {self._next_key!r}')
+        return self._iter_section()
+
+    def _iter_section(self) -> Iterator[tuple[str, dict]]:
+        self._expect('{')
+        key = None if self._end_of('}') else self._key()
+        while key is not None:
+            yield key, self._value()
+            key = self._next_member()
+        self._next_key = self._next_member()
+
+    # -- tokens -------------------------------------------------------------
+
+    def _fill(self) -> bool:
+        data = self._f.read(self.CHUNK_CHARS)
+        if not data:
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char: str) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(f'malformed index {self.path}: expected {char!r}, found {found!r}')
+        self._pos += 1
+
+    def _end_of(self, char: str) -> bool:
+        if self._peek() == char:
+            self._pos += 1
+            return True
+        return False
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number cut off by the chunk boundary still decodes; make sure it really ended
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
 
+    def _key(self) -> str:
+        key = self._value()
+        if not isinstance(key, str):
+            raise ValueError(f'malformed index {self.path}: expected a key, found {key!r}')
+        self._expect(':')
+        return key
 
-def write_index(path: Path, index: dict) -> None:
-    write_json(path, index)
+    def _next_member(self) -> str | None:
+        """After a value: the next key of the enclosing object, or None at its end."""
+        if self._end_of(','):
+            return self._key()
+        self._expect('}')
+        return None
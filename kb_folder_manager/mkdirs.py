@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+from . import profiling
+from .utils import PathContext
+
+
+def _with_ancestors(rel_dirs: Iterable[str]) -> list[str]:
+    needed: set[str] = set()
+    for rel_dir in rel_dirs:
+        rel_dir = rel_dir.strip('/')
+        while rel_dir and rel_dir not in needed:
+            needed.add(rel_dir)
+            rel_dir = rel_dir.rpartition('/')[0]
+    # a parent is a prefix of its children, so it always sorts first
+    return sorted(needed)
+
+
+def _create(ctx: PathContext, rel_dirs: list[str]) -> int:
+    created = 0
+    for rel_dir in rel_dirs:
+        path = ctx.path(rel_dir)
+        try:
+            os.mkdir(path)
+            created += 1
+        except FileExistsError:
+            if not os.path.isdir(path):
+                raise
+    return created
+
+
+def make_dirs(root: Path, rel_dirs: Iterable[str], workers: int = 1) -> int:
+    """Create ``root`` and every POSIX-relative directory in ``rel_dirs`` below it.
+
+    The root is resolved once; each needed directory (including implied
+    parents) is created with a single ``mkdir`` in sorted order, so no
+    directory is attempted twice and no per-path resolve happens. With
+    ``workers > 1`` independent top-level subtrees are created in parallel,
+    which helps on network storage where every ``mkdir`` is a round trip.
+    Returns the number of directories actually created.
+    """
+    ctx = PathContext(root)
+    os.makedirs(ctx.base, exist_ok=True)
+    ordered = _with_ancestors(rel_dirs)
+    if workers <= 1 or len(ordered) < 2:
+        created = _create(ctx, ordered)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        groups: dict[str, list[str]] = {}
+        for rel_dir in ordered:
+            groups.setdefault(rel_dir.partition('/')[0], []).append(rel_dir)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            created = sum(pool.map(lambda group: _create(ctx, group), groups.values()))
+    profiling.count('dirs_created', created)
+    return created
@@ -1,23 +1,51 @@
 from __future__ import annotations
 
+import os
+import threading
+from collections.abc import Mapping
 from pathlib import Path
 
+from .classify import specified_files
 from .config import Config
-from .indexer import build_index, write_index
+from .index_model import CompactIndex
+from .indexer import build_index, fill_hashes, hash_index, load_index, reuse_hashes, write_index
+from .mkdirs import make_dirs
+from .pathsets import PathUniverse
+from .planner import (
+    SPLIT_PLAN_FILE_NAME,
+    SplitPlan,
+    build_split_plan,
+    estimate_seconds,
+    measure_throughput,
+    write_plan,
+)
+from .profiling import Profiler, profiled
+from .tree import index_tree, localize_differences, root_hash
 from .utils import (
+    NO_CACHE_HINTS,
+    PLACEHOLDER_MANIFEST_NAME,
+    CacheHints,
     FatalError,
     Logger,
+    PathContext,
     abort_if_blockers,
     copy_file,
+    copy_file_hashed,
+    dir_is_empty,
+    empty_dir_probe,
     ensure_dir,
-    is_specified_type,
+    hash_file,
+    iter_walk,
     now_timestamp,
     prompt_confirm,
     safe_scandir,
+    stat_file,
+    write_json,
+    write_placeholder_manifest,
     write_summary,
 )
 from .validator import (
-    _placeholder_original_path,
+    compare_index_files,
     compare_indexes,
     index_for_validation,
     validate_class1,
@@ -26,6 +54,10 @@ from .validator import (
 )
 
 
+# merged files read back after the copy to check the written bytes
+MERGE_VERIFY_SAMPLE_FILES = 16
+
+
 def _check_output_root(output_root: Path, force: bool) -> tuple[bool, str | None]:
     if output_root.exists():
         with safe_scandir(output_root) as it:
@@ -44,178 +76,449 @@ def _make_log_dir(output_root: Path) -> Path:
     return log_dir
 
 
-def split_operation(source: Path, output_root: Path, config: Config, force: bool, auto_yes: bool) -> None:
+class _PrecheckHasher:
+    """Content hashing of pre-check indexes scanned with ``hash_files=False``.
+
+    Each job may carry a prior index of the same folder whose digests are
+    reused for unchanged files (see ``indexer.reuse_hashes``). With
+    ``config.processes > 1`` the files are hashed by a process pool.
+
+    Hashing runs after the metadata rules passed, or, with
+    ``config.overlap_hashing``, on a background thread started right away so
+    reading file content overlaps with the remaining rules; it is then
+    stopped as soon as a rule blocks the run.
+    """
+
+    def __init__(self, jobs: list[tuple[CompactIndex, Path, Mapping | None]], config: Config, logger: Logger) -> None:
+        self._jobs = jobs
+        self._hash_algorithm = config.hash_algorithm
+        self._processes = config.processes
+        self._hints = config.cache_policy
+        self._logger = logger
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        self._thread: threading.Thread | None = None
+        if config.overlap_hashing:
+            logger.info('hashing in the background while the metadata checks run')
+            self._thread = threading.Thread(target=self._run, name='precheck-hash', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            for index, root, prior in self._jobs:
+                if prior is not None:
+                    reuse_hashes(index, prior, root, self._hash_algorithm, self._logger)
+                if not hash_index(
+                    index, root, self._hash_algorithm, self._logger, self._stop, self._processes, self._hints
+                ):
+                    return
+        except BaseException as exc:
+            self._error = exc
+
+    def finish(self) -> None:
+        if self._thread is None:
+            self._run()
+        else:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def cancel(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _abort_precheck_if_blockers(logger: Logger, hasher: _PrecheckHasher, action: str) -> None:
+    if logger.result.has_blockers():
+        hasher.cancel()
+        write_summary(logger)
+        abort_if_blockers(logger, action)
+
+
+def split_operation(
+    source: Path,
+    output_root: Path,
+    config: Config,
+    force: bool,
+    auto_yes: bool,
+    profile: bool = False,
+    archive: bool = False,
+) -> None:
     ok, warning = _check_output_root(output_root, force)
     if not ok:
         raise FatalError(warning or 'output root check failed')
     log_dir = _make_log_dir(output_root)
-    pre_log = Logger(log_dir / 'Split_pre_check.log')
-    try:
-        if warning:
-            pre_log.warning(warning)
-        pre_log.info(f'output root ready: {output_root}')
-        pre_log.info('building complete index')
-        complete_index = build_index(source, config.placeholder_suffix, config.hash_algorithm, pre_log)
-        write_index(output_root / 'index' / 'complete' / '.kb_index.json', complete_index)
-        pre_log.info('running class1 validation on complete folder')
-        validate_class1(source, config, allow_placeholders=False, logger=pre_log)
-        write_summary(pre_log)
-        abort_if_blockers(pre_log, 'split pre-check')
-    finally:
-        pre_log.close()
-
-    prompt_confirm('Pre-check passed. Continue split?', auto_yes)
-
-    exec_log = Logger(log_dir / 'Split.log')
-    try:
-        folder_name = source.name
-        doc_root = output_root / 'doc' / folder_name
-        res_root = output_root / 'res' / folder_name
-        ensure_dir(doc_root)
-        ensure_dir(res_root)
-
-        # Create directories from complete index
-        for rel_dir in complete_index.get('dirs', {}).keys():
-            ensure_dir(doc_root / rel_dir)
-            ensure_dir(res_root / rel_dir)
-
-        files_list = list(complete_index.get('files', {}).keys())
-        total_files = len(files_list)
-        exec_log.info(f'split copy started: total_files={total_files}')
-        for idx, rel_path in enumerate(files_list, start=1):
-            name = Path(rel_path).name
-            is_spec = is_specified_type(name, config.specified_types)
-            src_file = source / rel_path
-            if is_spec:
-                copy_file(src_file, doc_root / rel_path)
-                placeholder_name = name + config.placeholder_suffix
-                placeholder_path = (res_root / Path(rel_path).parent / placeholder_name)
-                ensure_dir(placeholder_path)
+    with profiled(log_dir, profile) as profiler:
+        pre_log = Logger(log_dir / 'Split_pre_check.log')
+        try:
+            if warning:
+                pre_log.warning(warning)
+            pre_log.info(f'output root ready: {output_root}')
+            # metadata first: a bad name or symlink is rejected before any file content is read
+            pre_log.info('scanning complete folder')
+            with profiler.phase('precheck.scan'):
+                complete_index, class1_complete = _scan(source, config, False, pre_log)
+            hasher = _PrecheckHasher([(complete_index, source, None)], config, pre_log)
+            try:
+                if complete_index.get('metadata', {}).get('archived'):
+                    pre_log.fatal(
+                        f'complete folder contains archived subtrees; extract the volumes before splitting: {source}'
+                    )
+                _abort_precheck_if_blockers(pre_log, hasher, 'split pre-check')
+
+                pre_log.info('running class1 validation on complete folder')
+                with profiler.phase('precheck.class1'):
+                    class1_complete()
+                _abort_precheck_if_blockers(pre_log, hasher, 'split pre-check')
+                pre_log.info('hashing complete folder')
+                with profiler.phase('precheck.hash'):
+                    hasher.finish()
+            finally:
+                hasher.cancel()
+            write_index(output_root / 'index' / 'complete' / '.kb_index.json', complete_index)
+            write_summary(pre_log)
+            abort_if_blockers(pre_log, 'split pre-check')
+        finally:
+            pre_log.close()
+
+        with profiler.paused():
+            prompt_confirm('Pre-check passed. Continue split?', auto_yes)
+
+        exec_log = Logger(log_dir / 'Split.log')
+        try:
+            folder_name = source.name
+            doc_root = output_root / 'doc' / folder_name
+            res_root = output_root / 'res' / folder_name
+
+            plan = build_split_plan(source, complete_index, config.specified_types, config.placeholder_suffix)
+            write_plan(output_root / 'index' / SPLIT_PLAN_FILE_NAME, plan)
+            _execute_split_plan(
+                plan, source, doc_root, res_root, config.mkdir_workers, profiler, exec_log, config.placeholder_mode,
+                config.cache_policy,
+            )
+
+            exec_log.info('writing doc/res indexes')
+            with profiler.phase('postcheck.index'):
+                doc_index = build_index(
+                    doc_root, config.placeholder_suffix, config.hash_algorithm, exec_log,
+                    walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                    hints=config.cache_policy,
+                )
+                res_index = build_index(
+                    res_root, config.placeholder_suffix, config.hash_algorithm, exec_log,
+                    walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                    hints=config.cache_policy,
+                )
+                write_index(output_root / 'index' / 'doc' / '.kb_index.json', doc_index)
+                write_index(output_root / 'index' / 'res' / '.kb_index.json', res_index)
+
+            exec_log.info('running post-check validations')
+            with profiler.phase('postcheck.class2'):
+                validate_class2(doc_index, 'doc', config, exec_log)
+                validate_class2(res_index, 'res', config, exec_log)
+            with profiler.phase('postcheck.mutual'):
+                validate_mutual(doc_index, res_index, config, exec_log)
+            if archive and not exec_log.result.has_blockers():
+                exec_log.info('archiving res')
+                with profiler.phase('archive'):
+                    _archive_res(res_root, output_root / 'res_archive' / folder_name, res_index, config, exec_log)
+            profiler.log_summary(exec_log)
+            write_summary(exec_log)
+            abort_if_blockers(exec_log, 'split post-check')
+        finally:
+            exec_log.close()
+
+
+def _execute_split_plan(
+    plan: SplitPlan,
+    source: Path,
+    doc_root: Path,
+    res_root: Path,
+    workers: int,
+    profiler: Profiler,
+    logger: Logger,
+    placeholder_mode: str = 'dirs',
+    hints: CacheHints = NO_CACHE_HINTS,
+) -> None:
+    roots = {'doc': doc_root, 'res': res_root}
+    listed: dict[tuple[str, str], list[str]] = {}
+    with profiler.phase('split.mkdirs'):
+        wanted = {'doc': list(plan.dirs), 'res': list(plan.dirs)}
+        for side, rel_path in plan.placeholders():
+            if placeholder_mode == 'manifest':
+                parent, _, name = rel_path.rpartition('/')
+                listed.setdefault((side, parent), []).append(name)
             else:
-                copy_file(src_file, res_root / rel_path)
-                placeholder_name = name + config.placeholder_suffix
-                placeholder_path = (doc_root / Path(rel_path).parent / placeholder_name)
-                ensure_dir(placeholder_path)
+                wanted[side].append(rel_path)
+        for side, root in roots.items():
+            created = make_dirs(root, wanted[side], workers)
+            logger.info(f'split mkdirs: {side} directories created={created}')
+    if listed:
+        with profiler.phase('split.placeholders'):
+            ctxs = {side: PathContext(root) for side, root in roots.items()}
+            for (side, parent), names in listed.items():
+                write_placeholder_manifest(ctxs[side].path(parent), names, plan.placeholder_suffix)
+            logger.info(f'split placeholder manifests written: {len(listed)}')
+
+    total_files = len(plan.copy_paths)
+    logger.info(f'split copy started: total_files={total_files}')
+    src_ctx = PathContext(source)
+    dst_ctx = {side: PathContext(root) for side, root in roots.items()}
+    with profiler.phase('split.copy'):
+        for idx, (side, rel_path) in enumerate(plan.copies(), start=1):
+            copy_file(src_ctx.path(rel_path), dst_ctx[side].path(rel_path), make_parent=False, hints=hints)
             # Report progress more frequently (every 10 files instead of 200) and always on last file
             if idx % 10 == 0 or idx == total_files:
-                exec_log.info(f'split copy progress: {idx}/{total_files} | current: {rel_path}')
-
-        exec_log.info('writing doc/res indexes')
-        doc_index = build_index(doc_root, config.placeholder_suffix, config.hash_algorithm, exec_log)
-        res_index = build_index(res_root, config.placeholder_suffix, config.hash_algorithm, exec_log)
-        write_index(output_root / 'index' / 'doc' / '.kb_index.json', doc_index)
-        write_index(output_root / 'index' / 'res' / '.kb_index.json', res_index)
-
-        exec_log.info('running post-check validations')
-        validate_class2(doc_index, 'doc', config, exec_log)
-        validate_class2(res_index, 'res', config, exec_log)
-        validate_mutual(doc_index, res_index, config, exec_log)
-        write_summary(exec_log)
-        abort_if_blockers(exec_log, 'split post-check')
-    finally:
-        exec_log.close()
-
-
-def merge_operation(doc_path: Path, res_path: Path, output_root: Path, config: Config, force: bool, auto_yes: bool) -> None:
+                logger.info(f'split copy progress: {idx}/{total_files} | current: {rel_path}')
+
+
+def split_dry_run_operation(
+    source: Path, output_root: Path, config: Config, plan_path: Path | None = None
+) -> SplitPlan:
+    """Plan a split and print its size and estimated duration without writing to ``output_root``."""
+    if not source.is_dir():
+        raise FatalError(f'source folder not found: {source}')
+    print(f'[INFO] dry-run: scanning {source} (sizes only, no hashing)')
+    index = build_index(
+        source, config.placeholder_suffix, config.hash_algorithm, hash_files=False,
+        walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+    )
+    plan = build_split_plan(source, index, config.specified_types, config.placeholder_suffix)
+    summary = plan.summary()
+    throughput = measure_throughput(source, plan, output_root)
+    seconds = estimate_seconds(plan, throughput)
+    print(f"[INFO] dry-run: doc files={summary['files_doc']} bytes={summary['bytes_doc']}")
+    print(f"[INFO] dry-run: res files={summary['files_res']} bytes={summary['bytes_res']}")
+    print(
+        f"[INFO] dry-run: placeholders doc={summary['placeholders_doc']} res={summary['placeholders_res']} "
+        f"dirs={summary['dirs']} (created on both sides)"
+    )
+    rates = ' '.join(
+        f"{key}={value / (1024 * 1024):.1f}MB/s" if value else f'{key}=n/a'
+        for key, value in (('read', throughput['read_bytes_per_second']), ('write', throughput['write_bytes_per_second']))
+    )
+    print(f"[INFO] dry-run: measured {rates} per_file={throughput['per_file_seconds'] * 1000:.2f}ms")
+    print(f"[INFO] dry-run: total bytes={summary['total_bytes']} estimated duration={seconds:.1f}s (~{seconds / 3600:.2f}h)")
+    if plan_path is not None:
+        write_plan(plan_path, plan)
+        print(f'[INFO] dry-run: plan written to {plan_path}')
+    return plan
+
+
+def _archive_res(res_root: Path, archive_dir: Path, res_index, config: Config, logger: Logger) -> dict:
+    from .archive import archive_tree
+
+    return archive_tree(
+        res_root,
+        archive_dir,
+        res_index,
+        config.use_7zip,
+        config.archive_format,
+        config.archive_volume_mb * 1024 * 1024,
+        config.archive_workers,
+        logger,
+    )
+
+
+def _scan(root: Path, config: Config, allow_placeholders: bool, logger: Logger, hash_files: bool = False):
+    """Index ``root`` and prepare its class1 check; returns ``(index, run_class1)``.
+
+    Archive manifests are mounted, so the caller can refuse archived
+    subtrees from ``metadata['archived']`` instead of copying volumes.
+
+    With ``config.processes > 1`` both happen in one sharded walk (see
+    ``sharding.sharded_scan``) and ``run_class1`` only replays the messages.
+    """
+    if config.processes > 1:
+        from .sharding import sharded_scan
+
+        return sharded_scan(
+            root, config.placeholder_suffix, config.hash_algorithm, config.processes,
+            allow_placeholders, logger, hash_files=hash_files, walk_workers=config.walk_workers,
+            normalize_nfc=config.case_conflict_nfc, placeholder_manifests=config.placeholder_manifests,
+            hints=config.cache_policy, mount_archives=True,
+        )
+    index = build_index(
+        root, config.placeholder_suffix, config.hash_algorithm, logger,
+        hash_files=hash_files, walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+        hints=config.cache_policy, mount_archives=True,
+    )
+    return index, lambda: validate_class1(root, config, allow_placeholders=allow_placeholders, logger=logger)
+
+
+def _load_prior_index(folder: Path, role: str, index_path: Path | None, logger: Logger) -> dict | None:
+    """The index split saved for ``folder``: ``index_path``, or ``<output root>/index/<role>/.kb_index.json``.
+
+    A missing or unreadable index just means every file is hashed.
+    """
+    if index_path is None:
+        index_path = folder.parent.parent / 'index' / role / '.kb_index.json'
+        if not index_path.is_file():
+            return None
+    try:
+        prior = load_index(index_path)
+    except (OSError, ValueError) as exc:
+        logger.warning(f'ignoring prior {role} index {index_path}: {exc}')
+        return None
+    logger.info(f'using prior {role} index: {index_path}')
+    return prior
+
+
+def merge_operation(
+    doc_path: Path,
+    res_path: Path,
+    output_root: Path,
+    config: Config,
+    force: bool,
+    auto_yes: bool,
+    profile: bool = False,
+    doc_index_path: Path | None = None,
+    res_index_path: Path | None = None,
+) -> None:
     ok, warning = _check_output_root(output_root, force)
     if not ok:
         raise FatalError(warning or 'output root check failed')
     log_dir = _make_log_dir(output_root)
-    pre_log = Logger(log_dir / 'Merge_pre_check.log')
-    try:
-        if warning:
-            pre_log.warning(warning)
-        pre_log.info(f'output root ready: {output_root}')
-        if doc_path.name != res_path.name:
-            pre_log.fatal(f'folder name mismatch: {doc_path.name} vs {res_path.name}')
-        if pre_log.result.has_blockers():
+    with profiled(log_dir, profile) as profiler:
+        pre_log = Logger(log_dir / 'Merge_pre_check.log')
+        try:
+            if warning:
+                pre_log.warning(warning)
+            pre_log.info(f'output root ready: {output_root}')
+            if doc_path.name != res_path.name:
+                pre_log.fatal(f'folder name mismatch: {doc_path.name} vs {res_path.name}')
+            if pre_log.result.has_blockers():
+                write_summary(pre_log)
+                abort_if_blockers(pre_log, 'merge pre-check')
+
+            doc_prior = _load_prior_index(doc_path, 'doc', doc_index_path, pre_log)
+            res_prior = _load_prior_index(res_path, 'res', res_index_path, pre_log)
+            pre_log.info('scanning doc/res')
+            with profiler.phase('precheck.scan'):
+                doc_index, class1_doc = _scan(doc_path, config, True, pre_log)
+                res_index, class1_res = _scan(res_path, config, True, pre_log)
+            hasher = _PrecheckHasher([(doc_index, doc_path, doc_prior), (res_index, res_path, res_prior)], config, pre_log)
+            try:
+                if res_index.get('metadata', {}).get('archived'):
+                    pre_log.fatal(f'res contains archived subtrees; extract the volumes before merging: {res_path}')
+                _abort_precheck_if_blockers(pre_log, hasher, 'merge pre-check')
+
+                pre_log.info('running class1 validation on doc/res')
+                with profiler.phase('precheck.class1'):
+                    class1_doc()
+                    class1_res()
+                _abort_precheck_if_blockers(pre_log, hasher, 'merge pre-check')
+                pre_log.info('running class2 validation on doc/res')
+                with profiler.phase('precheck.class2'):
+                    validate_class2(doc_index, 'doc', config, pre_log)
+                    validate_class2(res_index, 'res', config, pre_log)
+                pre_log.info('running mutual validation')
+                with profiler.phase('precheck.mutual'):
+                    validate_mutual(doc_index, res_index, config, pre_log)
+                _abort_precheck_if_blockers(pre_log, hasher, 'merge pre-check')
+                pre_log.info('hashing doc/res')
+                with profiler.phase('precheck.hash'):
+                    hasher.finish()
+            finally:
+                hasher.cancel()
+            write_index(output_root / 'index' / 'merge_check_doc' / '.kb_index.json', doc_index)
+            write_index(output_root / 'index' / 'merge_check_res' / '.kb_index.json', res_index)
             write_summary(pre_log)
             abort_if_blockers(pre_log, 'merge pre-check')
-
-        pre_log.info('building doc/res indexes')
-        doc_index = build_index(doc_path, config.placeholder_suffix, config.hash_algorithm, pre_log)
-        res_index = build_index(res_path, config.placeholder_suffix, config.hash_algorithm, pre_log)
-        write_index(output_root / 'index' / 'merge_check_doc' / '.kb_index.json', doc_index)
-        write_index(output_root / 'index' / 'merge_check_res' / '.kb_index.json', res_index)
-
-        pre_log.info('running class1 validation on doc/res')
-        validate_class1(doc_path, config, allow_placeholders=True, logger=pre_log)
-        validate_class1(res_path, config, allow_placeholders=True, logger=pre_log)
-        pre_log.info('running class2 validation on doc/res')
-        validate_class2(doc_index, 'doc', config, pre_log)
-        validate_class2(res_index, 'res', config, pre_log)
-        pre_log.info('running mutual validation')
-        validate_mutual(doc_index, res_index, config, pre_log)
-        write_summary(pre_log)
-        abort_if_blockers(pre_log, 'merge pre-check')
-    finally:
-        pre_log.close()
-
-    prompt_confirm('Pre-check passed. Continue merge?', auto_yes)
-
-    exec_log = Logger(log_dir / 'Merge.log')
-    try:
-        folder_name = doc_path.name
-        complete_root = output_root / 'complete' / folder_name
-        ensure_dir(complete_root)
-
-        # Pre-create directory structure
-        for rel_dir in doc_index.get('dirs', {}).keys():
-            ensure_dir(complete_root / rel_dir)
-
-        # Copy files from doc
-        doc_files = list(doc_index.get('files', {}).keys())
-        res_files = list(res_index.get('files', {}).keys())
-        total_doc = len(doc_files)
-        total_res = len(res_files)
-        exec_log.info(f'merge copy started: doc_files={total_doc} res_files={total_res}')
-        for idx, rel_path in enumerate(doc_files, start=1):
-            dest = complete_root / rel_path
-            if dest.exists():
-                exec_log.fatal(f'conflict during merge: {rel_path} already exists')
-                abort_if_blockers(exec_log, 'merge execution')
-            copy_file(doc_path / rel_path, dest)
-            # Report progress more frequently (every 10 files) and show current file
-            if idx % 10 == 0 or idx == total_doc:
-                exec_log.info(f'merge copy progress (doc): {idx}/{total_doc} | current: {rel_path}')
-
-        # Copy files from res
-        for idx, rel_path in enumerate(res_files, start=1):
-            dest = complete_root / rel_path
-            if dest.exists():
-                exec_log.fatal(f'conflict during merge: {rel_path} already exists')
-                abort_if_blockers(exec_log, 'merge execution')
-            copy_file(res_path / rel_path, dest)
-            # Report progress more frequently (every 10 files) and show current file
-            if idx % 10 == 0 or idx == total_res:
-                exec_log.info(f'merge copy progress (res): {idx}/{total_res} | current: {rel_path}')
-
-        merged_index = build_index(complete_root, config.placeholder_suffix, config.hash_algorithm, exec_log)
-        write_index(output_root / 'index' / 'complete' / '.kb_index.json', merged_index)
-
-        exec_log.info('running merge post-check (reverse split validation)')
-        _merge_post_check(merged_index, doc_index, res_index, config, exec_log)
-        write_summary(exec_log)
-        abort_if_blockers(exec_log, 'merge post-check')
-    finally:
-        exec_log.close()
+        finally:
+            pre_log.close()
+
+        with profiler.paused():
+            prompt_confirm('Pre-check passed. Continue merge?', auto_yes)
+
+        exec_log = Logger(log_dir / 'Merge.log')
+        try:
+            folder_name = doc_path.name
+            complete_root = output_root / 'complete' / folder_name
+
+            with profiler.phase('merge.mkdirs'):
+                # Pre-create directory structure
+                make_dirs(complete_root, doc_index.get('dirs', {}), config.mkdir_workers)
+
+            # Copy files, hashing them on the way so the merged index needs no full second read
+            copied: dict[str, str] = {}
+            complete_ctx = PathContext(complete_root)
+            sides = (('doc', doc_index, PathContext(doc_path)), ('res', res_index, PathContext(res_path)))
+            exec_log.info(f'merge copy started: doc_files={doc_index.file_count} res_files={res_index.file_count}')
+            with profiler.phase('merge.copy'):
+                for side, index, ctx in sides:
+                    total = index.file_count
+                    for ordinal in range(total):
+                        idx = ordinal + 1
+                        rel_path = index.file_path(ordinal)
+                        dest = complete_ctx.path(rel_path)
+                        if os.path.exists(dest):
+                            exec_log.fatal(f'conflict during merge: {rel_path} already exists')
+                            abort_if_blockers(exec_log, 'merge execution')
+                        digest = copy_file_hashed(
+                            ctx.path(rel_path), dest, config.hash_algorithm, hints=config.cache_policy
+                        )
+                        if digest != index.file_hash(ordinal):
+                            exec_log.error(f'file changed since pre-check: {side}/{rel_path}')
+                        elif stat_file(dest).st_size != index.file_size(ordinal):
+                            exec_log.error(f'short copy during merge: {rel_path}')
+                        copied[rel_path] = digest
+                        # Report progress more frequently (every 10 files) and show current file
+                        if idx % 10 == 0 or idx == total:
+                            exec_log.info(f'merge copy progress ({side}): {idx}/{total} | current: {rel_path}')
+
+            with profiler.phase('postcheck.index'):
+                merged_index = build_index(
+                    complete_root, config.placeholder_suffix, config.hash_algorithm, exec_log, hash_files=False,
+                    walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                )
+                fill_hashes(merged_index, copied, config.hash_algorithm)
+                hash_index(
+                    merged_index, complete_root, config.hash_algorithm, exec_log,
+                    processes=config.processes, hints=config.cache_policy,
+                )
+                _verify_copied_sample(merged_index, complete_root, config, exec_log)
+                write_index(output_root / 'index' / 'complete' / '.kb_index.json', merged_index)
+
+            exec_log.info('running merge post-check (reverse split validation)')
+            with profiler.phase('postcheck.reverse_split'):
+                _merge_post_check(merged_index, doc_index, res_index, config, exec_log)
+            profiler.log_summary(exec_log)
+            write_summary(exec_log)
+            abort_if_blockers(exec_log, 'merge post-check')
+        finally:
+            exec_log.close()
+
+
+def _verify_copied_sample(index: CompactIndex, root: Path, config: Config, logger: Logger) -> None:
+    """Read back up to ``MERGE_VERIFY_SAMPLE_FILES`` merged files, spread over ``index``, against their digests.
+
+    The digests come from the source bytes as they were copied; every
+    destination size was already checked, this catches corrupted writes.
+    """
+    sample = MERGE_VERIFY_SAMPLE_FILES
+    checked = list(range(index.file_count))[::max(1, index.file_count // sample)][:sample] if sample > 0 else []
+    ctx = PathContext(root)
+    for ordinal in checked:
+        rel_path = index.file_path(ordinal)
+        if hash_file(ctx.path(rel_path), config.hash_algorithm, config.cache_policy) != index.file_hash(ordinal):
+            logger.error(f'merged file differs from the copied bytes: {rel_path}')
+    logger.info(f'merge: read back {len(checked)}/{index.file_count} copied files')
 
 
 def _merge_post_check(complete_index: dict, doc_index: dict, res_index: dict, config: Config, logger: Logger) -> None:
-    complete_files = set(complete_index.get('files', {}).keys())
+    universe = PathUniverse()
+    complete_files = universe.add(complete_index.get('files', {}))
     complete_dirs = set(complete_index.get('dirs', {}).keys())
 
-    doc_files = set(doc_index.get('files', {}).keys())
-    res_files = set(res_index.get('files', {}).keys())
+    doc_files = universe.add(doc_index.get('files', {}))
+    res_files = universe.add(res_index.get('files', {}))
 
-    doc_placeholder_originals = {
-        _placeholder_original_path(p, config.placeholder_suffix) for p in doc_index.get('placeholders', {}).keys()
-    }
-    res_placeholder_originals = {
-        _placeholder_original_path(p, config.placeholder_suffix) for p in res_index.get('placeholders', {}).keys()
-    }
+    doc_placeholder_originals = universe.add_placeholders(doc_index.get('placeholders', {}), config.placeholder_suffix)
+    res_placeholder_originals = universe.add_placeholders(res_index.get('placeholders', {}), config.placeholder_suffix)
 
-    expected_doc_files = {p for p in complete_files if is_specified_type(Path(p).name, config.specified_types)}
+    expected_doc_files = universe.add(specified_files(complete_index, config.specified_types))
     expected_res_files = complete_files - expected_doc_files
     expected_doc_placeholders = expected_res_files
     expected_res_placeholders = expected_doc_files
@@ -238,54 +541,358 @@ def _merge_post_check(complete_index: dict, doc_index: dict, res_index: dict, co
         logger.error('post-check mismatch: res dirs do not match complete dirs')
 
 
-def index_operation(target: Path, output: Path, config: Config, log_dir: Path) -> None:
+def index_operation(
+    target: Path,
+    output: Path,
+    config: Config,
+    log_dir: Path,
+    profile: bool = False,
+    subtree: str | None = None,
+    exclude: list[str] | None = None,
+) -> None:
+    """Index ``target``; with ``subtree``/``exclude`` the result is a shard for ``index_merge_operation``.
+
+    ``subtree`` is where ``target`` sits in the whole tree and ``exclude``
+    lists subtrees (in whole-tree paths) left to other shards.
+    """
     log_path = log_dir / 'Index.log'
     log = Logger(log_path)
     try:
-        index = build_index(target, config.placeholder_suffix, config.hash_algorithm, log)
-        write_index(output, index)
+        with profiled(log_dir, profile) as profiler:
+            with profiler.phase('index'):
+                if subtree is None and not exclude:
+                    index, _class1 = _scan(target, config, True, log, hash_files=True)
+                else:
+                    from .sharding import normalize_subtree
+
+                    try:
+                        subtree = normalize_subtree(subtree or '')
+                        excluded = [normalize_subtree(rel_path) for rel_path in exclude or []]
+                    except ValueError as exc:
+                        raise FatalError(str(exc)) from exc
+                    lead = subtree + '/' if subtree else ''
+                    for rel_path in excluded:
+                        if not rel_path.startswith(lead) or rel_path == subtree:
+                            raise FatalError(f'excluded path is not inside subtree {subtree or "/"}: {rel_path}')
+                    index = build_index(
+                        target, config.placeholder_suffix, config.hash_algorithm, log,
+                        exclude={rel_path[len(lead):] for rel_path in excluded},
+                        walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                        hints=config.cache_policy,
+                    )
+                    index.metadata['subtree'] = subtree
+                    index.metadata['exclude'] = excluded
+                    log.info(f'shard subtree: {subtree or "/"} excluded={len(excluded)}')
+                write_index(output, index)
+            profiler.log_summary(log)
         write_summary(log)
         abort_if_blockers(log, 'index generation')
     finally:
         log.close()
 
 
-def validate_operation(target: Path, mode: str, config: Config, log_dir: Path, role: str) -> None:
+def index_merge_operation(shard_paths: list[Path], output: Path, log_dir: Path, profile: bool = False) -> None:
+    """Combine shard index files into one index of the whole tree (see ``sharding.merge_shard_indexes``)."""
+    from .sharding import merge_shard_indexes
+
+    log = Logger(log_dir / 'IndexMerge.log')
+    try:
+        with profiled(log_dir, profile) as profiler:
+            with profiler.phase('load'):
+                shards = []
+                for path in shard_paths:
+                    log.info(f'loading shard: {path}')
+                    try:
+                        shards.append((path.name, load_index(path)))
+                    except (OSError, ValueError) as exc:
+                        log.fatal(f'failed to load shard: {path} ({exc})')
+            if not log.result.has_blockers():
+                with profiler.phase('merge'):
+                    merged = merge_shard_indexes(shards, log)
+                if not log.result.has_blockers():
+                    write_index(output, merged)
+                    log.info(f'merged index written: {output} root_hash={merged["metadata"]["root_hash"]}')
+            profiler.log_summary(log)
+        write_summary(log)
+        abort_if_blockers(log, 'index merge')
+    finally:
+        log.close()
+
+
+def convert_placeholders_operation(
+    target: Path, mode: str, config: Config, log_dir: Path, profile: bool = False
+) -> None:
+    """Rewrite the placeholders under ``target`` as empty directories or as per-directory manifests.
+
+    Converting to manifests keeps a non-empty placeholder dir in place (and
+    logs an error); the new form is always written before the old one is
+    removed, so an interrupted run leaves every placeholder recorded.
+    """
+    log = Logger(log_dir / 'Placeholders.log')
+    try:
+        with profiled(log_dir, profile) as profiler:
+            ctx = PathContext(target)
+            converted = 0
+            with profiler.phase('convert'):
+                # manifests are read whatever placeholder_mode says: they are what is being converted
+                walk = iter_walk(target, config.placeholder_suffix, placeholder_manifests=True)
+                for rel_root, _current, _dirs, _files, placeholder_dirs, manifest in walk:
+                    rel_key = rel_root.as_posix()
+                    prefix = '' if rel_key == '.' else rel_key + '/'
+                    if manifest is not None and manifest.error is not None:
+                        log.error(f'invalid placeholder manifest, left as is: {prefix}{PLACEHOLDER_MANIFEST_NAME} '
+                                  f'({manifest.error})')
+                        continue
+                    listed = manifest.names if manifest is not None else []
+                    if not placeholder_dirs and (mode == 'manifest' or not listed):
+                        continue
+                    dir_path = ctx.path(rel_key)
+                    if mode == 'manifest':
+                        kept = set()
+                        probe = empty_dir_probe(dir_path)
+                        for d in placeholder_dirs:
+                            if not dir_is_empty(PathContext.join(dir_path, d), probe=probe):
+                                log.error(f'placeholder dir not empty, left as a directory: {prefix + d}')
+                                kept.add(d)
+                        write_placeholder_manifest(
+                            dir_path, listed + [d for d in placeholder_dirs if d not in kept], config.placeholder_suffix
+                        )
+                        for d in placeholder_dirs:
+                            if d not in kept:
+                                os.rmdir(PathContext.join(dir_path, d))
+                                converted += 1
+                    else:
+                        # a name without the suffix would turn into an ordinary directory; leave it listed
+                        invalid = [d for d in listed if not d.endswith(config.placeholder_suffix)]
+                        for d in invalid:
+                            log.error(f'placeholder manifest entry without suffix, left in the manifest: {prefix + d}')
+                        for d in listed:
+                            if d not in invalid:
+                                os.mkdir(PathContext.join(dir_path, d))
+                                converted += 1
+                        write_placeholder_manifest(dir_path, invalid, config.placeholder_suffix)
+            log.info(f'placeholders converted to {mode}: {converted}')
+            profiler.log_summary(log)
+        write_summary(log)
+        abort_if_blockers(log, 'placeholder conversion')
+    finally:
+        log.close()
+
+
+def validate_operation(
+    target: Path, mode: str, config: Config, log_dir: Path, role: str, profile: bool = False
+) -> None:
     log = Logger(log_dir / 'Validate.log')
     try:
-        if mode == 'class1':
-            allow_placeholders = role in ('doc', 'res')
-            validate_class1(target, config, allow_placeholders=allow_placeholders, logger=log)
-        elif mode == 'class2':
-            index = index_for_validation(target, config, log)
-            validate_class2(index, role, config, log)
-        else:
-            log.fatal(f'unknown validate mode: {mode}')
+        with profiled(log_dir, profile) as profiler:
+            if mode == 'class1':
+                allow_placeholders = role in ('doc', 'res')
+                with profiler.phase('class1'):
+                    validate_class1(target, config, allow_placeholders=allow_placeholders, logger=log)
+            elif mode == 'class2':
+                with profiler.phase('index'):
+                    index = index_for_validation(target, config, log, mount_archives=role == 'res')
+                with profiler.phase('class2'):
+                    validate_class2(index, role, config, log)
+            else:
+                log.fatal(f'unknown validate mode: {mode}')
+            profiler.log_summary(log)
         write_summary(log)
         abort_if_blockers(log, 'validation')
     finally:
         log.close()
 
 
-def validate_mutual_operation(doc_path: Path, res_path: Path, config: Config, log_dir: Path) -> None:
+def validate_mutual_operation(
+    doc_path: Path, res_path: Path, config: Config, log_dir: Path, profile: bool = False
+) -> None:
     log = Logger(log_dir / 'Validate_mutual.log')
     try:
-        doc_index = build_index(doc_path, config.placeholder_suffix, config.hash_algorithm, log)
-        res_index = build_index(res_path, config.placeholder_suffix, config.hash_algorithm, log)
-        validate_mutual(doc_index, res_index, config, log)
+        with profiled(log_dir, profile) as profiler:
+            with profiler.phase('index'):
+                doc_index = build_index(
+                    doc_path, config.placeholder_suffix, config.hash_algorithm, log,
+                    walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                    hints=config.cache_policy,
+                )
+                res_index = build_index(
+                    res_path, config.placeholder_suffix, config.hash_algorithm, log,
+                    walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                    hints=config.cache_policy, mount_archives=True,
+                )
+            with profiler.phase('mutual'):
+                validate_mutual(doc_index, res_index, config, log)
+            profiler.log_summary(log)
         write_summary(log)
         abort_if_blockers(log, 'mutual validation')
     finally:
         log.close()
 
 
-def compare_operation(old_path: Path, new_path: Path, config: Config, log_dir: Path) -> None:
+def compare_operation(old_path: Path, new_path: Path, config: Config, log_dir: Path, profile: bool = False) -> None:
     log = Logger(log_dir / 'Compare.log')
     try:
-        old_index = build_index(old_path, config.placeholder_suffix, config.hash_algorithm, log)
-        new_index = build_index(new_path, config.placeholder_suffix, config.hash_algorithm, log)
-        compare_indexes(old_index, new_index, log)
+        with profiled(log_dir, profile) as profiler:
+            with profiler.phase('index'):
+                old_index = build_index(
+                    old_path, config.placeholder_suffix, config.hash_algorithm, log,
+                    walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                    hints=config.cache_policy,
+                )
+                new_index = build_index(
+                    new_path, config.placeholder_suffix, config.hash_algorithm, log,
+                    walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                    hints=config.cache_policy,
+                )
+            with profiler.phase('compare'):
+                compare_indexes(old_index, new_index, log)
+            profiler.log_summary(log)
         write_summary(log)
         abort_if_blockers(log, 'compare validation')
     finally:
         log.close()
+
+
+def compare_index_files_operation(
+    old_index_path: Path, new_index_path: Path, log_dir: Path, profile: bool = False
+) -> None:
+    log = Logger(log_dir / 'Compare.log')
+    try:
+        with profiled(log_dir, profile) as profiler:
+            with profiler.phase('compare'):
+                compare_index_files(old_index_path, new_index_path, log)
+            profiler.log_summary(log)
+        write_summary(log)
+        abort_if_blockers(log, 'compare validation')
+    finally:
+        log.close()
+
+
+def _index_from_path(path: Path, config: Config, logger: Logger):
+    """Load ``path`` when it is a saved index file, otherwise index the folder."""
+    if path.is_file():
+        logger.info(f'loading index: {path}')
+        return load_index(path)
+    return build_index(
+        path, config.placeholder_suffix, config.hash_algorithm, logger,
+        walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+        hints=config.cache_policy,
+    )
+
+
+def archive_operation(target: Path, output: Path, config: Config, log_dir: Path, profile: bool = False) -> None:
+    log = Logger(log_dir / 'Archive.log')
+    try:
+        with profiled(log_dir, profile) as profiler:
+            with profiler.phase('index'):
+                index = build_index(
+                    target, config.placeholder_suffix, config.hash_algorithm, log,
+                    walk_workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests,
+                    hints=config.cache_policy,
+                )
+            with profiler.phase('archive'):
+                _archive_res(target, output, index, config, log)
+            profiler.log_summary(log)
+        write_summary(log)
+        abort_if_blockers(log, 'archive')
+    finally:
+        log.close()
+
+
+def verify_operation(
+    target: Path,
+    config: Config,
+    log_dir: Path,
+    expected_root_hash: str | None = None,
+    against: Path | None = None,
+    profile: bool = False,
+) -> None:
+    log = Logger(log_dir / 'Verify.log')
+    try:
+        with profiled(log_dir, profile) as profiler:
+            with profiler.phase('index'):
+                index = _index_from_path(target, config, log)
+                other = _index_from_path(against, config, log) if against is not None else None
+            with profiler.phase('verify'):
+                actual = root_hash(index)
+                log.info(f'verify: root hash of {target}: {actual}')
+                if expected_root_hash is not None:
+                    if actual == expected_root_hash.strip().lower():
+                        log.info('verify: root hash matches expected value')
+                    else:
+                        log.error(f'verify: root hash mismatch: expected {expected_root_hash} got {actual}')
+                if other is not None:
+                    other_hash = root_hash(other)
+                    log.info(f'verify: root hash of {against}: {other_hash}')
+                    if actual == other_hash:
+                        log.info('verify: trees are identical')
+                    else:
+                        log.error('verify: trees differ')
+                        for rel_path, reason in localize_differences(index_tree(index), index_tree(other)):
+                            log.error(f'verify: {reason}: {rel_path}')
+            profiler.log_summary(log)
+        write_summary(log)
+        abort_if_blockers(log, 'verify')
+    finally:
+        log.close()
+
+
+def dedup_operation(
+    roots: list[Path],
+    res_roots: list[Path],
+    index_paths: list[Path],
+    config: Config,
+    log_dir: Path,
+    report_path: Path | None = None,
+    hardlink: bool = False,
+    profile: bool = False,
+) -> None:
+    from .dedup import collect_index, collect_root, find_duplicates, group_report, hardlink_duplicates
+
+    log = Logger(log_dir / 'Dedup.log')
+    try:
+        with profiled(log_dir, profile) as profiler:
+            entries = []
+            with profiler.phase('collect'):
+                for root in roots:
+                    log.info(f'dedup: scanning {root}')
+                    entries.extend(
+                        collect_root(root, config.placeholder_suffix, placeholder_manifests=config.placeholder_manifests)
+                    )
+                for root in res_roots:
+                    log.info(f'dedup: scanning res {root}')
+                    entries.extend(collect_root(
+                        root, config.placeholder_suffix, linkable=True, mount_archives=True, logger=log,
+                        placeholder_manifests=config.placeholder_manifests,
+                    ))
+                for index_path in index_paths:
+                    log.info(f'dedup: loading index {index_path}')
+                    entries.extend(collect_index(load_index(index_path), str(index_path)))
+            with profiler.phase('dedup'):
+                groups = find_duplicates(entries, config.hash_algorithm, log, config.cache_policy)
+            wasted = 0
+            for group in groups:
+                wasted += group.wasted_bytes
+                log.info(
+                    f'dedup: group hash={group.hash} size={group.size} copies={len(group.entries)} '
+                    f'wasted_bytes={group.wasted_bytes}'
+                )
+                for entry in group.entries:
+                    log.info(f'dedup:   {entry.source}: {entry.rel_path}')
+            log.info(f'dedup: duplicate groups={len(groups)} total wasted_bytes={wasted}')
+            if report_path is not None:
+                write_json(report_path, {
+                    'groups': [group_report(g) for g in groups],
+                    'total_wasted_bytes': wasted,
+                })
+            if hardlink:
+                reclaimed = 0
+                with profiler.phase('hardlink'):
+                    for group in groups:
+                        reclaimed += hardlink_duplicates(group, log)
+                log.info(f'dedup: reclaimed bytes via hardlinks={reclaimed}')
+            profiler.log_summary(log)
+        write_summary(log)
+        abort_if_blockers(log, 'dedup')
+    finally:
+        log.close()
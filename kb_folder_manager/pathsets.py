@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+
+def placeholder_original(rel_path: str, placeholder_suffix: str) -> str:
+    """Relative path of the file a placeholder stands for, by string slicing.
+
+    Same result as stripping the suffix from the last component with
+    ``derive_placeholder_original`` and re-joining, without building Path
+    objects; the suffix never contains ``/`` so only the last component can
+    end with it.
+    """
+    if not rel_path.endswith(placeholder_suffix):
+        return rel_path
+    original = rel_path[: -len(placeholder_suffix)]
+    return original[:-1] if original.endswith('/') else original
+
+
+class PathUniverse:
+    """Interns relative paths to dense integer IDs shared by several PathSets."""
+
+    def __init__(self) -> None:
+        self.ids: dict[str, int] = {}
+        self.paths: list[str] = []
+
+    def add(self, paths: Iterable[str]) -> PathSet:
+        ids = self.ids
+        get = ids.get
+        known = self.paths
+        members: list[int] = []
+        append = members.append
+        for path in paths:
+            path_id = get(path)
+            if path_id is None:
+                path_id = ids[path] = len(known)
+                known.append(path)
+            append(path_id)
+        return PathSet(self, members)
+
+    def add_placeholders(self, paths: Iterable[str], placeholder_suffix: str) -> PathSet:
+        """Intern the originals behind placeholder ``paths`` (see ``placeholder_original``)."""
+        n = len(placeholder_suffix)
+        originals = [p[:-n] if p.endswith(placeholder_suffix) else p for p in paths]
+        # only a placeholder named exactly like the suffix leaves a trailing '/'
+        return self.add([p[:-1] if p.endswith('/') else p for p in originals])
+
+
+class PathSet:
+    """Set of interned paths stored as a byte-per-ID bit vector.
+
+    Each ID owns one byte of a big integer holding 0 or 1, so union,
+    intersection and difference are single integer operations in C, the
+    size is a popcount, and members come back in ID order with
+    ``bytes.find``. Sets from one universe can be combined freely.
+    """
+
+    __slots__ = ('universe', '_ids', '_bits')
+
+    def __init__(self, universe: PathUniverse, ids: list[int] | None = None, bits: int | None = None) -> None:
+        self.universe = universe
+        self._ids = ids
+        self._bits = bits
+
+    @property
+    def bits(self) -> int:
+        if self._bits is None:
+            flags = bytearray(len(self.universe.paths))
+            for path_id in self._ids:
+                flags[path_id] = 1
+            self._bits = int.from_bytes(flags, 'little')
+            self._ids = None
+        return self._bits
+
+    def __and__(self, other: PathSet) -> PathSet:
+        return PathSet(self.universe, bits=self.bits & other.bits)
+
+    def __or__(self, other: PathSet) -> PathSet:
+        return PathSet(self.universe, bits=self.bits | other.bits)
+
+    def __sub__(self, other: PathSet) -> PathSet:
+        bits = self.bits
+        return PathSet(self.universe, bits=bits ^ (bits & other.bits))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PathSet):
+            return NotImplemented
+        return self.bits == other.bits
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def sorted(self) -> list[str]:
+        """Member paths in string order (only the members are sorted)."""
+        bits = self.bits
+        if not bits:
+            return []
+        flags = bits.to_bytes(len(self.universe.paths), 'little')
+        paths = self.universe.paths
+        members: list[str] = []
+        find = flags.find
+        path_id = find(1)
+        while path_id >= 0:
+            members.append(paths[path_id])
+            path_id = find(1, path_id + 1)
+        members.sort()
+        return members
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+from array import array
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .classify import classify_index
+from .utils import to_extended_path, write_json
+
+PLAN_FORMAT = 2
+SPLIT_PLAN_FILE_NAME = 'split_plan.json'
+# bytes read from the largest planned files / written to scratch when measuring throughput
+THROUGHPUT_SAMPLE_BYTES = 64 * 1024 * 1024
+WRITE_SAMPLE_BYTES = 16 * 1024 * 1024
+# small files opened to measure the fixed per-file cost
+OVERHEAD_SAMPLE_FILES = 200
+
+
+@dataclass
+class SplitPlan:
+    """Everything a split will do, decided up front from the complete index.
+
+    ``dirs`` are created on both sides. Copies are kept as parallel arrays:
+    file ``i`` is ``copy_paths[i]`` of ``copy_sizes[i]`` bytes and goes to
+    doc when ``copy_to_doc[i]`` is set, to res otherwise; its placeholder
+    directory is created on the other side. The plan round-trips through
+    JSON so it can be previewed, saved next to the indexes and scheduled
+    before any byte is copied.
+    """
+
+    source: str
+    folder_name: str
+    placeholder_suffix: str
+    dirs: list[str] = field(default_factory=list)
+    copy_paths: list[str] = field(default_factory=list)
+    copy_sizes: array = field(default_factory=lambda: array('q'))
+    copy_to_doc: bytearray = field(default_factory=bytearray)
+
+    def copies(self) -> Iterator[tuple[str, str]]:
+        """``(side, rel_path)`` of every copy, in plan order."""
+        for rel_path, to_doc in zip(self.copy_paths, self.copy_to_doc):
+            yield ('doc' if to_doc else 'res'), rel_path
+
+    def placeholders(self) -> Iterator[tuple[str, str]]:
+        """``(side, rel_path)`` of every placeholder directory, in plan order."""
+        suffix = self.placeholder_suffix
+        for rel_path, to_doc in zip(self.copy_paths, self.copy_to_doc):
+            yield ('res' if to_doc else 'doc'), rel_path + suffix
+
+    def summary(self) -> dict:
+        files_doc = sum(self.copy_to_doc)
+        bytes_doc = sum(size for size, to_doc in zip(self.copy_sizes, self.copy_to_doc) if to_doc)
+        total_bytes = sum(self.copy_sizes)
+        files_res = len(self.copy_paths) - files_doc
+        return {
+            'files_doc': files_doc, 'files_res': files_res, 'bytes_doc': bytes_doc, 'bytes_res': total_bytes - bytes_doc,
+            'placeholders_doc': files_res, 'placeholders_res': files_doc, 'dirs': len(self.dirs),
+            'total_bytes': total_bytes,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            'source': self.source,
+            'folder_name': self.folder_name,
+            'placeholder_suffix': self.placeholder_suffix,
+            'dirs': list(self.dirs),
+            'copies': {
+                'rel_paths': list(self.copy_paths),
+                'sizes': list(self.copy_sizes),
+                'sides': ''.join('d' if to_doc else 'r' for to_doc in self.copy_to_doc),
+            },
+            'format': PLAN_FORMAT,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> SplitPlan:
+        if data.get('format') != PLAN_FORMAT:
+            raise ValueError(f"unsupported split plan format: {data.get('format')}")
+        copies = data['copies']
+        plan = cls(
+            source=data['source'],
+            folder_name=data['folder_name'],
+            placeholder_suffix=data['placeholder_suffix'],
+            dirs=list(data['dirs']),
+            copy_paths=list(copies['rel_paths']),
+            copy_sizes=array('q', copies['sizes']),
+            copy_to_doc=bytearray(side == 'd' for side in copies['sides']),
+        )
+        if not len(plan.copy_paths) == len(plan.copy_sizes) == len(plan.copy_to_doc):
+            raise ValueError('split plan copies have mismatched lengths')
+        return plan
+
+
+def build_split_plan(source: Path, index: Mapping, specified_types, placeholder_suffix: str) -> SplitPlan:
+    """Route every file of the complete ``index`` to doc or res; placeholders follow on the other side."""
+    files = index.get('files', {})
+    return SplitPlan(
+        str(source), source.name, placeholder_suffix, dirs=list(index.get('dirs', {})),
+        copy_paths=list(files),
+        copy_sizes=array('q', (entry.get('size') or 0 for entry in files.values())),
+        copy_to_doc=bytearray(classify_index(index, specified_types)),
+    )
+
+
+def write_plan(path: Path, plan: SplitPlan) -> None:
+    write_json(path, plan.to_dict())
+
+
+def load_plan(path: Path) -> SplitPlan:
+    with open(to_extended_path(path), 'r', encoding='utf-8') as f:
+        return SplitPlan.from_dict(json.load(f))
+
+
+def _existing_dir(path: Path) -> Path:
+    path = path.resolve()
+    while not path.is_dir() and path.parent != path:
+        path = path.parent
+    return path
+
+
+def measure_throughput(source: Path, plan: SplitPlan, scratch: Path) -> dict:
+    """Sample the disks the split will use.
+
+    Reads up to THROUGHPUT_SAMPLE_BYTES from the largest planned files,
+    opens a handful of the smallest ones for the fixed per-file cost, and
+    writes (and fsyncs) a scratch file next to ``scratch``. Page-cached
+    source data makes the read figure optimistic.
+    """
+    sizes = plan.copy_sizes
+    by_size = sorted(range(len(sizes)), key=sizes.__getitem__)
+    read_bytes = 0
+    start = time.perf_counter()
+    for i in reversed(by_size):
+        if read_bytes >= THROUGHPUT_SAMPLE_BYTES or sizes[i] == 0:
+            break
+        with open(to_extended_path(source / plan.copy_paths[i]), 'rb') as f:
+            while read_bytes < THROUGHPUT_SAMPLE_BYTES:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                read_bytes += len(chunk)
+    read_seconds = time.perf_counter() - start
+
+    small = by_size[:OVERHEAD_SAMPLE_FILES]
+    start = time.perf_counter()
+    for i in small:
+        with open(to_extended_path(source / plan.copy_paths[i]), 'rb') as f:
+            f.read(4096)
+    per_file_seconds = (time.perf_counter() - start) / len(small) if small else 0.0
+
+    block = bytes(1024 * 1024)
+    written = 0
+    with tempfile.TemporaryFile(dir=_existing_dir(scratch)) as f:
+        start = time.perf_counter()
+        while written < WRITE_SAMPLE_BYTES:
+            written += f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+        write_seconds = time.perf_counter() - start
+
+    return {
+        'read_bytes_per_second': read_bytes / read_seconds if read_bytes and read_seconds > 0 else None,
+        'write_bytes_per_second': written / write_seconds if write_seconds > 0 else None,
+        'per_file_seconds': per_file_seconds,
+    }
+
+
+def estimate_seconds(plan: SplitPlan, throughput: Mapping) -> float:
+    """Estimated copy time: read plus write of every byte, plus opening each file on both sides."""
+    total = plan.summary()['total_bytes']
+    seconds = 2 * len(plan.copy_paths) * throughput.get('per_file_seconds', 0.0)
+    for key in ('read_bytes_per_second', 'write_bytes_per_second'):
+        rate = throughput.get(key)
+        if rate:
+            seconds += total / rate
+    return seconds
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+COUNTER_NAMES = ('bytes_read', 'bytes_written', 'files_hashed', 'stat_calls', 'dirs_walked', 'dirs_created')
+
+TIMING_FILE_NAME = 'timing.json'
+PSTATS_FILE_NAME = 'profile.pstats'
+PSTATS_TEXT_FILE_NAME = 'profile.txt'
+
+
+class Profiler:
+    """Collects per-phase wall time and I/O counters for one operation.
+
+    Counters are bumped from the filesystem helpers in ``utils`` through the
+    module-level ``count`` function, so callers never need a profiler handle.
+    When ``cprofile`` is set, the whole operation also runs under cProfile.
+    """
+
+    def __init__(self, cprofile: bool = False) -> None:
+        self.phases: list[dict] = []
+        self.counters: dict[str, int] = dict.fromkeys(COUNTER_NAMES, 0)
+        self._lock = threading.Lock()
+        self._started: float | None = None
+        self._elapsed = 0.0
+        self._cprofile = None
+        if cprofile:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stop(self) -> None:
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._started is not None:
+            self._elapsed += time.perf_counter() - self._started
+            self._started = None
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Leave the enclosed block (e.g. waiting for the user) out of the total and the cProfile data."""
+        running = self._started is not None
+        if running:
+            self.stop()
+        try:
+            yield
+        finally:
+            if running:
+                self.start()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        with self._lock:
+            before = dict(self.counters)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                delta = {k: v - before.get(k, 0) for k, v in self.counters.items() if v != before.get(k, 0)}
+            self.phases.append({'name': name, 'seconds': round(seconds, 6), 'counters': delta})
+
+    def total_seconds(self) -> float:
+        if self._started is not None:
+            return self._elapsed + time.perf_counter() - self._started
+        return self._elapsed
+
+    def report(self) -> dict:
+        return {
+            'total_seconds': round(self.total_seconds(), 6),
+            'phases': list(self.phases),
+            'counters': dict(self.counters),
+        }
+
+    def log_summary(self, logger) -> None:
+        for entry in self.phases:
+            logger.info(f"timing: phase={entry['name']} seconds={entry['seconds']:.3f}")
+        counters = ' '.join(f'{k}={v}' for k, v in self.counters.items())
+        logger.info(f'timing: total_seconds={self.total_seconds():.3f} {counters}')
+
+    def write(self, log_dir: Path) -> None:
+        from .utils import to_extended_path, write_json
+
+        write_json(log_dir / TIMING_FILE_NAME, self.report())
+        if self._cprofile is None:
+            return
+        import pstats
+
+        self._cprofile.dump_stats(to_extended_path(log_dir / PSTATS_FILE_NAME))
+        with open(to_extended_path(log_dir / PSTATS_TEXT_FILE_NAME), 'w', encoding='utf-8') as f:
+            stats = pstats.Stats(self._cprofile, stream=f)
+            stats.sort_stats('cumulative').print_stats(50)
+
+
+_active: Profiler | None = None
+
+
+def active() -> Profiler | None:
+    return _active
+
+
+def activate(profiler: Profiler | None) -> Profiler | None:
+    global _active
+    previous = _active
+    _active = profiler
+    return previous
+
+
+def count(name: str, n: int = 1) -> None:
+    profiler = _active
+    if profiler is not None:
+        profiler.count(name, n)
+
+
+@contextmanager
+def profiled(log_dir: Path, enabled: bool = False) -> Iterator[Profiler]:
+    """Time an operation; with ``enabled`` also dump cProfile and timing.json into ``log_dir``."""
+    profiler = Profiler(cprofile=enabled)
+    previous = activate(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        activate(previous)
+        if enabled:
+            profiler.write(log_dir)
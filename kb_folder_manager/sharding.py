@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import datetime as _dt
+from collections.abc import Callable, Mapping
+from pathlib import Path
+
+from .index_model import CompactIndex
+from .indexer import _Scanner
+from .tree import record_tree_hashes
+from .utils import NO_CACHE_HINTS, CacheHints, Logger, PathContext, is_symlink, iter_walk
+from .validator import Class1Checker, check_class1_root, replay_class1
+
+
+class _ShardLog:
+    """Buffers what a worker would have logged, for the parent to replay in shard order."""
+
+    def __init__(self) -> None:
+        self.messages: list[tuple[str, str]] = []
+
+    def info(self, message: str) -> None:
+        self.messages.append(('info', message))
+
+    def warning(self, message: str) -> None:
+        self.messages.append(('warning', message))
+
+    def error(self, message: str) -> None:
+        self.messages.append(('error', message))
+
+    def fatal(self, message: str) -> None:
+        self.messages.append(('fatal', message))
+
+
+def _scan_top(task: tuple) -> tuple:
+    """Worker: index and class1-check one top-level subtree; runs in a child process, so all of it is picklable."""
+    (root, top, placeholder_suffix, hash_algorithm, hash_files, allow_placeholders, walk_workers, normalize_nfc,
+     manifests, hints, mount_archives) = task
+    checker = Class1Checker(root, placeholder_suffix, allow_placeholders, normalize_nfc)
+    log = _ShardLog()
+    scanner = _Scanner(
+        CompactIndex(), root, placeholder_suffix, hash_algorithm, log, hash_files, hints, mount_archives
+    )
+    # per-file progress lines are not replayed; the parent reports progress per shard
+    scanner.progress_every = float('inf')
+    for entry in iter_walk(root, placeholder_suffix, top, walk_workers, manifests):
+        checker.visit(*entry)
+        scanner.visit(*entry)
+    counts = (scanner.file_count, scanner.dir_count, scanner.placeholder_count)
+    return scanner.index, checker.take_messages(), log.messages, counts
+
+
+def sharded_scan(
+    root: Path,
+    placeholder_suffix: str,
+    hash_algorithm: str,
+    processes: int,
+    allow_placeholders: bool,
+    logger: Logger,
+    hash_files: bool = True,
+    walk_workers: int = 1,
+    normalize_nfc: bool = False,
+    placeholder_manifests: bool = False,
+    hints: CacheHints = NO_CACHE_HINTS,
+    mount_archives: bool = False,
+) -> tuple[CompactIndex, Callable[[], None]]:
+    """Index ``root`` and run the class1 walk with one process per top-level subtree.
+
+    The parent handles ``root`` itself, the workers each walk whole top-level
+    subtrees and return a partial index plus their buffered class1 messages,
+    and the partials are appended in walk order. The result equals
+    ``build_index`` entry for entry, and calling the returned function logs
+    exactly what ``validate_class1`` would.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    logger.info(f'indexing started: {root}')
+    scanner = _Scanner(
+        CompactIndex(), root, placeholder_suffix, hash_algorithm, logger, hash_files, hints, mount_archives
+    )
+    checker = Class1Checker(root, placeholder_suffix, allow_placeholders, normalize_nfc)
+    entry = next(iter_walk(root, placeholder_suffix, placeholder_manifests=placeholder_manifests))
+    checker.visit(*entry)
+    scanner.visit(*entry)
+    root_messages = checker.take_messages()
+    # os.walk does not descend into symlinked dirs; the class1 check has already reported them
+    ctx = PathContext(root)
+    tops = [d for d in entry[2] if not is_symlink(PathContext.join(ctx.base, d))]
+
+    shards: list[tuple] = []
+    if tops:
+        tasks = [
+            (root, top, placeholder_suffix, hash_algorithm, hash_files, allow_placeholders, walk_workers, normalize_nfc,
+             placeholder_manifests, hints, mount_archives)
+            for top in tops
+        ]
+        with ProcessPoolExecutor(max_workers=min(processes, len(tops))) as pool:
+            for result in pool.map(_scan_top, tasks):
+                shards.append(result)
+                logger.info(f'indexing progress: shards {len(shards)}/{len(tops)}')
+
+    buckets = [root_messages]
+    for partial, messages, log_messages, counts in shards:
+        scanner.index.extend(partial)
+        for level, message in log_messages:
+            getattr(logger, level)(message)
+        scanner.file_count += counts[0]
+        scanner.dir_count += counts[1]
+        scanner.placeholder_count += counts[2]
+        buckets.append(messages)
+    scanner.finish(root)
+
+    def run_class1() -> None:
+        check_class1_root(root, logger)
+        replay_class1(logger, buckets)
+
+    return scanner.index, run_class1
+
+
+def normalize_subtree(rel_path: str) -> str:
+    """POSIX form of a subtree path relative to the whole tree; ``''`` is the root."""
+    parts = [p for p in rel_path.replace('\\', '/').split('/') if p not in ('', '.')]
+    if '..' in parts or ':' in rel_path:
+        raise ValueError(f'subtree must be a relative path inside the tree: {rel_path}')
+    return '/'.join(parts)
+
+
+def _within(rel_path: str, base: str) -> bool:
+    return not base or rel_path == base or rel_path.startswith(base + '/')
+
+
+def _owns(shard: Mapping, rel_path: str) -> bool:
+    """Whether ``rel_path`` falls in the part of the tree ``shard`` indexed."""
+    metadata = shard['metadata']
+    return _within(rel_path, metadata.get('subtree', '')) and not any(
+        _within(rel_path, excluded) for excluded in metadata.get('exclude', [])
+    )
+
+
+def merge_shard_indexes(shards: list[tuple[str, Mapping]], logger: Logger) -> dict:
+    """Stitch ``(name, index)`` shards written by ``index --subtree`` into one index of the whole tree.
+
+    Each shard holds paths relative to its own subtree, recorded in
+    ``metadata.subtree`` along with the subtrees it left to other shards
+    (``metadata.exclude``). Overlapping shards, entries claimed twice,
+    mixed hash algorithms or placeholder suffixes and excluded subtrees no
+    shard owns from their top down are logged as errors; the caller decides
+    whether to write the result. Directory hashes are recomputed over the
+    merged tree.
+    """
+    for i, (name, shard) in enumerate(shards):
+        subtree = shard['metadata'].get('subtree', '')
+        for other_name, other in shards[i + 1:]:
+            other_subtree = other['metadata'].get('subtree', '')
+            if _owns(shard, other_subtree) or _owns(other, subtree):
+                logger.error(
+                    f'overlapping shards: {name} (subtree {subtree or "/"}) and {other_name} (subtree {other_subtree or "/"})'
+                )
+        for excluded in shard['metadata'].get('exclude', []):
+            # a shard inside the excluded subtree leaves the rest of it unindexed
+            if not any(_owns(s, excluded) for _n, s in shards):
+                logger.error(f'excluded subtree not covered by any shard: {excluded} ({name})')
+
+    merged: dict = {'metadata': {}, 'files': {}, 'dirs': {}, 'placeholders': {}}
+    owner: dict[str, str] = {}
+    algorithms: dict[str, str] = {}
+    suffixes: dict[str, str] = {}
+    archived: list[str] = []
+    for name, shard in shards:
+        subtree = shard['metadata'].get('subtree', '')
+        lead = subtree + '/' if subtree else ''
+        for section in ('files', 'placeholders'):
+            for rel_path, entry in shard.get(section, {}).items():
+                path = lead + rel_path
+                if path in owner:
+                    logger.error(f'conflicting shards: {path} in {owner[path]} and {name}')
+                    continue
+                owner[path] = name
+                merged[section][path] = entry
+                if section == 'files' and entry.get('hash_alg'):
+                    algorithms.setdefault(entry['hash_alg'], name)
+                elif section == 'placeholders':
+                    suffixes.setdefault(entry.get('placeholder_suffix', ''), name)
+        for rel_dir in shard.get('dirs', {}):
+            merged['dirs'][lead + rel_dir] = {'kind': 'dir'}
+        archived.extend(lead + base if base else subtree for base in shard['metadata'].get('archived', []))
+
+    if len(algorithms) > 1:
+        logger.error(f'shards use different hash algorithms: {", ".join(f"{a} ({n})" for a, n in algorithms.items())}')
+    if len(suffixes) > 1:
+        logger.error(f'shards use different placeholder suffixes: {", ".join(f"{s} ({n})" for s, n in suffixes.items())}')
+    for path in owner:
+        if path in merged['dirs']:
+            logger.error(f'conflicting shards: {path} is a directory in one shard and an entry in {owner[path]}')
+
+    for name, shard in shards:
+        parent = shard['metadata'].get('subtree', '')
+        while parent:
+            if parent not in merged['dirs']:
+                logger.warning(f'directory not indexed by any shard, added for {name}: {parent}')
+                merged['dirs'][parent] = {'kind': 'dir'}
+            parent = parent.rpartition('/')[0]
+
+    roots = [shard for _name, shard in shards if not shard['metadata'].get('subtree')]
+    metadata = merged['metadata']
+    if roots:
+        metadata['root_path'] = roots[0]['metadata'].get('root_path')
+    else:
+        logger.warning('no shard covers the tree root; root-level files are missing')
+    metadata['generated_at'] = _dt.datetime.now().isoformat(timespec='seconds')
+    metadata['shards'] = [
+        {
+            'name': name,
+            'subtree': shard['metadata'].get('subtree', ''),
+            'root_path': shard['metadata'].get('root_path'),
+            'generated_at': shard['metadata'].get('generated_at'),
+        }
+        for name, shard in shards
+    ]
+    if archived:
+        metadata['archived'] = archived
+    record_tree_hashes(merged)
+    logger.info(
+        f'merged {len(shards)} shards: files={len(merged["files"])} dirs={len(merged["dirs"])} '
+        f'placeholders={len(merged["placeholders"])}'
+    )
+    return merged
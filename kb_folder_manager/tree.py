@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import hashlib
+from array import array
+from collections.abc import Mapping
+from typing import Iterator
+
+from .index_model import CompactIndex
+
+TREE_HASH_ALGORITHM = 'sha256'
+
+
+class DirNode:
+    """One directory of an index laid out as a tree.
+
+    Each node carries aggregates over its whole subtree: ``file_count``,
+    ``total_bytes``, a Merkle-style ``digest`` over names, sizes and content
+    hashes, and a ``stamp`` that additionally covers mtimes. Two subtrees
+    with equal stamps have identical file entries, so comparisons can skip
+    them without looking at a single file.
+    """
+
+    __slots__ = ('name', 'path', 'dirs', 'files', 'placeholders', 'file_count', 'total_bytes', 'digest', 'stamp')
+
+    def __init__(self, name: str, path: str) -> None:
+        self.name = name
+        self.path = path
+        self.dirs: dict[str, DirNode] = {}
+        self.files: dict[str, dict] = {}
+        self.placeholders: set[str] = set()
+        self.file_count = 0
+        self.total_bytes = 0
+        self.digest = ''
+        self.stamp = ''
+
+    def child_path(self, name: str) -> str:
+        return f'{self.path}/{name}' if self.path else name
+
+    def find(self, rel_path: str) -> DirNode | None:
+        node: DirNode | None = self
+        if not rel_path or rel_path == '.':
+            return node
+        for part in rel_path.strip('/').split('/'):
+            node = node.dirs.get(part) if node else None
+            if node is None:
+                return None
+        return node
+
+    def iter_files(self) -> Iterator[tuple[str, dict]]:
+        for name, entry in self.files.items():
+            yield self.child_path(name), entry
+        for child in self.dirs.values():
+            yield from child.iter_files()
+
+    def iter_nodes(self) -> Iterator[DirNode]:
+        yield self
+        for child in self.dirs.values():
+            yield from child.iter_nodes()
+
+
+def _split(rel_path: str) -> tuple[str, str]:
+    parent, _, name = rel_path.rpartition('/')
+    return parent, name
+
+
+def build_tree(index: Mapping) -> DirNode:
+    """Arrange the entries of an index (dict or CompactIndex) as a DirNode tree."""
+    root = DirNode('', '')
+    nodes: dict[str, DirNode] = {'': root}
+
+    def node_for(rel_dir: str) -> DirNode:
+        node = nodes.get(rel_dir)
+        if node is None:
+            parent, name = _split(rel_dir)
+            parent_node = node_for(parent)
+            node = DirNode(name, rel_dir)
+            parent_node.dirs[name] = node
+            nodes[rel_dir] = node
+        return node
+
+    for rel_dir in index.get('dirs', {}):
+        node_for(rel_dir)
+    for rel_path, entry in index.get('files', {}).items():
+        parent, name = _split(rel_path)
+        node_for(parent).files[name] = entry
+    for rel_path in index.get('placeholders', {}):
+        parent, name = _split(rel_path)
+        node_for(parent).placeholders.add(name)
+
+    _aggregate(root)
+    return root
+
+
+def _combine(
+    files: list[tuple[str, int, str | None, object]],
+    dirs: list[tuple[str, str, str]],
+    placeholders: list[str],
+) -> tuple[str, str]:
+    """Return ``(digest, stamp)`` for one directory from its direct children.
+
+    ``files`` holds ``(name, size, hash, mtime)``, ``dirs`` holds
+    ``(name, digest, stamp)`` of already combined subdirectories.
+    """
+    digest = hashlib.new(TREE_HASH_ALGORITHM)
+    stamp = hashlib.new(TREE_HASH_ALGORITHM)
+    children: list[tuple[str, str, tuple]] = [(f[0], 'f', f) for f in files]
+    children.extend((d[0], 'd', d) for d in dirs)
+    children.extend((name, 'p', (name,)) for name in placeholders)
+    children.sort(key=lambda item: (item[0], item[1]))
+    for name, kind, payload in children:
+        if kind == 'f':
+            line = f"f\0{name}\0{payload[1]}\0{payload[2] or ''}\n".encode('utf-8')
+            digest.update(line)
+            stamp.update(line)
+            stamp.update(f'{payload[3]}\n'.encode('utf-8'))
+        elif kind == 'd':
+            digest.update(f'd\0{name}\0{payload[1]}\n'.encode('utf-8'))
+            stamp.update(f'd\0{name}\0{payload[2]}\n'.encode('utf-8'))
+        else:
+            line = f'p\0{name}\n'.encode('utf-8')
+            digest.update(line)
+            stamp.update(line)
+    return digest.hexdigest(), stamp.hexdigest()
+
+
+def _aggregate(node: DirNode, hashes: bool = True) -> None:
+    """Fill in the subtree aggregates; with ``hashes=False`` digests and stamps are taken as already set."""
+    # iterative post-order so deep trees cannot hit the recursion limit
+    stack: list[tuple[DirNode, bool]] = [(node, False)]
+    while stack:
+        current, done = stack.pop()
+        if not done:
+            stack.append((current, True))
+            stack.extend((child, False) for child in current.dirs.values())
+            continue
+        files = [
+            (name, entry.get('size') or 0, entry.get('hash'), entry.get('mtime'))
+            for name, entry in current.files.items()
+        ]
+        if hashes:
+            dirs = [(name, child.digest, child.stamp) for name, child in current.dirs.items()]
+            current.digest, current.stamp = _combine(files, dirs, list(current.placeholders))
+        current.file_count = len(files) + sum(child.file_count for child in current.dirs.values())
+        current.total_bytes = sum(f[1] for f in files) + sum(child.total_bytes for child in current.dirs.values())
+
+
+def _record_compact(index: CompactIndex) -> None:
+    """Hash every directory of ``index`` once and keep the per-directory layout alongside."""
+    dir_total = index.dir_count + 1
+    files: list[list] = [[] for _ in range(dir_total)]
+    ordinals: list[list[int]] = [[] for _ in range(dir_total)]
+    placeholders: list[list[str]] = [[] for _ in range(dir_total)]
+    children: list[list[int]] = [[] for _ in range(dir_total)]
+    for ordinal, (dir_id, name, size, mtime, digest) in enumerate(index.file_records()):
+        files[dir_id].append((name, size, digest, mtime))
+        ordinals[dir_id].append(ordinal)
+    for dir_id, name in index.placeholder_records():
+        placeholders[dir_id].append(name)
+    for dir_id in range(1, dir_total):
+        children[index.parent_id(dir_id)].append(dir_id)
+
+    hashes = [''] * dir_total
+    stamps = [''] * dir_total
+    # deepest directories first so every child is combined before its parent
+    order = sorted(range(dir_total), key=lambda d: index.dir_path(d).count('/') + bool(d), reverse=True)
+    for dir_id in order:
+        dirs = [
+            (index.dir_path(child).rpartition('/')[2], hashes[child], stamps[child])
+            for child in children[dir_id]
+        ]
+        hashes[dir_id], stamps[dir_id] = _combine(files[dir_id], dirs, placeholders[dir_id])
+        files[dir_id] = []
+
+    grouped = array('I')
+    starts = array('I', [0])
+    for group in ordinals:
+        grouped.extend(group)
+        starts.append(len(grouped))
+    index.dir_hashes, index.dir_stamps, index.dir_children = hashes, stamps, children
+    index.dir_files, index.dir_file_starts = grouped, starts
+
+
+def _compact_tree(index: CompactIndex) -> DirNode:
+    """DirNode view of a CompactIndex built from its recorded layout, without hashing anything again."""
+    names = index.file_names()
+    nodes: list[DirNode] = []
+    for dir_id in range(index.dir_count + 1):
+        path = index.dir_path(dir_id)
+        node = DirNode(path.rpartition('/')[2], path)
+        node.digest = index.dir_hashes[dir_id]
+        node.stamp = index.dir_stamps[dir_id]
+        for ordinal in index.dir_file_ordinals(dir_id):
+            node.files[names[ordinal]] = index.file_entry(ordinal)
+        nodes.append(node)
+    for node, child_ids in zip(nodes, index.dir_children):
+        for child_id in child_ids:
+            child = nodes[child_id]
+            node.dirs[child.name] = child
+    for dir_id, name in index.placeholder_records():
+        nodes[dir_id].placeholders.add(name)
+    _aggregate(nodes[0], hashes=False)
+    return nodes[0]
+
+
+def record_tree_hashes(index: Mapping) -> str:
+    """Store per-directory Merkle hashes and the root hash in ``index``; return the root hash."""
+    if isinstance(index, CompactIndex):
+        _record_compact(index)
+        digest, stamp = index.dir_hashes[0], index.dir_stamps[0]
+    else:
+        root = build_tree(index)
+        dirs = index.setdefault('dirs', {})
+        for node in root.iter_nodes():
+            if node.path:
+                entry = dirs.setdefault(node.path, {'kind': 'dir'})
+                entry['tree_hash'] = node.digest
+                entry['tree_stamp'] = node.stamp
+        digest, stamp = root.digest, root.stamp
+    index['metadata']['root_hash'] = digest
+    index['metadata']['root_stamp'] = stamp
+    index['metadata']['tree_hash_alg'] = TREE_HASH_ALGORITHM
+    return digest
+
+
+def root_hash(index: Mapping) -> str:
+    """Return the recorded root hash, computing it only for indexes written before it existed."""
+    recorded = index.get('metadata', {}).get('root_hash')
+    if recorded:
+        return recorded
+    return index_tree(index).digest
+
+
+def index_tree(index: Mapping) -> DirNode:
+    """Return the tree for ``index``, cached on CompactIndex instances.
+
+    A CompactIndex whose hashes were recorded is laid out from the recorded
+    per-directory data instead of being regrouped and hashed again.
+    """
+    if isinstance(index, CompactIndex):
+        if index.tree is None:
+            index.tree = _compact_tree(index) if index.dir_stamps is not None else build_tree(index)
+        return index.tree
+    return build_tree(index)
+
+
+def subtree_files(index: Mapping, rel_dir: str) -> Iterator[tuple[str, dict]]:
+    """Yield every file entry under ``rel_dir`` without scanning the rest of the index."""
+    node = index_tree(index).find(rel_dir)
+    if node is not None:
+        yield from node.iter_files()
+
+
+def iter_changed_files(old: DirNode, new: DirNode) -> Iterator[tuple[str, dict | None, dict | None]]:
+    """Yield ``(rel_path, old_entry, new_entry)`` for files that differ, skipping identical subtrees.
+
+    Missing or extra files come with ``None`` on the absent side. Entries
+    present on both sides are yielded only when their directory stamp
+    differs, so callers still need to compare the individual fields.
+    """
+    stack: list[tuple[DirNode | None, DirNode | None]] = [(old, new)]
+    while stack:
+        old_node, new_node = stack.pop()
+        if old_node is not None and new_node is not None and old_node.stamp == new_node.stamp:
+            continue
+        if old_node is None:
+            for rel_path, entry in new_node.iter_files():
+                yield rel_path, None, entry
+            continue
+        if new_node is None:
+            for rel_path, entry in old_node.iter_files():
+                yield rel_path, entry, None
+            continue
+        for name, old_entry in old_node.files.items():
+            new_entry = new_node.files.get(name)
+            if new_entry is None or new_entry != old_entry:
+                yield old_node.child_path(name), old_entry, new_entry
+        for name, new_entry in new_node.files.items():
+            if name not in old_node.files:
+                yield new_node.child_path(name), None, new_entry
+        for name, child in old_node.dirs.items():
+            stack.append((child, new_node.dirs.get(name)))
+        for name, child in new_node.dirs.items():
+            if name not in old_node.dirs:
+                stack.append((None, child))
+
+
+def recorded_stamps(index: Mapping) -> dict[str, str] | None:
+    """Directory stamps recorded at build or load time, keyed by path (``''`` is the root).
+
+    None when ``index`` carries none (e.g. written before stamps existed),
+    so callers can fall back to a flat diff instead of hashing every
+    directory just to compare.
+    """
+    if isinstance(index, CompactIndex):
+        if index.dir_stamps is None:
+            return None
+        return {index.dir_path(dir_id): stamp for dir_id, stamp in enumerate(index.dir_stamps)}
+    metadata = index.get('metadata', {})
+    if not metadata.get('root_stamp') or metadata.get('tree_hash_alg') != TREE_HASH_ALGORITHM:
+        return None
+    stamps = {'': metadata['root_stamp']}
+    for rel_dir, entry in index.get('dirs', {}).items():
+        stamp = entry.get('tree_stamp')
+        if stamp is None:
+            return None
+        stamps[rel_dir] = stamp
+    return stamps
+
+
+def _files_in(index: Mapping, rel_dirs: set[str]) -> Iterator[tuple[str, dict]]:
+    """Yield the file entries directly inside any of ``rel_dirs``."""
+    if isinstance(index, CompactIndex):
+        names = index.file_names()
+        for rel_dir in rel_dirs:
+            try:
+                dir_id = index.dir_id(rel_dir)
+            except KeyError:
+                continue
+            lead = rel_dir + '/' if rel_dir else ''
+            for ordinal in index.dir_file_ordinals(dir_id):
+                yield lead + names[ordinal], index.file_entry(ordinal)
+        return
+    for rel_path, entry in index.get('files', {}).items():
+        if rel_path.rpartition('/')[0] in rel_dirs:
+            yield rel_path, entry
+
+
+def changed_files(old_index: Mapping, new_index: Mapping) -> list[tuple[str, dict | None, dict | None]] | None:
+    """``iter_changed_files`` from the stamps both indexes already carry; None if either has none.
+
+    Only files directly inside directories whose stamps differ (or that
+    exist on one side) are looked at; for CompactIndex instances that is
+    all the work, so the cost follows the size of the change.
+    """
+    old_stamps = recorded_stamps(old_index)
+    new_stamps = recorded_stamps(new_index) if old_stamps is not None else None
+    if new_stamps is None:
+        return None
+    changed = {rel_dir for rel_dir, stamp in old_stamps.items() if new_stamps.get(rel_dir) != stamp}
+    changed.update(rel_dir for rel_dir in new_stamps if rel_dir not in old_stamps)
+    if not changed:
+        return []
+    old_files = dict(_files_in(old_index, changed))
+    new_files = dict(_files_in(new_index, changed))
+    found = [
+        (rel_path, old_entry, new_files.get(rel_path))
+        for rel_path, old_entry in old_files.items()
+        if new_files.get(rel_path) != old_entry
+    ]
+    found.extend((rel_path, None, entry) for rel_path, entry in new_files.items() if rel_path not in old_files)
+    return found
+
+
+def changed_dirs(old: DirNode, new: DirNode) -> list[str]:
+    """Return directories whose own entries differ, descending only into changed subtrees."""
+    changed: list[str] = []
+    stack: list[tuple[DirNode | None, DirNode | None]] = [(old, new)]
+    while stack:
+        old_node, new_node = stack.pop()
+        if old_node is None or new_node is None:
+            changed.append((old_node or new_node).path)
+            continue
+        if old_node.stamp == new_node.stamp:
+            continue
+        if old_node.files != new_node.files or old_node.placeholders != new_node.placeholders \
+                or old_node.dirs.keys() != new_node.dirs.keys():
+            changed.append(old_node.path)
+        for name in old_node.dirs.keys() | new_node.dirs.keys():
+            stack.append((old_node.dirs.get(name), new_node.dirs.get(name)))
+    return sorted(changed)
+
+
+def localize_differences(old: DirNode, new: DirNode) -> list[tuple[str, str]]:
+    """Descend only through subtrees whose digests differ and return ``(rel_path, reason)`` pairs."""
+    found: list[tuple[str, str]] = []
+    stack: list[tuple[DirNode, DirNode]] = [(old, new)]
+    while stack:
+        old_node, new_node = stack.pop()
+        if old_node.digest == new_node.digest:
+            continue
+        for name in sorted(old_node.files.keys() | new_node.files.keys()):
+            old_entry = old_node.files.get(name)
+            new_entry = new_node.files.get(name)
+            rel_path = old_node.child_path(name)
+            if old_entry is None:
+                found.append((rel_path, 'file only in new'))
+            elif new_entry is None:
+                found.append((rel_path, 'file only in old'))
+            elif (old_entry.get('size'), old_entry.get('hash')) != (new_entry.get('size'), new_entry.get('hash')):
+                found.append((rel_path, 'file content differs'))
+        for name in sorted(old_node.placeholders ^ new_node.placeholders):
+            side = 'old' if name in old_node.placeholders else 'new'
+            found.append((old_node.child_path(name), f'placeholder only in {side}'))
+        for name in sorted(old_node.dirs.keys() | new_node.dirs.keys()):
+            old_child = old_node.dirs.get(name)
+            new_child = new_node.dirs.get(name)
+            if old_child is None or new_child is None:
+                side = 'old' if new_child is None else 'new'
+                found.append((old_node.child_path(name), f'directory only in {side}'))
+            elif old_child.digest != new_child.digest:
+                stack.append((old_child, new_child))
+    return sorted(found)
@@ -6,10 +6,18 @@ import os
 import re
 import sys
 import time
+from collections.abc import Callable, Mapping
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, Optional
 
+from . import profiling
+
+PLACEHOLDER_MANIFEST_NAME = '.kb_placeholders.json'
+PLACEHOLDER_MANIFEST_FORMAT = 1
+PLACEHOLDER_MODES = ('dirs', 'manifest')
+CACHE_HINT_MODES = ('none', 'sequential', 'dontneed')
+
 INVALID_NAME_CHARS = set('\\/:*?"<>|')
 RESERVED_NAMES = {
     'CON', 'PRN', 'AUX', 'NUL',
@@ -27,55 +35,343 @@ def is_unc_path(path: Path) -> bool:
     return s.startswith('\\\\') or s.startswith('//') or s.upper().startswith('\\\\?\\UNC\\') or s.upper().startswith('//?/UNC/')
 
 
+_DRIVE_PATH = re.compile(r'^[A-Za-z]:\\')
+
+
 def to_extended_path(path: Path) -> str:
     s = str(path.resolve())
     if s.startswith('\\\\?\\'):
         return s
     if s.startswith('\\\\') or s.startswith('//'):
         return s
-    if re.match(r'^[A-Za-z]:\\', s):
+    if _DRIVE_PATH.match(s):
         return '\\\\?\\' + s
     return s
 
 
+class PathContext:
+    """Extended paths for everything below one root, resolved once.
+
+    ``to_extended_path`` resolves and pattern-matches on every call; for a
+    descendant of a known root the same string is just the root's extended
+    path joined with the relative path. The filesystem helpers below accept
+    these strings wherever they take a Path.
+    """
+
+    __slots__ = ('root', 'base', '_prefix')
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.base = to_extended_path(root)
+        self._prefix = self.base if self.base.endswith(os.sep) else self.base + os.sep
+
+    def path(self, rel_path: str) -> str:
+        """Extended path of the POSIX-relative ``rel_path``; ``''`` and ``'.'`` are the root."""
+        if not rel_path or rel_path == '.':
+            return self.base
+        if os.sep != '/':
+            rel_path = rel_path.replace('/', os.sep)
+        return self._prefix + rel_path
+
+    @staticmethod
+    def join(parent: str, name: str) -> str:
+        """Extended path of ``name`` inside the extended directory path ``parent``."""
+        return parent + name if parent.endswith(os.sep) else parent + os.sep + name
+
+
+def _ext(path: Path | str) -> str:
+    # strings come from PathContext (or to_extended_path) and are used as-is
+    return path if isinstance(path, str) else to_extended_path(path)
+
+
 def strip_extended_prefix(path_str: str) -> str:
     if path_str.startswith('\\\\?\\'):
         return path_str[4:]
     return path_str
 
 
-def ensure_dir(path: Path) -> None:
-    os.makedirs(to_extended_path(path), exist_ok=True)
+def ensure_dir(path: Path | str) -> None:
+    os.makedirs(_ext(path), exist_ok=True)
+
+
+def safe_scandir(path: Path | str):
+    return os.scandir(_ext(path))
+
+
+def is_symlink(path: Path | str) -> bool:
+    profiling.count('stat_calls')
+    return os.path.islink(_ext(path))
+
+
+# st_size of an empty directory, on filesystems where only an empty directory has that size
+_EMPTY_DIR_SIZE = {'tmpfs': 40, 'btrfs': 0}
+# filesystems where a directory's st_nlink is 2 plus its number of subdirectories
+_SUBDIR_NLINK = {'ext2', 'ext3', 'ext4', 'xfs', 'tmpfs'}
+_mount_types: dict[str, str] | None = None
+_device_types: dict[int, str | None] = {}
+
+
+def _load_mount_types() -> dict[str, str]:
+    global _mount_types
+    if _mount_types is None:
+        _mount_types = {}
+        try:
+            with open('/proc/self/mountinfo', 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    fields = line.split()
+                    if ' - ' in line and len(fields) > 2:
+                        _mount_types[fields[2]] = line.split(' - ', 1)[1].split()[0]
+        except OSError:
+            pass
+    return _mount_types
+
+
+def filesystem_type(st_dev: int) -> str | None:
+    """Filesystem type of the mount ``st_dev`` belongs to, from /proc/self/mountinfo (Linux only)."""
+    try:
+        return _device_types[st_dev]
+    except KeyError:
+        pass
+    mount_types = _load_mount_types()
+    fstype = mount_types.get(f'{os.major(st_dev)}:{os.minor(st_dev)}') if mount_types else None
+    _device_types[st_dev] = fstype
+    return fstype
+
+
+def empty_dir_probe(parent: Path | str) -> bool:
+    """Whether one stat can tell if the directories inside ``parent`` are empty.
+
+    Resolved once per parent directory from its ``st_dev``: true on tmpfs
+    and btrfs. Elsewhere (ext4 without subdirectories, network and Windows
+    filesystems) the stat would only precede reading the directory anyway,
+    so ``dir_is_empty(..., probe=False)`` should skip it. Without
+    /proc/self/mountinfo nothing is stat'ed at all.
+    """
+    if not _load_mount_types():
+        return False
+    try:
+        st_dev = os.stat(_ext(parent)).st_dev
+    except OSError:
+        return False
+    return filesystem_type(st_dev) in _EMPTY_DIR_SIZE
+
+
+def dir_is_empty(path: Path | str, st: os.stat_result | None = None, probe: bool = True) -> bool:
+    """Whether the directory ``path`` is empty, from one stat where the filesystem allows it.
+
+    On tmpfs and btrfs the directory size alone tells an empty directory
+    apart; on ext4/xfs/tmpfs a link count above 2 means subdirectories.
+    Everything else falls back to reading the directory. Pass ``st`` when
+    the caller already holds it, or ``probe=False`` (see ``empty_dir_probe``)
+    to read the directory without a stat first.
+    """
+    path = _ext(path)
+    if st is None and probe:
+        st = os.stat(path)
+    if st is not None:
+        fstype = filesystem_type(st.st_dev)
+        if fstype is not None:
+            if fstype in _SUBDIR_NLINK and st.st_nlink > 2:
+                profiling.count('empty_dir_probes')
+                return False
+            empty_size = _EMPTY_DIR_SIZE.get(fstype)
+            if empty_size is not None:
+                profiling.count('empty_dir_probes')
+                return st.st_size == empty_size
+    profiling.count('empty_dir_scans')
+    with os.scandir(path) as it:
+        return next(it, None) is None
+
+
+def stat_file(path: Path | str) -> os.stat_result:
+    """One ``stat`` for both size and mtime."""
+    profiling.count('stat_calls')
+    return os.stat(_ext(path))
+
+
+def file_size(path: Path | str) -> int:
+    profiling.count('stat_calls')
+    return os.path.getsize(_ext(path))
 
 
-def safe_scandir(path: Path):
-    return os.scandir(to_extended_path(path))
+def file_mtime(path: Path | str) -> float:
+    profiling.count('stat_calls')
+    return os.path.getmtime(_ext(path))
 
 
-def is_symlink(path: Path) -> bool:
-    return os.path.islink(to_extended_path(path))
+_READ_CHUNK = 1024 * 1024
+# pages are dropped behind the cursor in windows this large, not per chunk
+_DROP_WINDOW = 8 * 1024 * 1024
+_O_BINARY = getattr(os, 'O_BINARY', 0)
 
 
-def file_size(path: Path) -> int:
-    return os.path.getsize(to_extended_path(path))
+@dataclass(frozen=True)
+class CacheHints:
+    """Page-cache policy handed to ``hash_file`` and the copy helpers.
 
+    ``sequential`` asks the kernel for aggressive readahead, ``dontneed``
+    also drops the pages behind the read and write cursors, so streaming a
+    whole tree once does not evict everything else on the machine. Files
+    of at least ``direct_io_min_size`` bytes (0 disables it) are read with
+    ``O_DIRECT`` where the filesystem supports it. Without
+    ``posix_fadvise`` (Windows) the hints do nothing.
+    """
 
-def file_mtime(path: Path) -> float:
-    return os.path.getmtime(to_extended_path(path))
+    mode: str = 'none'
+    direct_io_min_size: int = 0
 
+    def __post_init__(self) -> None:
+        if self.mode not in CACHE_HINT_MODES:
+            raise ValueError(f'cache_hints must be one of: {", ".join(CACHE_HINT_MODES)}')
 
-def hash_file(path: Path, algorithm: str) -> str:
+
+NO_CACHE_HINTS = CacheHints()
+
+
+def _advise(hints: CacheHints, fd: int, offset: int, length: int, advice: str) -> None:
+    if hints.mode == 'none' or not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+    except OSError:
+        # a hint, never a reason to fail (e.g. pipes or filesystems that reject it)
+        pass
+
+
+def _read_direct(path: str, size: int, min_size: int):
+    """Yield the file in aligned ``O_DIRECT`` chunks and return how far it got.
+
+    Stops quietly (returning the offset reached) when the filesystem
+    rejects direct I/O, so the caller can read the rest through the cache.
+    The chunks are views of one reused buffer and must be consumed at once.
+    """
+    if not min_size or size < min_size or not hasattr(os, 'O_DIRECT'):
+        return 0
+    import mmap
+
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECT)
+    except OSError:
+        return 0
+    # an anonymous mapping is page aligned, as O_DIRECT requires
+    buf = mmap.mmap(-1, _READ_CHUNK)
+    view = memoryview(buf)
+    offset = 0
+    try:
+        while True:
+            try:
+                n = os.readv(fd, [buf])
+            except OSError:
+                return offset
+            if n:
+                yield view[:n]
+                offset += n
+            if n < _READ_CHUNK:
+                # EOF, or a short read that leaves the offset unaligned
+                return offset
+    finally:
+        # the buffer is freed with the last chunk view the caller still holds
+        os.close(fd)
+
+
+def _read_chunks(path: str, hints: CacheHints):
+    """Yield the contents of ``path`` in chunks under ``hints``."""
+    fd = os.open(path, os.O_RDONLY | _O_BINARY)
+    try:
+        size = os.fstat(fd).st_size
+        offset = yield from _read_direct(path, size, hints.direct_io_min_size)
+        if offset and offset >= size:
+            return
+        _advise(hints, fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+        drop = hints.mode == 'dontneed'
+        dropped = offset
+        if offset:
+            os.lseek(fd, offset, os.SEEK_SET)
+        while True:
+            chunk = os.read(fd, _READ_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+            offset += len(chunk)
+            if drop and offset - dropped >= _DROP_WINDOW:
+                _advise(hints, fd, dropped, offset - dropped, 'POSIX_FADV_DONTNEED')
+                dropped = offset
+        if drop:
+            _advise(hints, fd, dropped, 0, 'POSIX_FADV_DONTNEED')
+    finally:
+        os.close(fd)
+
+
+def hash_file(path: Path | str, algorithm: str, hints: CacheHints = NO_CACHE_HINTS) -> str:
     h = hashlib.new(algorithm)
-    with open(to_extended_path(path), 'rb') as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b''):
-            h.update(chunk)
+    read = 0
+    for chunk in _read_chunks(_ext(path), hints):
+        h.update(chunk)
+        read += len(chunk)
+    profiling.count('bytes_read', read)
+    profiling.count('files_hashed')
     return h.hexdigest()
 
 
-def copy_file(src: Path, dst: Path) -> None:
+def _copy_chunks(src_ext: str, dst_ext: str, hints: CacheHints, h=None) -> int:
+    """Stream ``src_ext`` into ``dst_ext`` under ``hints``, feeding ``h`` on the way."""
+    drop = hints.mode == 'dontneed'
+    copied = 0
+    dropped = 0
+    with open(dst_ext, 'wb') as fdst:
+        for chunk in _read_chunks(src_ext, hints):
+            if h is not None:
+                h.update(chunk)
+            fdst.write(chunk)
+            copied += len(chunk)
+            if drop and copied - dropped >= 2 * _DROP_WINDOW:
+                # DONTNEED starts writeback of dirty pages and drops clean ones,
+                # so lagging one window behind drops what the last call flushed
+                fdst.flush()
+                _advise(hints, fdst.fileno(), dropped, copied - dropped, 'POSIX_FADV_DONTNEED')
+                dropped = copied - _DROP_WINDOW
+        if drop:
+            fdst.flush()
+            _advise(hints, fdst.fileno(), dropped, 0, 'POSIX_FADV_DONTNEED')
+    return copied
+
+
+def copy_file(src: Path | str, dst: Path | str, make_parent: bool = True, hints: CacheHints = NO_CACHE_HINTS) -> None:
+    import shutil
+    dst_ext = _ext(dst)
+    if make_parent:
+        os.makedirs(os.path.dirname(dst_ext), exist_ok=True)
+    src_ext = _ext(src)
+    if hints == NO_CACHE_HINTS:
+        shutil.copy2(src_ext, dst_ext)
+        if profiling.active() is not None:
+            size = os.path.getsize(src_ext)
+            profiling.count('bytes_read', size)
+            profiling.count('bytes_written', size)
+        return
+    # copy2 gives the kernel no hints, so hinted copies stream through _read_chunks
+    size = _copy_chunks(src_ext, dst_ext, hints)
+    shutil.copystat(src_ext, dst_ext)
+    profiling.count('bytes_read', size)
+    profiling.count('bytes_written', size)
+
+
+def copy_file_hashed(
+    src: Path | str, dst: Path | str, algorithm: str, make_parent: bool = True, hints: CacheHints = NO_CACHE_HINTS
+) -> str:
+    """``copy_file`` that also returns the digest of the copied bytes, reading them once."""
     import shutil
-    ensure_dir(dst.parent)
-    shutil.copy2(to_extended_path(src), to_extended_path(dst))
+    dst_ext = _ext(dst)
+    if make_parent:
+        os.makedirs(os.path.dirname(dst_ext), exist_ok=True)
+    src_ext = _ext(src)
+    h = hashlib.new(algorithm)
+    copied = _copy_chunks(src_ext, dst_ext, hints, h)
+    shutil.copystat(src_ext, dst_ext)
+    profiling.count('bytes_read', copied)
+    profiling.count('bytes_written', copied)
+    profiling.count('files_hashed')
+    return h.hexdigest()
 
 
 def is_invalid_name_component(name: str) -> bool:
@@ -96,16 +392,173 @@ def path_has_invalid_components(path: Path) -> bool:
     return False
 
 
-def iter_walk(root: Path, placeholder_suffix: str):
-    root_ext = to_extended_path(root)
-    for current, dirs, files in os.walk(root_ext):
+def _list_dir(path: str) -> tuple[list[str], list[str], set[str]] | None:
+    """One directory listing as os.walk sees it: ``(dirs, files, symlinked dirs)``, or None if unreadable."""
+    dirs: list[str] = []
+    files: list[str] = []
+    links: set[str] = set()
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dirs.append(entry.name)
+                    if entry.is_symlink():
+                        links.add(entry.name)
+                else:
+                    files.append(entry.name)
+    except OSError:
+        return None
+    return dirs, files, links
+
+
+def walk_tree(top: str, workers: int = 1, prune: Callable[[str], bool] | None = None):
+    """``os.walk(top)`` with about ``2 * workers`` directory listings in flight.
+
+    Yields the same ``(path, dirs, files)`` triples in the same top-down
+    order, skips unreadable directories and does not follow symlinks. As
+    with os.walk, removing names from ``dirs`` before resuming prunes them.
+    The listings of the directories next in walk order (including children
+    of listings that already arrived) are fetched ahead in a thread pool,
+    which hides the round trip of each ``scandir`` on network filesystems.
+    Directory names for which ``prune`` is true are never fetched ahead;
+    the caller is expected to remove them from ``dirs``.
+    """
+    if workers <= 1:
+        yield from os.walk(top)
+        return
+    from concurrent.futures import ThreadPoolExecutor
+
+    # twice the pool size, so a worker is free again as soon as a listing is consumed
+    window = 2 * workers
+    futures: dict = {}
+    stack = [top]
+
+    def upcoming():
+        # walk order as far as it is known: the stack, expanded by listings that are already done
+        expanded: list[str] = []
+        i = len(stack) - 1
+        while True:
+            if expanded:
+                path = expanded.pop()
+            elif i >= 0:
+                path = stack[i]
+                i -= 1
+            else:
+                return
+            yield path
+            future = futures.get(path)
+            if future is not None and future.done() and future.result() is not None:
+                dirs, _files, links = future.result()
+                expanded.extend(
+                    os.path.join(path, name) for name in reversed(dirs)
+                    if name not in links and (prune is None or not prune(name))
+                )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while stack:
+                for seen, path in enumerate(upcoming()):
+                    if seen >= window:
+                        break
+                    # the next directory is always requested, even when the window is taken by later ones
+                    if path not in futures and (seen == 0 or len(futures) < window):
+                        futures[path] = pool.submit(_list_dir, path)
+                path = stack.pop()
+                listing = futures.pop(path).result()
+                if listing is None:
+                    continue
+                dirs, files, links = listing
+                listed = list(dirs)
+                yield path, dirs, files
+                if len(dirs) != len(listed):
+                    # pruned by the caller: drop listings fetched ahead inside those subtrees
+                    for name in set(listed).difference(dirs):
+                        pruned = os.path.join(path, name)
+                        for key in [k for k in futures if k == pruned or k.startswith(pruned + os.sep)]:
+                            futures.pop(key).cancel()
+                # push in reverse so the first remaining dir is walked first
+                for name in reversed(dirs):
+                    if name not in links:
+                        stack.append(os.path.join(path, name))
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+
+def read_placeholder_manifest(dir_path: Path | str) -> list[str]:
+    """Placeholder names recorded in the manifest of ``dir_path`` (``placeholder_mode: manifest``)."""
+    path = os.path.join(_ext(dir_path), PLACEHOLDER_MANIFEST_NAME)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or data.get('format') != PLACEHOLDER_MANIFEST_FORMAT:
+        raise ValueError(f'not a kb placeholder manifest: {strip_extended_prefix(path)}')
+    names = data.get('placeholders')
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError(f'not a kb placeholder manifest: {strip_extended_prefix(path)}')
+    return names
+
+
+def write_placeholder_manifest(dir_path: Path | str, names: Iterable[str], placeholder_suffix: str) -> None:
+    """Record ``names`` as the placeholders of ``dir_path``; an empty list removes the manifest."""
+    path = os.path.join(_ext(dir_path), PLACEHOLDER_MANIFEST_NAME)
+    names = sorted(set(names))
+    if not names:
+        if os.path.lexists(path):
+            os.remove(path)
+        return
+    data = {'format': PLACEHOLDER_MANIFEST_FORMAT, 'placeholder_suffix': placeholder_suffix, 'placeholders': names}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+@dataclass
+class PlaceholderManifest:
+    """What ``iter_walk`` read from one directory's placeholder manifest.
+
+    ``names`` are the placeholders recorded only in the manifest (not also
+    present as directories); ``error`` says why an unreadable manifest was
+    skipped, for the class1 check to report.
+    """
+
+    names: list[str]
+    error: str | None = None
+
+
+def iter_walk(root: Path, placeholder_suffix: str, top: str = '', workers: int = 1, placeholder_manifests: bool = False):
+    """Walk ``root`` (or only its subtree ``top``), pruning placeholder dirs; paths stay relative to ``root``.
+
+    Yields ``(rel_root, current_norm, dirs, files, placeholder_dirs, manifest)``.
+    With ``placeholder_manifests`` a directory's placeholder manifest is not
+    a file of the tree: it is read into ``manifest`` (a
+    ``PlaceholderManifest``, otherwise None), kept apart from the on-disk
+    ``placeholder_dirs`` since there is nothing on disk to check for them.
+    ``workers > 1`` lists directories concurrently (see ``walk_tree``).
+    """
+    root_ext = to_extended_path(root / top if top else root)
+    for current, dirs, files in walk_tree(root_ext, workers, lambda name: name.endswith(placeholder_suffix)):
         current_norm = Path(strip_extended_prefix(current))
         rel_root = current_norm.relative_to(root)
 
+        # one pass each way; dirs is edited in place so the walk skips the placeholders
         placeholder_dirs = [d for d in dirs if d.endswith(placeholder_suffix)]
-        for d in placeholder_dirs:
-            dirs.remove(d)
-        yield rel_root, current_norm, dirs, files, placeholder_dirs
+        if placeholder_dirs:
+            dirs[:] = [d for d in dirs if not d.endswith(placeholder_suffix)]
+        manifest = None
+        if placeholder_manifests and PLACEHOLDER_MANIFEST_NAME in files:
+            files.remove(PLACEHOLDER_MANIFEST_NAME)
+            try:
+                listed = read_placeholder_manifest(current)
+            except (OSError, ValueError) as exc:
+                manifest = PlaceholderManifest([], str(exc))
+            else:
+                existing = set(placeholder_dirs)
+                manifest = PlaceholderManifest([name for name in dict.fromkeys(listed) if name not in existing])
+        profiling.count('dirs_walked')
+        yield rel_root, current_norm, dirs, files, placeholder_dirs, manifest
 
 
 def is_placeholder_dir_name(name: str, placeholder_suffix: str) -> bool:
@@ -167,10 +620,35 @@ class Logger:
         self._write('FATAL', message)
 
 
-def write_json(path: Path, data: dict) -> None:
+def _iter_json(data, level: int):
+    """Yield ``json.dump(indent=2)`` compatible text, streaming nested mappings lazily."""
+    if not isinstance(data, Mapping):
+        yield json.dumps(data, ensure_ascii=False)
+        return
+    if not data:
+        yield '{}'
+        return
+    inner = '\n' + '  ' * (level + 1)
+    first = True
+    for key, value in data.items():
+        yield ('{' if first else ',') + inner + json.dumps(key, ensure_ascii=False) + ': '
+        first = False
+        if isinstance(value, Mapping):
+            yield from _iter_json(value, level + 1)
+        else:
+            yield json.dumps(value, ensure_ascii=False, indent=2).replace('\n', inner)
+    yield '\n' + '  ' * level + '}'
+
+
+def write_json(path: Path, data: Mapping) -> None:
     ensure_dir(path.parent)
     with open(to_extended_path(path), 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        if isinstance(data, dict):
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            return
+        # index views build entries on the fly; stream them instead of materialising a dict
+        for chunk in _iter_json(data, 0):
+            f.write(chunk)
 
 
 def rel_path_key(root: Path, path: Path) -> str:
@@ -201,9 +679,16 @@ def normalize_specified_types(values: Iterable[str]) -> list[str]:
     return result
 
 
+def file_suffix(filename: str) -> str:
+    """Lowercase suffix of a file name, identical to ``Path(filename.lower()).suffix``."""
+    dot = filename.rfind('.')
+    if 0 < dot < len(filename) - 1:
+        return filename[dot:].lower()
+    return ''
+
+
 def is_specified_type(filename: str, specified_types: set[str]) -> bool:
-    lower = filename.lower()
-    suffix = Path(lower).suffix
+    suffix = file_suffix(filename)
     if not suffix:
         return False
     return suffix in specified_types
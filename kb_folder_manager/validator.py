@@ -1,98 +1,157 @@
 from __future__ import annotations
 
+import json
+import os
+import tempfile
+import unicodedata
+from collections.abc import Iterator
 from pathlib import Path
 
+from .classify import classify_index, classify_placeholders
 from .config import Config
-from .indexer import build_index
+from .indexer import IndexReader, build_index, load_index
+from .pathsets import PathUniverse
+from .tree import changed_files
 from .utils import (
+    PLACEHOLDER_MANIFEST_NAME,
     Logger,
-    derive_placeholder_original,
+    PathContext,
+    PlaceholderManifest,
+    dir_is_empty,
+    empty_dir_probe,
     is_invalid_name_component,
-    is_specified_type,
     is_symlink,
     is_unc_path,
     iter_walk,
     path_has_invalid_components,
-    safe_scandir,
 )
 
 
-def _check_case_conflicts(root: Path, placeholder_suffix: str, logger: Logger) -> None:
-    seen: dict[str, str] = {}
-    for rel_root, current_norm, dirs, files, placeholder_dirs in iter_walk(root, placeholder_suffix):
-        for name in dirs + files + placeholder_dirs:
-            rel_path = (rel_root / name).as_posix()
-            key = rel_path.lower()
-            if key in seen and seen[key] != rel_path:
-                logger.fatal(f'case conflict: {seen[key]} vs {rel_path}')
-            else:
-                seen[key] = rel_path
-
-
-def _check_placeholder_dirs(root: Path, placeholder_suffix: str, allow_placeholders: bool, logger: Logger) -> None:
-    for rel_root, current_norm, dirs, files, placeholder_dirs in iter_walk(root, placeholder_suffix):
-        if not allow_placeholders:
-            for name in dirs + files + placeholder_dirs:
-                if name.endswith(placeholder_suffix):
-                    rel_path = (rel_root / name).as_posix()
-                    logger.fatal(f'placeholder-like name not allowed in complete folder: {rel_path}')
+CLASS1_RULES = ('invalid_names', 'symlinks', 'case_conflicts', 'long_paths', 'placeholder_dirs')
+LONG_PATH_THRESHOLD = 240
+
+
+class Class1Checker:
+    """The class1 rules, evaluated together on each ``iter_walk`` step.
+
+    Messages are buffered per rule and replayed rule by rule, so a single
+    walk logs exactly what one walk per rule used to. Shard workers call
+    ``take_messages`` after each top-level subtree to hand its messages back.
+    """
+
+    def __init__(
+        self, root: Path, placeholder_suffix: str, allow_placeholders: bool, normalize_nfc: bool = False
+    ) -> None:
+        # extended paths are built without resolve(), which would follow the very link being checked
+        self.ctx = PathContext(root)
+        self.placeholder_suffix = placeholder_suffix
+        self.allow_placeholders = allow_placeholders
+        self.normalize_nfc = normalize_nfc
+        self.messages = self._empty()
+
+    @staticmethod
+    def _empty() -> dict[str, list[tuple[str, str]]]:
+        return {rule: [] for rule in CLASS1_RULES}
+
+    def take_messages(self) -> dict[str, list[tuple[str, str]]]:
+        messages, self.messages = self.messages, self._empty()
+        return messages
+
+    def visit(
+        self,
+        rel_root: Path,
+        current_norm: Path,
+        dirs: list,
+        files: list,
+        placeholder_dirs: list,
+        manifest: PlaceholderManifest | None = None,
+    ) -> None:
+        rel_key = rel_root.as_posix()
+        prefix = '' if rel_key == '.' else rel_key + '/'
+        current = self.ctx.path(rel_key)
+        on_disk = dirs + files + placeholder_dirs
+        listed = manifest.names if manifest is not None else []
+        names = on_disk + listed if listed else on_disk
+        out = self.messages
+
+        for name in names:
+            if is_invalid_name_component(name):
+                out['invalid_names'].append(('fatal', f'invalid name component: {prefix + name}'))
+
+        # manifest entries have nothing on disk that could be a link
+        for name in on_disk:
+            if is_symlink(PathContext.join(current, name)):
+                out['symlinks'].append(('fatal', f'symlink not allowed: {prefix + name}'))
+
+        # only siblings can collide, so the names of one directory are all that is kept
+        seen: dict[str, str] = {}
+        normalize_nfc = self.normalize_nfc
+        for name in names:
+            key = unicodedata.normalize('NFC', name).casefold() if normalize_nfc else name.casefold()
+            first = seen.setdefault(key, name)
+            if first != name:
+                out['case_conflicts'].append(('fatal', f'case conflict: {prefix + first} vs {prefix + name}'))
+
+        current_str = str(current_norm)
+        base_len = len(current_str) + (0 if current_str.endswith(os.sep) else 1)
+        for name in names:
+            if base_len + len(name) >= LONG_PATH_THRESHOLD:
+                out['long_paths'].append(
+                    ('warning', f'long path detected (len>={LONG_PATH_THRESHOLD}): {prefix + name}')
+                )
+
+        if manifest is not None and manifest.error is not None:
+            out['placeholder_dirs'].append(
+                ('error', f'invalid placeholder manifest: {prefix + PLACEHOLDER_MANIFEST_NAME} ({manifest.error})')
+            )
+        for d in listed:
+            if not d.endswith(self.placeholder_suffix):
+                out['placeholder_dirs'].append(('error', f'placeholder manifest entry without suffix: {prefix + d}'))
+        if not self.allow_placeholders:
+            for name in names:
+                if name.endswith(self.placeholder_suffix):
+                    out['placeholder_dirs'].append(
+                        ('fatal', f'placeholder-like name not allowed in complete folder: {prefix + name}')
+                    )
+            return
+        if not placeholder_dirs:
+            return
+        # only the on-disk placeholder dirs are checked; the filesystem is resolved once for all of them
+        probe = empty_dir_probe(current)
         for d in placeholder_dirs:
-            rel_path = (rel_root / d).as_posix()
-            if not allow_placeholders:
-                continue
-            full = current_norm / d
+            rel_path = prefix + d
             try:
-                with safe_scandir(full) as it:
-                    if any(True for _ in it):
-                        logger.error(f'placeholder dir not empty: {rel_path}')
+                if not dir_is_empty(PathContext.join(current, d), probe=probe):
+                    out['placeholder_dirs'].append(('error', f'placeholder dir not empty: {rel_path}'))
             except Exception as exc:
-                logger.error(f'failed to scan placeholder dir: {rel_path} ({exc})')
+                out['placeholder_dirs'].append(('error', f'failed to scan placeholder dir: {rel_path} ({exc})'))
 
 
-def _check_invalid_names(root: Path, placeholder_suffix: str, logger: Logger) -> None:
+def check_class1_root(root: Path, logger: Logger) -> None:
+    """The class1 rules about ``root`` itself, logged before any walk message."""
+    if is_unc_path(root):
+        logger.fatal(f'UNC path not allowed: {root}')
     if path_has_invalid_components(root):
         logger.fatal(f'root path has invalid components: {root}')
-    for rel_root, _current_norm, dirs, files, placeholder_dirs in iter_walk(root, placeholder_suffix):
-        for name in dirs + files + placeholder_dirs:
-            if is_invalid_name_component(name):
-                rel_path = (rel_root / name).as_posix()
-                logger.fatal(f'invalid name component: {rel_path}')
 
 
-def _check_symlinks(root: Path, placeholder_suffix: str, logger: Logger) -> None:
-    for rel_root, current_norm, dirs, files, placeholder_dirs in iter_walk(root, placeholder_suffix):
-        for name in dirs + files + placeholder_dirs:
-            full = current_norm / name
-            if is_symlink(full):
-                rel_path = (rel_root / name).as_posix()
-                logger.fatal(f'symlink not allowed: {rel_path}')
-
-
-def _check_long_paths(root: Path, placeholder_suffix: str, logger: Logger) -> None:
-    threshold = 240
-    for rel_root, current_norm, dirs, files, placeholder_dirs in iter_walk(root, placeholder_suffix):
-        for name in dirs + files + placeholder_dirs:
-            full = current_norm / name
-            if len(str(full)) >= threshold:
-                rel_path = (rel_root / name).as_posix()
-                logger.warning(f'long path detected (len>={threshold}): {rel_path}')
+def replay_class1(logger: Logger, buckets: list[dict[str, list[tuple[str, str]]]]) -> None:
+    """Log buffered class1 messages rule by rule, each rule in walk order across ``buckets``."""
+    for rule in CLASS1_RULES:
+        for bucket in buckets:
+            for level, message in bucket[rule]:
+                getattr(logger, level)(message)
 
 
 def validate_class1(root: Path, config: Config, allow_placeholders: bool, logger: Logger) -> None:
-    if is_unc_path(root):
-        logger.fatal(f'UNC path not allowed: {root}')
-    _check_invalid_names(root, config.placeholder_suffix, logger)
-    _check_symlinks(root, config.placeholder_suffix, logger)
-    _check_case_conflicts(root, config.placeholder_suffix, logger)
-    _check_long_paths(root, config.placeholder_suffix, logger)
-    _check_placeholder_dirs(root, config.placeholder_suffix, allow_placeholders, logger)
-
-
-def _placeholder_original_path(rel_path: str, placeholder_suffix: str) -> str:
-    p = Path(rel_path)
-    name = p.name
-    original = derive_placeholder_original(name, placeholder_suffix)
-    return (p.parent / original).as_posix() if p.parent != Path('.') else original
+    check_class1_root(root, logger)
+    checker = Class1Checker(root, config.placeholder_suffix, allow_placeholders, config.case_conflict_nfc)
+    walk = iter_walk(
+        root, config.placeholder_suffix, workers=config.walk_workers, placeholder_manifests=config.placeholder_manifests
+    )
+    for entry in walk:
+        checker.visit(*entry)
+    replay_class1(logger, [checker.take_messages()])
 
 
 def validate_class2(index: dict, folder_role: str, config: Config, logger: Logger) -> None:
@@ -100,20 +159,16 @@ def validate_class2(index: dict, folder_role: str, config: Config, logger: Logge
         logger.fatal(f'class2 only supports doc/res, got: {folder_role}')
         return
     specified = config.specified_types
-    for rel_path, entry in index.get('files', {}).items():
-        name = Path(rel_path).name
-        is_spec = is_specified_type(name, specified)
+    for rel_path, is_spec in zip(index.get('files', {}), classify_index(index, specified)):
         if folder_role == 'doc' and not is_spec:
             logger.error(f'doc contains non-specified file: {rel_path}')
         if folder_role == 'res' and is_spec:
             logger.error(f'res contains specified file: {rel_path}')
 
-    for rel_path, entry in index.get('placeholders', {}).items():
+    placeholder_flags = classify_placeholders(index, specified, config.placeholder_suffix)
+    for (rel_path, entry), is_spec in zip(index.get('placeholders', {}).items(), placeholder_flags):
         if entry.get('placeholder_suffix') != config.placeholder_suffix:
             logger.error(f'placeholder suffix mismatch: {rel_path}')
-        original = _placeholder_original_path(rel_path, config.placeholder_suffix)
-        original_name = Path(original).name
-        is_spec = is_specified_type(original_name, specified)
         if folder_role == 'doc' and is_spec:
             logger.error(f'doc placeholder should map to non-specified: {rel_path}')
         if folder_role == 'res' and not is_spec:
@@ -128,42 +183,29 @@ def validate_class2(index: dict, folder_role: str, config: Config, logger: Logge
 
 
 def validate_mutual(doc_index: dict, res_index: dict, config: Config, logger: Logger) -> None:
-    doc_files = set(doc_index.get('files', {}).keys())
-    res_files = set(res_index.get('files', {}).keys())
-
-    doc_placeholders = set(doc_index.get('placeholders', {}).keys())
-    res_placeholders = set(res_index.get('placeholders', {}).keys())
-
-    doc_placeholder_originals = {
-        _placeholder_original_path(p, config.placeholder_suffix) for p in doc_placeholders
-    }
-    res_placeholder_originals = {
-        _placeholder_original_path(p, config.placeholder_suffix) for p in res_placeholders
-    }
+    universe = PathUniverse()
+    doc_files = universe.add(doc_index.get('files', {}))
+    res_files = universe.add(res_index.get('files', {}))
+    doc_placeholder_originals = universe.add_placeholders(doc_index.get('placeholders', {}), config.placeholder_suffix)
+    res_placeholder_originals = universe.add_placeholders(res_index.get('placeholders', {}), config.placeholder_suffix)
 
-    conflicts = doc_files & res_files
-    for rel_path in sorted(conflicts):
+    for rel_path in (doc_files & res_files).sorted():
         logger.error(f'conflict: file exists in both doc and res: {rel_path}')
 
-    both_placeholder = doc_placeholder_originals & res_placeholder_originals
-    for rel_path in sorted(both_placeholder):
+    for rel_path in (doc_placeholder_originals & res_placeholder_originals).sorted():
         logger.error(f'missing file: placeholder on both sides for {rel_path}')
 
-    for rel_path in sorted(doc_files):
-        if rel_path not in res_placeholder_originals:
-            logger.error(f'doc file missing placeholder in res: {rel_path}')
+    for rel_path in (doc_files - res_placeholder_originals).sorted():
+        logger.error(f'doc file missing placeholder in res: {rel_path}')
 
-    for rel_path in sorted(res_files):
-        if rel_path not in doc_placeholder_originals:
-            logger.error(f'res file missing placeholder in doc: {rel_path}')
+    for rel_path in (res_files - doc_placeholder_originals).sorted():
+        logger.error(f'res file missing placeholder in doc: {rel_path}')
 
-    for rel_path in sorted(doc_placeholder_originals):
-        if rel_path not in res_files:
-            logger.error(f'doc placeholder has no file in res: {rel_path}')
+    for rel_path in (doc_placeholder_originals - res_files).sorted():
+        logger.error(f'doc placeholder has no file in res: {rel_path}')
 
-    for rel_path in sorted(res_placeholder_originals):
-        if rel_path not in doc_files:
-            logger.error(f'res placeholder has no file in doc: {rel_path}')
+    for rel_path in (res_placeholder_originals - doc_files).sorted():
+        logger.error(f'res placeholder has no file in doc: {rel_path}')
 
     logical_doc = doc_files | doc_placeholder_originals
     logical_res = res_files | res_placeholder_originals
@@ -181,31 +223,40 @@ def validate_mutual(doc_index: dict, res_index: dict, config: Config, logger: Lo
         logger.error(f'directory structure mismatch: doc={len(doc_dirs)} res={len(res_dirs)}')
 
 
-def compare_indexes(old_index: dict, new_index: dict, logger: Logger) -> None:
-    old_files = old_index.get('files', {})
-    new_files = new_index.get('files', {})
+def _compare_file_entries(rel_path: str, old_entry: dict, new_entry: dict, logger) -> None:
+    if old_entry.get('size') != new_entry.get('size'):
+        logger.error(f'compare: size mismatch: {rel_path}')
+    if old_entry.get('hash') != new_entry.get('hash'):
+        logger.error(f'compare: hash mismatch: {rel_path}')
+    else:
+        if old_entry.get('mtime') != new_entry.get('mtime'):
+            logger.warning(f'compare: mtime differs but hash same: {rel_path}')
+
 
-    old_file_keys = set(old_files.keys())
-    new_file_keys = set(new_files.keys())
+def compare_indexes(old_index: dict, new_index: dict, logger: Logger) -> None:
+    changes = changed_files(old_index, new_index)
+    if changes is None:
+        # no recorded stamps to prune by; hashing every directory here would cost more than a flat diff
+        old_files = old_index.get('files', {})
+        new_files = new_index.get('files', {})
+        old_file_keys = set(old_files.keys())
+        new_file_keys = set(new_files.keys())
+        missing = old_file_keys - new_file_keys
+        extra = new_file_keys - old_file_keys
+        common = [(rel_path, old_files[rel_path], new_files[rel_path]) for rel_path in old_file_keys & new_file_keys]
+    else:
+        # only directories whose recorded stamps differ are visited
+        missing = [rel_path for rel_path, _old, new_entry in changes if new_entry is None]
+        extra = [rel_path for rel_path, old_entry, _new in changes if old_entry is None]
+        common = [change for change in changes if change[1] is not None and change[2] is not None]
 
-    missing = old_file_keys - new_file_keys
-    extra = new_file_keys - old_file_keys
     for rel_path in sorted(missing):
         logger.error(f'compare: missing file in new: {rel_path}')
     for rel_path in sorted(extra):
         logger.error(f'compare: extra file in new: {rel_path}')
 
-    common = old_file_keys & new_file_keys
-    for rel_path in sorted(common):
-        old_entry = old_files[rel_path]
-        new_entry = new_files[rel_path]
-        if old_entry.get('size') != new_entry.get('size'):
-            logger.error(f'compare: size mismatch: {rel_path}')
-        if old_entry.get('hash') != new_entry.get('hash'):
-            logger.error(f'compare: hash mismatch: {rel_path}')
-        else:
-            if old_entry.get('mtime') != new_entry.get('mtime'):
-                logger.warning(f'compare: mtime differs but hash same: {rel_path}')
+    for rel_path, old_entry, new_entry in sorted(common, key=lambda item: item[0]):
+        _compare_file_entries(rel_path, old_entry, new_entry, logger)
 
     old_dirs = set(old_index.get('dirs', {}).keys())
     new_dirs = set(new_index.get('dirs', {}).keys())
@@ -218,5 +269,122 @@ def compare_indexes(old_index: dict, new_index: dict, logger: Logger) -> None:
         logger.error(f'compare: placeholder mismatch old={len(old_placeholders)} new={len(new_placeholders)}')
 
 
-def index_for_validation(root: Path, config: Config, logger: Logger) -> dict:
-    return build_index(root, config.placeholder_suffix, config.hash_algorithm, logger)
+# bytes of messages a _DeferredLog keeps in memory before spilling to a temporary file
+DEFERRED_LOG_MEMORY = 1024 * 1024
+
+
+class _DeferredLog:
+    """Collects messages so they can be replayed in compare_indexes order (or dropped).
+
+    Past ``DEFERRED_LOG_MEMORY`` bytes the messages spill to a temporary
+    file, so memory stays bounded however many entries differ.
+    """
+
+    def __init__(self) -> None:
+        self._spool = tempfile.SpooledTemporaryFile(
+            max_size=DEFERRED_LOG_MEMORY, mode='w+', encoding='utf-8', newline='\n'
+        )
+
+    def _add(self, level: str, message: str) -> None:
+        self._spool.write(json.dumps([level, message], ensure_ascii=False) + '\n')
+
+    def error(self, message: str) -> None:
+        self._add('error', message)
+
+    def warning(self, message: str) -> None:
+        self._add('warning', message)
+
+    def replay(self, logger: Logger) -> None:
+        self._spool.seek(0)
+        for line in self._spool:
+            level, message = json.loads(line)
+            getattr(logger, level)(message)
+
+    def close(self) -> None:
+        self._spool.close()
+
+
+def _ascending(items: Iterator[tuple[str, dict]], path: Path) -> Iterator[tuple[str, dict]]:
+    previous = None
+    for key, value in items:
+        if previous is not None and key <= previous:
+            raise ValueError(f'index entries not in sorted order in {path}: {key}')
+        previous = key
+        yield key, value
+
+
+def _merge_sorted(old_items, new_items) -> Iterator[tuple[str, dict | None, dict | None]]:
+    """Walk two ascending ``(key, value)`` streams together, pairing equal keys."""
+    old_item = next(old_items, None)
+    new_item = next(new_items, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            yield old_item[0], old_item[1], None
+            old_item = next(old_items, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            yield new_item[0], None, new_item[1]
+            new_item = next(new_items, None)
+        else:
+            yield old_item[0], old_item[1], new_item[1]
+            old_item = next(old_items, None)
+            new_item = next(new_items, None)
+
+
+def _stream_compare(
+    old: IndexReader, new: IndexReader, missing: _DeferredLog, extra: _DeferredLog, common: _DeferredLog,
+    totals: _DeferredLog,
+) -> None:
+    files = _merge_sorted(_ascending(old.section('files'), old.path), _ascending(new.section('files'), new.path))
+    for rel_path, old_entry, new_entry in files:
+        if new_entry is None:
+            missing.error(f'compare: missing file in new: {rel_path}')
+        elif old_entry is None:
+            extra.error(f'compare: extra file in new: {rel_path}')
+        else:
+            _compare_file_entries(rel_path, old_entry, new_entry, common)
+
+    for section, label in (('dirs', 'directory'), ('placeholders', 'placeholder')):
+        counts = [0, 0]
+        differs = False
+        pairs = _merge_sorted(_ascending(old.section(section), old.path), _ascending(new.section(section), new.path))
+        for _rel_path, old_entry, new_entry in pairs:
+            counts[0] += old_entry is not None
+            counts[1] += new_entry is not None
+            differs = differs or old_entry is None or new_entry is None
+        if differs:
+            totals.error(f'compare: {label} mismatch old={counts[0]} new={counts[1]}')
+
+
+def compare_index_files(old_path: Path, new_path: Path, logger: Logger) -> None:
+    """``compare_indexes`` for two saved index files.
+
+    Indexes saved sorted (``metadata.sorted``) are diffed as a streaming
+    merge whose messages spill to temporary files, so memory stays bounded
+    whatever the index size; anything else is loaded whole. The log output
+    is the same.
+    """
+    try:
+        with IndexReader(old_path) as old, IndexReader(new_path) as new:
+            if old.is_sorted and new.is_sorted:
+                # missing, extra, common, totals: the order compare_indexes logs in
+                parts = [_DeferredLog() for _ in range(4)]
+                try:
+                    _stream_compare(old, new, *parts)
+                    logger.info(f'compare: streamed sorted indexes {old_path} and {new_path}')
+                    for part in parts:
+                        part.replay(logger)
+                finally:
+                    for part in parts:
+                        part.close()
+                return
+            logger.info('compare: index not saved in sorted order; loading both indexes')
+    except ValueError as exc:
+        logger.info(f'compare: streaming not possible ({exc}); loading both indexes')
+    compare_indexes(load_index(old_path), load_index(new_path), logger)
+
+
+def index_for_validation(root: Path, config: Config, logger: Logger, mount_archives: bool = False) -> dict:
+    return build_index(
+        root, config.placeholder_suffix, config.hash_algorithm, logger,
+        placeholder_manifests=config.placeholder_manifests, hints=config.cache_policy, mount_archives=mount_archives,
+    )
@@ -0,0 +1,152 @@
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+import zlib
+from pathlib import Path
+
+from kb_folder_manager.archive import ARCHIVE_MANIFEST_NAME, archive_tree, check_volumes, load_manifest, plan_volumes
+from kb_folder_manager.config import Config
+from kb_folder_manager.indexer import build_index
+from kb_folder_manager.operations import split_operation, validate_mutual_operation
+from kb_folder_manager.profiling import Profiler, activate
+from kb_folder_manager.utils import FatalError, Logger
+
+
+class TestArchive(unittest.TestCase):
+    def _tree(self, root: Path) -> None:
+        (root / 'a' / 'b').mkdir(parents=True)
+        (root / 'empty').mkdir()
+        (root / 'a' / 'notes.md(PH)').mkdir()
+        for i in range(6):
+            (root / 'a' / f'blob{i}.bin').write_bytes(os.urandom(1000 * (i + 1)))
+        (root / 'a' / 'b' / 'tool.exe').write_bytes(b'MZ' * 500)
+
+    def test_plan_balances_volumes_by_size(self) -> None:
+        files = {f'f{i}': {'size': size} for i, size in enumerate([900, 500, 400, 300, 200, 100])}
+        volumes = plan_volumes(files, 1000, '.zip')
+        self.assertEqual([v.name for v in volumes], ['part-0001.zip', 'part-0002.zip', 'part-0003.zip'])
+        self.assertEqual(sorted(v.bytes for v in volumes), [700, 800, 900])
+        self.assertEqual(sorted(m for v in volumes for m in v.members), sorted(files))
+        self.assertEqual(plan_volumes({}, 1000, '.zip'), [])
+
+    def test_zip_and_tar_volumes_with_manifest(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            root = tmp_path / 'res' / 'KB'
+            self._tree(root)
+            index = build_index(root, '(PH)', 'sha256')
+            for fmt, opener in (('zip', zipfile.ZipFile), ('tar.gz', tarfile.open)):
+                out = tmp_path / fmt
+                logger = Logger(tmp_path / f'{fmt}.log', also_console=False)
+                try:
+                    archive_tree(root, out, index, False, fmt, 8000, 3, logger)
+                finally:
+                    logger.close()
+                self.assertFalse(logger.result.has_blockers())
+
+                manifest = json.loads((out / ARCHIVE_MANIFEST_NAME).read_text(encoding='utf-8'))
+                self.assertEqual(manifest['metadata']['root_hash'], index['metadata']['root_hash'])
+                self.assertEqual(len(manifest['metadata']['volumes']), 3)
+                self.assertEqual(set(manifest['dirs']), {'a', 'a/b', 'empty'})
+                self.assertEqual(set(manifest['placeholders']), {'a/notes.md(PH)'})
+                for rel_path, entry in manifest['files'].items():
+                    self.assertEqual(entry['hash'], index['files'][rel_path]['hash'])
+                    with opener(out / entry['volume']) as archive:
+                        if fmt == 'zip':
+                            data = archive.read(rel_path)
+                            self.assertEqual(entry['crc32'], zlib.crc32(data))
+                        else:
+                            data = archive.extractfile(rel_path).read()
+                    self.assertEqual(data, (root / rel_path).read_bytes())
+
+
+class TestArchivedIndex(unittest.TestCase):
+    def test_mutual_validation_against_archived_res(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            source = tmp_path / 'KB'
+            (source / 'sub').mkdir(parents=True)
+            (source / 'note.md').write_text('doc', encoding='utf-8')
+            (source / 'sub' / 'video.mp4').write_bytes(os.urandom(5000))
+            (source / 'sub' / 'data.bin').write_bytes(os.urandom(3000))
+            output = tmp_path / 'out'
+            config = Config(
+                specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False,
+                archive_volume_mb=1,
+            )
+            split_operation(source, output, config, force=False, auto_yes=True, archive=True)
+            doc = output / 'doc' / 'KB'
+            archived = output / 'res_archive' / 'KB'
+
+            profiler = Profiler()
+            previous = activate(profiler)
+            try:
+                index = build_index(archived, '(PH)', 'sha256', mount_archives=True)
+            finally:
+                activate(previous)
+            self.assertEqual(profiler.counters['files_hashed'], 0)
+            res_index = build_index(output / 'res' / 'KB', '(PH)', 'sha256')
+            self.assertEqual(index.to_dict()['files'], res_index.to_dict()['files'])
+            self.assertEqual(index['metadata']['root_hash'], res_index['metadata']['root_hash'])
+            validate_mutual_operation(doc, archived, config, tmp_path / 'logs')
+
+            # a volume that no longer matches its manifest is reported from the listing alone
+            manifest = load_manifest(archived)
+            entry = manifest['files']['sub/data.bin']
+            with zipfile.ZipFile(archived / entry['volume'], 'a') as zf:
+                zf.writestr('stray.bin', b'x')
+            self.assertEqual(check_volumes(manifest, archived), [f"archive member not in manifest: {entry['volume']}: stray.bin"])
+            with self.assertRaises(FatalError):
+                validate_mutual_operation(doc, archived, config, tmp_path / 'logs2')
+
+
+    def test_archives_mounted_only_on_request(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            source = tmp_path / 'KB'
+            source.mkdir()
+            (source / 'data.bin').write_bytes(os.urandom(3000))
+            output = tmp_path / 'out'
+            config = Config(
+                specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False,
+                archive_volume_mb=1,
+            )
+            split_operation(source, output, config, force=False, auto_yes=True, archive=True)
+            archived = output / 'res_archive' / 'KB'
+
+            plain = build_index(archived, '(PH)', 'sha256')
+            self.assertIn(ARCHIVE_MANIFEST_NAME, plain['files'])
+            self.assertNotIn('archived', plain['metadata'])
+            mounted = build_index(archived, '(PH)', 'sha256', mount_archives=True)
+            self.assertEqual(list(mounted['files']), ['data.bin'])
+            self.assertEqual(mounted['metadata']['archived'], [''])
+
+            # a complete folder holding an archive is refused before anything is copied
+            with self.assertRaises(FatalError):
+                split_operation(archived, tmp_path / 'out2', config, force=False, auto_yes=True)
+            log = next((tmp_path / 'out2' / 'logs').iterdir()) / 'Split_pre_check.log'
+            self.assertIn('complete folder contains archived subtrees', log.read_text(encoding='utf-8'))
+            self.assertFalse((tmp_path / 'out2' / 'doc').exists())
+
+    def test_foreign_manifest_is_reported(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            root = tmp_path / 'res'
+            (root / 'sub').mkdir(parents=True)
+            (root / 'sub' / ARCHIVE_MANIFEST_NAME).write_text('["not", "a", "manifest"]', encoding='utf-8')
+            (root / 'sub' / 'keep.bin').write_bytes(b'x')
+            logger = Logger(tmp_path / 'index.log', also_console=False)
+            try:
+                index = build_index(root, '(PH)', 'sha256', logger, mount_archives=True)
+            finally:
+                logger.close()
+            self.assertTrue(logger.result.has_blockers())
+            self.assertIn('invalid archive manifest: sub/.kb_archive.json', (tmp_path / 'index.log').read_text(encoding='utf-8'))
+            self.assertIn('sub/keep.bin', index['files'])
+
+
+if __name__ == '__main__':
+    unittest.main()
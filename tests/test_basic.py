@@ -2,13 +2,22 @@ import os
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
 from kb_folder_manager.config import Config
+from kb_folder_manager.indexer import build_index, hash_index, load_index
 from kb_folder_manager.operations import compare_operation, merge_operation, split_operation
-from kb_folder_manager.utils import Logger
+from kb_folder_manager.utils import FatalError, Logger, copy_file_hashed
 from kb_folder_manager.validator import validate_class1
 
 
+def _conflict(root: Path, rel_dir: str, a: str, b: str) -> str:
+    # the name listed first is the one reported first
+    first, second = sorted((a, b), key=os.listdir(root / rel_dir).index)
+    lead = rel_dir + '/' if rel_dir else ''
+    return f'[FATAL] case conflict: {lead}{first} vs {lead}{second}'
+
+
 class TestSplitMerge(unittest.TestCase):
     def test_split_merge_roundtrip(self) -> None:
         with tempfile.TemporaryDirectory() as tmp:
@@ -60,6 +69,161 @@ class TestSplitMerge(unittest.TestCase):
                 logger.close()
             self.assertGreater(logger.result.fatals, 0)
 
+    def test_class1_case_conflicts_per_directory(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            complete = root / 'Complete'
+            for rel_dir in ['Docs/sub', 'docs/sub', 'x/aσ', 'x/aς', 'y/caf\u00e9', 'y/cafe\u0301']:
+                (complete / rel_dir).mkdir(parents=True)
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+            for nfc in (False, True):
+                config.case_conflict_nfc = nfc
+                log_path = root / f'log{nfc}.txt'
+                logger = Logger(log_path, also_console=False)
+                try:
+                    validate_class1(complete, config, allow_placeholders=False, logger=logger)
+                finally:
+                    logger.close()
+                conflicts = sorted(
+                    line for line in log_path.read_text(encoding='utf-8').splitlines() if 'case conflict' in line
+                )
+                # children of the conflicting dirs are not reported again; final sigma folds like Windows compares it
+                expected = [_conflict(complete, '', 'Docs', 'docs'), _conflict(complete, 'x', 'aσ', 'aς')]
+                if nfc:
+                    expected.append(_conflict(complete, 'y', 'caf\u00e9', 'cafe\u0301'))
+                self.assertEqual(conflicts, sorted(expected))
+
+
+class TestStagedPrecheck(unittest.TestCase):
+    def _complete(self, root: Path) -> Path:
+        complete = root / 'Complete'
+        (complete / 'nested').mkdir(parents=True)
+        (complete / 'nested' / 'a.md').write_text('hello', encoding='utf-8')
+        (complete / 'nested' / 'b.bin').write_bytes(b'\x00\x01')
+        return complete
+
+    def test_hash_index_matches_hashed_build(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            complete = self._complete(Path(tmp))
+            hashed = build_index(complete, '(PH)', 'sha256')
+            index = build_index(complete, '(PH)', 'sha256', hash_files=False)
+            self.assertTrue(hash_index(index, complete, 'sha256'))
+            self.assertEqual(index.to_dict()['files'], hashed.to_dict()['files'])
+            self.assertEqual(index.metadata['root_hash'], hashed.metadata['root_hash'])
+
+    def test_hash_index_in_processes_matches_serial(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            complete = self._complete(Path(tmp))
+            for i in range(5):
+                (complete / f'f{i}.txt').write_text(str(i) * (i + 1), encoding='utf-8')
+            serial = build_index(complete, '(PH)', 'sha256', hash_files=False)
+            self.assertTrue(hash_index(serial, complete, 'sha256'))
+            index = build_index(complete, '(PH)', 'sha256', hash_files=False)
+            with mock.patch('kb_folder_manager.indexer.HASH_BATCH_FILES', 2):
+                self.assertTrue(hash_index(index, complete, 'sha256', processes=2))
+            self.assertEqual(index.to_dict(), serial.to_dict())
+
+    def test_bad_name_rejected_before_hashing(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            complete = self._complete(root)
+            (complete / 'stray(PH)').mkdir()
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+            with mock.patch('kb_folder_manager.indexer.hash_file', side_effect=AssertionError('hashed')) as hashed:
+                with self.assertRaises(FatalError):
+                    split_operation(complete, root / 'out', config, force=False, auto_yes=True)
+            hashed.assert_not_called()
+            self.assertFalse((root / 'out' / 'index' / 'complete' / '.kb_index.json').exists())
+
+    def test_overlapped_hashing(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            complete = self._complete(root)
+            config = Config(
+                specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False,
+                overlap_hashing=True,
+            )
+            split_operation(complete, root / 'out', config, force=False, auto_yes=True)
+            saved = load_index(root / 'out' / 'index' / 'complete' / '.kb_index.json')
+            self.assertEqual(saved['metadata']['root_hash'], build_index(complete, '(PH)', 'sha256').metadata['root_hash'])
+            self.assertTrue(all(entry.get('hash') for entry in saved['files'].values()))
+
+
+class TestMergeIndexReuse(unittest.TestCase):
+    def _split(self, root: Path, config: Config) -> Path:
+        complete = root / 'Complete'
+        (complete / 'nested').mkdir(parents=True)
+        for i in range(6):
+            (complete / 'nested' / f'n{i}.md').write_text(f'note {i}', encoding='utf-8')
+            (complete / f'blob{i}.bin').write_bytes(bytes([i]) * 100)
+        split_operation(complete, root / 'out1', config, force=False, auto_yes=True)
+        return root / 'out1'
+
+    def _merge_pre_check_log(self, out: Path) -> str:
+        (log,) = (out / 'logs').glob('*/Merge_pre_check.log')
+        return log.read_text(encoding='utf-8')
+
+    def test_split_indexes_reused_and_edits_rehashed(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+            out1 = self._split(root, config)
+            doc = out1 / 'doc' / 'Complete'
+            (doc / 'nested' / 'n0.md').write_text('edited after split', encoding='utf-8')
+
+            merge_operation(doc, out1 / 'res' / 'Complete', root / 'out2', config, force=False, auto_yes=True)
+
+            text = self._merge_pre_check_log(root / 'out2')
+            self.assertIn('reused prior hashes', text)
+            self.assertIn('files=5/6', text)
+            merged = root / 'out2' / 'complete' / 'Complete'
+            self.assertEqual((merged / 'nested' / 'n0.md').read_text(encoding='utf-8'), 'edited after split')
+            saved = load_index(root / 'out2' / 'index' / 'complete' / '.kb_index.json')
+            self.assertEqual(saved['metadata']['root_hash'], build_index(merged, '(PH)', 'sha256').metadata['root_hash'])
+
+    def test_stale_prior_index_is_not_trusted(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+            out1 = self._split(root, config)
+            res = out1 / 'res' / 'Complete'
+            target = res / 'blob3.bin'
+            st = target.stat()
+            target.write_bytes(b'x' * 100)  # same size, mtime restored below
+            os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+            merge_operation(out1 / 'doc' / 'Complete', res, root / 'out2', config, force=False, auto_yes=True)
+
+            self.assertIn('prior index is stale', self._merge_pre_check_log(root / 'out2'))
+            saved = load_index(root / 'out2' / 'index' / 'merge_check_res' / '.kb_index.json')
+            self.assertEqual(saved['files']['blob3.bin']['hash'], build_index(res, '(PH)', 'sha256')['files']['blob3.bin']['hash'])
+
+
+    def test_bad_writes_are_caught(self) -> None:
+        def bad_copy(src, dst, algorithm, **kwargs):
+            digest = copy_file_hashed(src, dst, algorithm, **kwargs)
+            if Path(dst).name == 'blob2.bin':
+                Path(dst).write_bytes(b'\xff' * 100)  # corrupted, same size
+            elif Path(dst).name == 'blob4.bin':
+                Path(dst).write_bytes(b'\x04' * 10)  # short
+            return digest
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+            out1 = self._split(root, config)
+            with mock.patch('kb_folder_manager.operations.copy_file_hashed', side_effect=bad_copy):
+                with mock.patch('kb_folder_manager.operations.MERGE_VERIFY_SAMPLE_FILES', 1000):
+                    with self.assertRaises(FatalError):
+                        merge_operation(
+                            out1 / 'doc' / 'Complete', out1 / 'res' / 'Complete', root / 'out2', config,
+                            force=False, auto_yes=True,
+                        )
+            (log,) = (root / 'out2' / 'logs').glob('*/Merge.log')
+            text = log.read_text(encoding='utf-8')
+            self.assertIn('short copy during merge: blob4.bin', text)
+            self.assertIn('merged file differs from the copied bytes: blob2.bin', text)
+
 
 if __name__ == '__main__':
     unittest.main()
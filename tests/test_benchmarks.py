@@ -0,0 +1,571 @@
+"""Microbenchmarks for hot per-file paths.
+
+The timed benchmarks build large fixtures and only run with
+``KB_BENCHMARKS=1`` set; they print their timings and assert nothing about
+them. What the default suite checks instead is deterministic: the I/O and
+call counts each optimisation is about, on small fixtures.
+"""
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from kb_folder_manager.config import Config
+from kb_folder_manager.profiling import Profiler, activate
+from kb_folder_manager import utils, validator
+from kb_folder_manager.index_model import CompactIndex
+from kb_folder_manager.tree import record_tree_hashes
+from kb_folder_manager.utils import (
+    CacheHints,
+    Logger,
+    PathContext,
+    copy_file,
+    copy_file_hashed,
+    derive_placeholder_original,
+    dir_is_empty,
+    empty_dir_probe,
+    file_mtime,
+    file_size,
+    filesystem_type,
+    hash_file,
+    iter_walk,
+    stat_file,
+    strip_extended_prefix,
+    to_extended_path,
+)
+from kb_folder_manager.validator import compare_indexes, validate_mutual
+
+BENCH_FILES = 2000
+MUTUAL_ENTRIES = 200_000
+FLAT_DIR_ENTRIES = 100_000
+COMPARE_FILES = 200_000
+PROBE_DIRS = 20_000
+TMPFS = Path('/dev/shm')
+STREAM_MB = 64
+PLACEHOLDER_SUFFIX = '(在百度网盘)'
+COUNT_FILES = 50
+
+benchmark = unittest.skipUnless(os.environ.get('KB_BENCHMARKS'), 'set KB_BENCHMARKS=1 to run the timed benchmarks')
+
+
+def _counters(fn) -> dict[str, int]:
+    """The profiling I/O counters ``fn()`` bumps."""
+    profiler = Profiler()
+    previous = activate(profiler)
+    try:
+        fn()
+    finally:
+        activate(previous)
+    return {name: n for name, n in profiler.counters.items() if n}
+
+
+def _best_of(fn, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# The functions below are the pre-optimisation code, copied verbatim, so the
+# benchmarks time the real old code path rather than a part of it.
+
+def _baseline_placeholder_original_path(rel_path: str, placeholder_suffix: str) -> str:
+    p = Path(rel_path)
+    name = p.name
+    original = derive_placeholder_original(name, placeholder_suffix)
+    return (p.parent / original).as_posix() if p.parent != Path('.') else original
+
+
+def _baseline_validate_mutual(doc_index: dict, res_index: dict, config: Config, logger: Logger) -> None:
+    doc_files = set(doc_index.get('files', {}).keys())
+    res_files = set(res_index.get('files', {}).keys())
+
+    doc_placeholders = set(doc_index.get('placeholders', {}).keys())
+    res_placeholders = set(res_index.get('placeholders', {}).keys())
+
+    doc_placeholder_originals = {
+        _baseline_placeholder_original_path(p, config.placeholder_suffix) for p in doc_placeholders
+    }
+    res_placeholder_originals = {
+        _baseline_placeholder_original_path(p, config.placeholder_suffix) for p in res_placeholders
+    }
+
+    conflicts = doc_files & res_files
+    for rel_path in sorted(conflicts):
+        logger.error(f'conflict: file exists in both doc and res: {rel_path}')
+
+    both_placeholder = doc_placeholder_originals & res_placeholder_originals
+    for rel_path in sorted(both_placeholder):
+        logger.error(f'missing file: placeholder on both sides for {rel_path}')
+
+    for rel_path in sorted(doc_files):
+        if rel_path not in res_placeholder_originals:
+            logger.error(f'doc file missing placeholder in res: {rel_path}')
+
+    for rel_path in sorted(res_files):
+        if rel_path not in doc_placeholder_originals:
+            logger.error(f'res file missing placeholder in doc: {rel_path}')
+
+    for rel_path in sorted(doc_placeholder_originals):
+        if rel_path not in res_files:
+            logger.error(f'doc placeholder has no file in res: {rel_path}')
+
+    for rel_path in sorted(res_placeholder_originals):
+        if rel_path not in doc_files:
+            logger.error(f'res placeholder has no file in doc: {rel_path}')
+
+    logical_doc = doc_files | doc_placeholder_originals
+    logical_res = res_files | res_placeholder_originals
+    if logical_doc != logical_res:
+        missing_in_res = logical_doc - logical_res
+        missing_in_doc = logical_res - logical_doc
+        if missing_in_res:
+            logger.error(f'logical files missing in res: {len(missing_in_res)}')
+        if missing_in_doc:
+            logger.error(f'logical files missing in doc: {len(missing_in_doc)}')
+
+    doc_dirs = set(doc_index.get('dirs', {}).keys())
+    res_dirs = set(res_index.get('dirs', {}).keys())
+    if doc_dirs != res_dirs:
+        logger.error(f'directory structure mismatch: doc={len(doc_dirs)} res={len(res_dirs)}')
+
+
+def _baseline_iter_walk(root: Path, placeholder_suffix: str):
+    root_ext = to_extended_path(root)
+    for current, dirs, files in os.walk(root_ext):
+        current_norm = Path(strip_extended_prefix(current))
+        rel_root = current_norm.relative_to(root)
+
+        placeholder_dirs = [d for d in dirs if d.endswith(placeholder_suffix)]
+        for d in placeholder_dirs:
+            dirs.remove(d)
+        yield rel_root, current_norm, dirs, files, placeholder_dirs
+
+
+def _per_call_paths(root: Path, rel_paths: list[str]) -> None:
+    # what build_index used to do: size, mtime and the hash open each resolve the path
+    for rel_path in rel_paths:
+        path = root / rel_path
+        file_size(path)
+        file_mtime(path)
+        utils.to_extended_path(path)
+
+
+def _context_paths(root: Path, rel_paths: list[str]) -> None:
+    ctx = PathContext(root)
+    for rel_path in rel_paths:
+        stat_file(ctx.path(rel_path))
+
+
+class TestPathContextBenchmark(unittest.TestCase):
+    def _tree(self, tmp: str, count: int) -> tuple[Path, list[str]]:
+        root = Path(tmp) / 'KB'
+        (root / 'sub').mkdir(parents=True)
+        rel_paths = [f'sub/f{i}.txt' for i in range(count)]
+        for rel_path in rel_paths:
+            (root / rel_path).write_bytes(b'x')
+        return root, rel_paths
+
+    def test_root_resolved_once(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root, rel_paths = self._tree(tmp, COUNT_FILES)
+            self.assertEqual(PathContext(root).path(rel_paths[0]), to_extended_path(root / rel_paths[0]))
+            counts = {}
+            for name, fn in (('per call', _per_call_paths), ('context', _context_paths)):
+                with mock.patch.object(utils, 'to_extended_path', wraps=utils.to_extended_path) as resolve:
+                    stats = _counters(lambda: fn(root, rel_paths))['stat_calls']
+                counts[name] = (resolve.call_count, stats)
+        # the context resolves the root once and gets size and mtime from a single stat
+        self.assertEqual(counts['per call'], (3 * COUNT_FILES, 2 * COUNT_FILES))
+        self.assertEqual(counts['context'], (1, COUNT_FILES))
+
+    @benchmark
+    def test_per_file_overhead(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root, rel_paths = self._tree(tmp, BENCH_FILES)
+            old = _best_of(lambda: _per_call_paths(root, rel_paths))
+            new = _best_of(lambda: _context_paths(root, rel_paths))
+        print(
+            f'\n[BENCH] per-file path overhead: per-call resolve={old / BENCH_FILES * 1e6:.1f}us '
+            f'path context={new / BENCH_FILES * 1e6:.1f}us ({old / new:.1f}x)'
+        )
+
+    def test_join_handles_filesystem_root(self) -> None:
+        ctx = PathContext(Path(os.sep))
+        self.assertEqual(ctx.path('a/b'), to_extended_path(Path(os.sep) / 'a' / 'b'))
+        self.assertEqual(PathContext.join(ctx.base, 'a'), to_extended_path(Path(os.sep) / 'a'))
+
+
+def _mutual_indexes(entries: int) -> tuple[dict, dict]:
+    doc = {'files': {}, 'dirs': {}, 'placeholders': {}}
+    res = {'files': {}, 'dirs': {}, 'placeholders': {}}
+    for i in range(entries // 2):
+        rel_path = f'd{i % 100}/f{i}.md'
+        doc['files'][rel_path] = {}
+        res['placeholders'][rel_path + '(PH)'] = {}
+    return doc, res
+
+
+class TestMutualValidationBenchmark(unittest.TestCase):
+    config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+
+    def test_same_messages_as_baseline(self) -> None:
+        doc, res = _mutual_indexes(2 * COUNT_FILES)
+        doc['files']['x/only.md'] = {}
+        res['files']['d1/f1.md'] = {}
+        res['placeholders']['y/gone.md(PH)'] = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            logs = []
+            for name, validate in (('Mutual', validate_mutual), ('Baseline', _baseline_validate_mutual)):
+                logger = Logger(Path(tmp) / f'{name}.log', also_console=False)
+                try:
+                    validate(doc, res, self.config, logger)
+                finally:
+                    logger.close()
+                logs.append((Path(tmp) / f'{name}.log').read_text(encoding='utf-8'))
+        self.assertEqual(logs[0], logs[1])
+        self.assertIn('conflict: file exists in both doc and res: d1/f1.md', logs[0])
+
+    @benchmark
+    def test_mutual_validation(self) -> None:
+        doc, res = _mutual_indexes(MUTUAL_ENTRIES)
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(Path(tmp) / 'Mutual.log', also_console=False)
+            baseline_logger = Logger(Path(tmp) / 'Baseline.log', also_console=False)
+            try:
+                new = _best_of(lambda: validate_mutual(doc, res, self.config, logger), repeat=1)
+                old = _best_of(lambda: _baseline_validate_mutual(doc, res, self.config, baseline_logger), repeat=1)
+            finally:
+                logger.close()
+                baseline_logger.close()
+            self.assertEqual(logger.result.errors, 0)
+            self.assertEqual(baseline_logger.result.errors, 0)
+        print(f'\n[BENCH] mutual validation of {MUTUAL_ENTRIES} entries: {new:.2f}s (baseline {old:.2f}s, {old / new:.1f}x)')
+
+
+class TestFlatPlaceholderDirBenchmark(unittest.TestCase):
+    def _flat(self, tmp: str, entries: int) -> Path:
+        root = Path(tmp) / 'res'
+        flat = root / 'flat'
+        flat.mkdir(parents=True)
+        for i in range(entries):
+            os.mkdir(flat / (f'clip{i:06d}.mp4' + ('' if i % 100 == 0 else PLACEHOLDER_SUFFIX)))
+        return root
+
+    @staticmethod
+    def _walk(walker, root: Path) -> list:
+        return [(entry[0], list(entry[2]), entry[4]) for entry in walker(root, PLACEHOLDER_SUFFIX)]
+
+    def test_placeholder_dirs_split_off_and_never_walked(self) -> None:
+        entries = 1000
+        with tempfile.TemporaryDirectory() as tmp:
+            root = self._flat(tmp, entries)
+            seen = []
+            counters = _counters(lambda: seen.extend(self._walk(iter_walk, root)))
+            flat_entry = next(entry for entry in seen if entry[0] == Path('flat'))
+            self.assertEqual(len(flat_entry[1]), entries // 100)
+            self.assertEqual(len(flat_entry[2]), entries - entries // 100)
+            self.assertEqual(sorted(self._walk(_baseline_iter_walk, root)), sorted(seen))
+        # the root, the flat dir and its ordinary subdirectories; no placeholder dir is listed
+        self.assertEqual(counters['dirs_walked'], 2 + entries // 100)
+
+    @benchmark
+    def test_walk_huge_placeholder_dir(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = self._flat(tmp, FLAT_DIR_ENTRIES)
+            new = _best_of(lambda: self._walk(iter_walk, root), repeat=1)
+            old = _best_of(lambda: self._walk(_baseline_iter_walk, root), repeat=1)
+        print(f'\n[BENCH] walk of a {FLAT_DIR_ENTRIES}-entry placeholder dir: {new:.2f}s (baseline {old:.2f}s)')
+
+
+def _compare_snapshots(record: bool, files: int = COMPARE_FILES) -> tuple[CompactIndex, CompactIndex]:
+    pair = []
+    for changed in (False, True):
+        index = CompactIndex()
+        for i in range(20):
+            index.add_dir(f'd{i}')
+        for i in range(files):
+            dir_id = index.add_dir(f'd{i % 2000 // 100}/e{i % 100}')
+            digest = f'{i + changed * (i == files // 2):064x}'
+            index.add_file(dir_id, f'f{i}.md', i, 1.0, digest, 'sha256')
+        if record:
+            record_tree_hashes(index)
+        pair.append(index)
+    return pair[0], pair[1]
+
+
+class TestCompareBenchmark(unittest.TestCase):
+    def test_recorded_stamps_prune_compared_files(self) -> None:
+        files = 2000
+        # the same snapshots without recorded stamps take the flat diff, the code compare used before
+        cases = {}
+        for record in (True, False):
+            pair = _compare_snapshots(record, files)
+            cases[record] = (pair, tuple(index.to_dict() for index in pair))
+        with tempfile.TemporaryDirectory() as tmp:
+            for record, variants in cases.items():
+                for old_index, new_index in variants:
+                    logger = Logger(Path(tmp) / 'Compare.log', also_console=False)
+                    try:
+                        with mock.patch.object(
+                            validator, '_compare_file_entries', wraps=validator._compare_file_entries
+                        ) as compared:
+                            compare_indexes(old_index, new_index, logger)
+                    finally:
+                        logger.close()
+                    self.assertEqual(logger.result.errors, 1)
+                    # only the changed file's directory is visited when stamps are recorded
+                    self.assertEqual(compared.call_count, 1 if record else files, (record, type(old_index)))
+
+    @benchmark
+    def test_compare_one_change(self) -> None:
+        recorded = _compare_snapshots(record=True)
+        unrecorded = _compare_snapshots(record=False)
+        saved = tuple(index.to_dict() for index in recorded)
+        stripped = tuple(index.to_dict() for index in unrecorded)
+        with tempfile.TemporaryDirectory() as tmp:
+            timings = {}
+            for name, (old_index, new_index) in (
+                ('compact', recorded), ('compact baseline', unrecorded), ('dict', saved), ('dict baseline', stripped)
+            ):
+                logger = Logger(Path(tmp) / f'{name}.log', also_console=False)
+                try:
+                    timings[name] = _best_of(lambda: compare_indexes(old_index, new_index, logger), repeat=1)
+                finally:
+                    logger.close()
+                self.assertEqual(logger.result.errors, 1, name)
+        print(
+            f'\n[BENCH] compare {COMPARE_FILES} files with one change: '
+            + ' '.join(f'{name}={seconds:.3f}s' for name, seconds in timings.items())
+        )
+
+
+def _on_tmpfs() -> bool:
+    return TMPFS.is_dir() and os.access(TMPFS, os.W_OK) and filesystem_type(os.stat(TMPFS).st_dev) == 'tmpfs'
+
+
+class TestPlaceholderProbeBenchmark(unittest.TestCase):
+    def test_probe_agrees_with_scandir(self) -> None:
+        bases = [None] + ([TMPFS] if _on_tmpfs() else [])
+        for base in bases:
+            with tempfile.TemporaryDirectory(dir=base) as tmp:
+                root = Path(tmp)
+                for name in ('empty', 'file', 'sub', 'emptied'):
+                    (root / name).mkdir()
+                (root / 'file' / 'x').write_bytes(b'')
+                (root / 'sub' / 'd').mkdir()
+                (root / 'emptied' / 'x').write_bytes(b'')
+                (root / 'emptied' / 'x').unlink()
+                for name in ('empty', 'file', 'sub', 'emptied'):
+                    for probe in (True, False):
+                        self.assertEqual(
+                            dir_is_empty(root / name, probe=probe), not os.listdir(root / name), (base, name, probe)
+                        )
+
+    @staticmethod
+    def _placeholders(tmp: str, count: int) -> list[str]:
+        paths = [os.path.join(tmp, f'clip{i}.mp4(PH)') for i in range(count)]
+        for path in paths:
+            os.mkdir(path)
+        return paths
+
+    @staticmethod
+    def _io_counts(fn) -> tuple[int, int, dict[str, int]]:
+        """``os.stat`` and ``os.scandir`` calls made by ``fn()``, plus its profiling counters."""
+        with mock.patch.object(utils.os, 'stat', wraps=os.stat) as stat:
+            with mock.patch.object(utils.os, 'scandir', wraps=os.scandir) as scandir:
+                counters = _counters(fn)
+        return stat.call_count, scandir.call_count, counters
+
+    def test_filesystem_resolved_per_parent(self) -> None:
+        bases = [None] + ([TMPFS] if _on_tmpfs() else [])
+        for base in bases:
+            with tempfile.TemporaryDirectory(dir=base) as tmp:
+                paths = self._placeholders(tmp, COUNT_FILES)
+                probe = empty_dir_probe(tmp)
+
+                def per_parent() -> None:
+                    self.assertTrue(all(dir_is_empty(path, probe=probe) for path in paths))
+
+                stats, scans, counters = self._io_counts(per_parent)
+            if probe:
+                # one stat per placeholder answers it; the directory is never read
+                self.assertEqual((stats, scans), (COUNT_FILES, 0), base)
+                self.assertEqual(counters.get('empty_dir_probes'), COUNT_FILES, base)
+            else:
+                # a stat could not answer, so none is made before reading the directory
+                self.assertEqual((stats, scans), (0, COUNT_FILES), base)
+                self.assertEqual(counters.get('empty_dir_scans'), COUNT_FILES, base)
+
+    def test_held_stat_is_reused(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            (path,) = self._placeholders(tmp, 1)
+            st = os.stat(path)
+            stats, _, _ = self._io_counts(lambda: dir_is_empty(path, st=st))
+        self.assertEqual(stats, 0)
+
+    @benchmark
+    @unittest.skipUnless(_on_tmpfs(), 'needs a writable tmpfs at /dev/shm')
+    def test_probe_vs_scandir(self) -> None:
+        with tempfile.TemporaryDirectory(dir=TMPFS) as tmp:
+            paths = self._placeholders(tmp, PROBE_DIRS)
+
+            def scan_each() -> None:
+                # what the class1 placeholder check used to do
+                for path in paths:
+                    with os.scandir(path) as it:
+                        any(True for _ in it)
+
+            def probe_each() -> None:
+                for path in paths:
+                    dir_is_empty(path)
+
+            old = _best_of(scan_each)
+            new = _best_of(probe_each)
+        print(
+            f'\n[BENCH] emptiness of {PROBE_DIRS} placeholder dirs on tmpfs: scandir={old:.3f}s '
+            f'stat probe={new:.3f}s ({old / new:.1f}x)'
+        )
+
+    @benchmark
+    def test_stat_first_vs_per_parent(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = self._placeholders(tmp, PROBE_DIRS)
+
+            def stat_first() -> None:
+                # what the class1 check did per placeholder before the filesystem was resolved per parent
+                for path in paths:
+                    dir_is_empty(path)
+
+            def per_parent() -> None:
+                probe = empty_dir_probe(tmp)
+                for path in paths:
+                    dir_is_empty(path, probe=probe)
+
+            old = _best_of(stat_first)
+            new = _best_of(per_parent)
+        print(
+            f'\n[BENCH] emptiness of {PROBE_DIRS} placeholder dirs on '
+            f'{filesystem_type(os.stat(tempfile.gettempdir()).st_dev)}: stat first={old:.3f}s '
+            f'filesystem per parent={new:.3f}s ({old / new:.2f}x)'
+        )
+
+
+def _resident_fraction(path: Path) -> float | None:
+    """Share of ``path``'s pages in the page cache, from ``mincore``; None where that is unavailable."""
+    import ctypes
+    import mmap
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        mincore = libc.mincore
+    except (OSError, AttributeError):
+        return None
+    size = os.path.getsize(path)
+    pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_COPY) as mm:
+        addr = ctypes.addressof(ctypes.c_char.from_buffer(mm))
+        vec = (ctypes.c_ubyte * pages)()
+        ok = mincore(ctypes.c_void_p(addr), ctypes.c_size_t(size), vec) == 0
+        del addr
+    return sum(b & 1 for b in vec) / pages if ok else None
+
+
+def _evict(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def _page_cached_tmp() -> bool:
+    # on tmpfs the page cache is the storage, so nothing can be dropped
+    return hasattr(os, 'posix_fadvise') and filesystem_type(os.stat(tempfile.gettempdir()).st_dev) not in ('tmpfs', None)
+
+
+class TestCacheHintsBenchmark(unittest.TestCase):
+    def test_digests_agree_across_modes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / 'src.bin'
+            data = os.urandom(3 * 1024 * 1024 + 123)
+            src.write_bytes(data)
+            expected = hashlib.sha256(data).hexdigest()
+            for mode, direct in (('none', 0), ('sequential', 0), ('dontneed', 0), ('dontneed', 1), ('none', 1)):
+                hints = CacheHints(mode, direct)
+                self.assertEqual(hash_file(src, 'sha256', hints), expected, (mode, direct))
+                dst = Path(tmp) / f'{mode}{direct}' / 'copy.bin'
+                self.assertEqual(copy_file_hashed(src, dst, 'sha256', hints=hints), expected, (mode, direct))
+                copy_file(src, dst.with_name('plain.bin'), hints=hints)
+                self.assertEqual(dst.read_bytes(), data)
+                self.assertEqual(dst.with_name('plain.bin').read_bytes(), data)
+                self.assertEqual(os.stat(dst).st_mtime_ns, os.stat(src).st_mtime_ns)
+        with self.assertRaises(ValueError):
+            CacheHints('bogus')
+
+    @unittest.skipUnless(hasattr(os, 'posix_fadvise'), 'needs posix_fadvise')
+    def test_advice_per_mode(self) -> None:
+        window = utils._DROP_WINDOW
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / 'src.bin'
+            with open(src, 'wb') as f:
+                f.truncate(2 * window + 123)
+            for mode in ('none', 'sequential', 'dontneed'):
+                with mock.patch.object(utils.os, 'posix_fadvise') as advise:
+                    hash_file(src, 'sha256', CacheHints(mode))
+                advice = [call.args[3] for call in advise.call_args_list]
+                drops = [call.args[1:3] for call in advise.call_args_list if call.args[3] == os.POSIX_FADV_DONTNEED]
+                if mode == 'none':
+                    self.assertEqual(advice, [])
+                    continue
+                self.assertEqual(advice[0], os.POSIX_FADV_SEQUENTIAL, mode)
+                if mode == 'sequential':
+                    self.assertEqual(advice, [os.POSIX_FADV_SEQUENTIAL])
+                    continue
+                # one drop per window behind the cursor, then the tail to EOF
+                self.assertEqual(drops, [(0, window), (window, window), (2 * window, 0)])
+
+                with mock.patch.object(utils.os, 'posix_fadvise') as advise:
+                    copy_file(src, Path(tmp) / 'copy.bin', hints=CacheHints(mode))
+                dropped_fds = {call.args[0] for call in advise.call_args_list if call.args[3] == os.POSIX_FADV_DONTNEED}
+                self.assertEqual(len(dropped_fds), 2, 'both the source and the copy are dropped')
+
+    @benchmark
+    @unittest.skipUnless(_page_cached_tmp(), 'needs posix_fadvise and a disk-backed temp dir')
+    def test_streamed_bytes_leave_cache(self) -> None:
+        # this measures residency only: whether another workload's hit rate improves
+        # depends on memory pressure, which a unit test cannot set up
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / 'big.bin'
+            with open(src, 'wb') as f:
+                for _ in range(STREAM_MB):
+                    f.write(os.urandom(1024 * 1024))
+            if _resident_fraction(src) is None:
+                self.skipTest('mincore is not available')
+            results = {}
+            for mode in ('none', 'dontneed'):
+                _evict(src)
+                hints = CacheHints(mode)
+                start = time.perf_counter()
+                hash_file(src, 'sha256', hints)
+                seconds = time.perf_counter() - start
+                dst = Path(tmp) / f'copy-{mode}.bin'
+                copy_file(src, dst, hints=hints)
+                results[mode] = (_resident_fraction(src), _resident_fraction(dst), seconds)
+        print(
+            f'\n[BENCH] share of pages still resident after streaming {STREAM_MB}MiB: '
+            + ' '.join(
+                f'{mode}: src={src_res:.0%} dst={dst_res:.0%} hash={seconds:.2f}s'
+                for mode, (src_res, dst_res, seconds) in results.items()
+            )
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from kb_folder_manager.classify import TypeClassifier, classify_index, classify_placeholders, specified_files
+from kb_folder_manager.indexer import build_index
+from kb_folder_manager.utils import file_suffix, is_specified_type
+
+TRICKY_NAMES = [
+    'a.md', 'A.MD', 'notes.Md', 'archive.tar.gz', 'x.PDF', '.md', '.bashrc', 'a.', 'a..', '...', 'noext',
+    'a.b.', '.a.md', 'İSTANBUL.MD', 'ǅ.Md', 'ﬁle.PDF', 'trailing .md', 'dots...md', 'é.MD',
+]
+
+
+class TestClassify(unittest.TestCase):
+    def test_suffix_matches_path_semantics(self) -> None:
+        for name in TRICKY_NAMES:
+            self.assertEqual(file_suffix(name), Path(name.lower()).suffix, name)
+
+    def test_batch_matches_per_file_check(self) -> None:
+        types = {'.md', '.pdf', '.gz'}
+        expected = [int(is_specified_type(name, types)) for name in TRICKY_NAMES]
+        classifier = TypeClassifier(types)
+        self.assertEqual(list(classifier.classify(TRICKY_NAMES)), expected)
+        self.assertEqual([int(classifier.is_specified(n)) for n in TRICKY_NAMES], expected)
+
+    def test_index_flags_are_cached_and_reset_on_mutation(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp) / 'KB'
+            (root / 'sub' / 'clip.mp4(PH)').mkdir(parents=True)
+            (root / 'a.MD').write_text('a', encoding='utf-8')
+            (root / 'sub' / 'b.bin').write_bytes(b'b')
+            index = build_index(root, '(PH)', 'sha256')
+
+            flags = classify_index(index, {'.md'})
+            self.assertIs(classify_index(index, ['.md']), flags)
+            self.assertEqual(list(flags), list(classify_index(index.to_dict(), {'.md'})))
+            self.assertEqual(specified_files(index, {'.md'}), ['a.MD'])
+            self.assertEqual(list(classify_placeholders(index, {'.mp4'}, '(PH)')), [1])
+
+            index.add_file(0, 'c.md', 1, 0.0, None, None)
+            self.assertEqual(sorted(specified_files(index, {'.md'})), ['a.MD', 'c.md'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from kb_folder_manager.archive import archive_tree
+from kb_folder_manager.config import Config
+from kb_folder_manager.dedup import PARTIAL_CHUNK, collect_index, collect_root, find_duplicates
+from kb_folder_manager.indexer import build_index
+from kb_folder_manager.operations import dedup_operation
+from kb_folder_manager.profiling import Profiler, activate
+from kb_folder_manager.utils import PLACEHOLDER_MANIFEST_NAME, Logger
+
+
+class TestDedup(unittest.TestCase):
+    def _tree(self, root: Path) -> None:
+        (root / 'a').mkdir(parents=True)
+        (root / 'b').mkdir()
+        big = os.urandom(3 * PARTIAL_CHUNK)
+        (root / 'a' / 'video.bin').write_bytes(big)
+        (root / 'b' / 'video copy.bin').write_bytes(big)
+        # same size and same head/tail as the videos but a different middle
+        (root / 'b' / 'near.bin').write_bytes(big[:PARTIAL_CHUNK] + b'\x00' * PARTIAL_CHUNK + big[-PARTIAL_CHUNK:])
+        (root / 'a' / 'unique.bin').write_bytes(b'only one of these')
+
+    def test_groups_by_size_partial_and_full_hash(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp) / 'KB'
+            self._tree(root)
+            profiler = Profiler()
+            previous = activate(profiler)
+            try:
+                groups = find_duplicates(collect_root(root, '(PH)'), 'sha256')
+            finally:
+                activate(previous)
+            self.assertEqual(len(groups), 1)
+            self.assertEqual([e.rel_path for e in groups[0].entries], ['a/video.bin', 'b/video copy.bin'])
+            self.assertEqual(groups[0].wasted_bytes, 3 * PARTIAL_CHUNK)
+            # the unique-sized file is never opened; the near-duplicate is rejected by its full hash
+            self.assertEqual(profiler.counters['files_hashed'], 3)
+
+    def test_small_files_and_recorded_hashes_read_once(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp) / 'KB'
+            root.mkdir()
+            (root / 'a.txt').write_bytes(b'x' * 100)
+            (root / 'b.txt').write_bytes(b'x' * 100)
+            other = Path(tmp) / 'Other'
+            other.mkdir()
+            (other / 'c.txt').write_bytes(b'x' * 100)
+            index = build_index(other, '(PH)', 'sha256')
+            profiler = Profiler()
+            previous = activate(profiler)
+            try:
+                groups = find_duplicates(collect_index(index, 'other') + collect_root(root, '(PH)'), 'sha256')
+            finally:
+                activate(previous)
+            self.assertEqual(len(groups[0].entries), 3)
+            # each small file on disk is read once; the indexed one is not read at all
+            self.assertEqual(profiler.counters['files_hashed'], 2)
+            self.assertEqual(profiler.counters['bytes_read'], 200)
+
+    def test_across_roots_and_indexes_with_hardlink(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            res = tmp_path / 'res' / 'KB'
+            self._tree(res)
+            other = tmp_path / 'Other'
+            other.mkdir()
+            (other / 'again.bin').write_bytes((res / 'a' / 'video.bin').read_bytes())
+            index = build_index(other, '(PH)', 'sha256')
+            self.assertEqual(len(find_duplicates(collect_index(index, 'other') + collect_root(res, '(PH)'), 'sha256')[0].entries), 3)
+
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+            report = tmp_path / 'dedup.json'
+            dedup_operation([other], [res], [], config, tmp_path / 'logs', report_path=report, hardlink=True)
+
+            data = json.loads(report.read_text(encoding='utf-8'))
+            self.assertEqual(data['groups'][0]['copies'], 3)
+            self.assertTrue(os.path.samefile(res / 'a' / 'video.bin', res / 'b' / 'video copy.bin'))
+            self.assertFalse(os.path.samefile(res / 'a' / 'video.bin', other / 'again.bin'))
+
+    def test_placeholder_manifest_is_not_a_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            res = Path(tmp) / 'res'
+            self._tree(res)
+            (res / 'a' / PLACEHOLDER_MANIFEST_NAME).write_text(
+                json.dumps({'format': 1, 'placeholder_suffix': '(PH)', 'placeholders': ['doc.md(PH)']}),
+                encoding='utf-8',
+            )
+            names = {e.rel_path for e in collect_root(res, '(PH)', placeholder_manifests=True)}
+            self.assertNotIn(f'a/{PLACEHOLDER_MANIFEST_NAME}', names)
+            self.assertIn(f'a/{PLACEHOLDER_MANIFEST_NAME}', {e.rel_path for e in collect_root(res, '(PH)')})
+
+    def test_archived_res_contributes_manifest_entries(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            res = tmp_path / 'res'
+            self._tree(res)
+            logger = Logger(tmp_path / 'archive.log', also_console=False)
+            try:
+                archive_tree(res, tmp_path / 'archived', build_index(res, '(PH)', 'sha256'), False, 'zip', 1 << 20, 1, logger)
+            finally:
+                logger.close()
+            entries = collect_root(tmp_path / 'archived', '(PH)', linkable=True, mount_archives=True)
+            self.assertEqual(sorted(e.rel_path for e in entries), sorted(e.rel_path for e in collect_root(res, '(PH)')))
+            self.assertTrue(all(e.path is None and e.hash for e in entries))
+            groups = find_duplicates(entries + collect_root(res, '(PH)'), 'sha256')
+            self.assertEqual(len(groups[0].entries), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,18 @@
 """
 Quick GUI launch test - Opens GUI and closes after 3 seconds.
 This tests that the GUI can actually start without errors.
+
+Under unittest/pytest it also checks the time-to-first-paint budget; it is
+skipped when ttkbootstrap or a display is unavailable.
 """
 import sys
 import time
 import threading
+import unittest
+
+# Seconds from launch to the first painted window, including ttkbootstrap theming
+FIRST_PAINT_BUDGET = 3.0
+
 
 def auto_close_gui():
     """Close GUI after 3 seconds."""
@@ -12,14 +20,55 @@ def auto_close_gui():
     print("\n[TEST] Auto-closing GUI after 3 seconds...")
     sys.exit(0)
 
+
+class TestGuiLaunch(unittest.TestCase):
+    def setUp(self) -> None:
+        try:
+            import ttkbootstrap as ttk
+        except ImportError:
+            self.skipTest('ttkbootstrap is not installed')
+        from kb_folder_manager.gui import KBFolderManagerGUI
+
+        started = time.perf_counter()
+        try:
+            self.root = ttk.Window(themename="cosmo")
+        except Exception as exc:  # tkinter.TclError without a display
+            self.skipTest(f'no display available: {exc}')
+        self.app = KBFolderManagerGUI(self.root, started=started)
+
+    def tearDown(self) -> None:
+        self.root.destroy()
+
+    def _pump_until(self, predicate, timeout: float = 10.0) -> None:
+        deadline = time.perf_counter() + timeout
+        while not predicate() and time.perf_counter() < deadline:
+            self.root.update()
+            time.sleep(0.01)
+
+    def test_first_paint_within_budget(self) -> None:
+        # only the visible tab is built before the window is painted
+        self.assertEqual(self.app.built_tabs, {'split'})
+        self._pump_until(lambda: 'first_paint' in self.app.startup_metrics)
+        self.assertLess(self.app.startup_metrics['first_paint'], FIRST_PAINT_BUDGET)
+
+    def test_tabs_built_on_activation_and_config_loaded_in_background(self) -> None:
+        self.app.notebook.select(self.app.settings_frame)
+        self._pump_until(lambda: 'settings' in self.app.built_tabs)
+        self.assertIn('settings', self.app.built_tabs)
+        self.assertNotIn('merge', self.app.built_tabs)
+        self._pump_until(lambda: not self.app.config_loading)
+        self.assertIsNotNone(self.app.config)
+        self.assertIn('config', self.app.startup_metrics)
+
+
 if __name__ == '__main__':
     print("[TEST] Starting GUI...")
     print("[TEST] GUI will auto-close in 3 seconds...")
-    
+
     # Start auto-close thread
     closer = threading.Thread(target=auto_close_gui, daemon=True)
     closer.start()
-    
+
     # Launch GUI
     from kb_folder_manager.gui import launch_gui
     try:
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+from kb_folder_manager.index_model import CompactIndex
+from kb_folder_manager.indexer import build_index, write_index
+
+
+class TestCompactIndex(unittest.TestCase):
+    def test_build_index_reads_like_dict(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp) / 'Complete'
+            (root / 'a' / 'b').mkdir(parents=True)
+            (root / 'a' / 'x.md(PH)').mkdir()
+            (root / 'f.md').write_text('1', encoding='utf-8')
+            (root / 'a' / 'g.bin').write_text('22', encoding='utf-8')
+
+            index = build_index(root, '(PH)', 'sha256')
+
+            self.assertEqual(list(index['files']), ['f.md', 'a/g.bin'])
+            self.assertEqual(list(index.get('dirs', {}).keys()), ['a', 'a/b'])
+            self.assertEqual(
+                index['placeholders']['a/x.md(PH)'],
+                {'kind': 'placeholder_dir', 'placeholder_for_name': 'x.md', 'placeholder_suffix': '(PH)'},
+            )
+            entry = index['files']['a/g.bin']
+            self.assertEqual(entry['size'], 2)
+            self.assertEqual(entry['hash'], hashlib.sha256(b'22').hexdigest())
+            self.assertEqual(entry['hash_alg'], 'sha256')
+            self.assertNotIn('a/missing', index['files'])
+
+            out = Path(tmp) / 'index.json'
+            write_index(out, index)
+            saved = json.loads(out.read_text(encoding='utf-8'))
+            expected = index.to_dict()
+            expected['metadata']['sorted'] = True
+            self.assertEqual(saved, expected)
+            self.assertEqual(list(saved), ['metadata', 'files', 'dirs', 'placeholders'])
+            self.assertEqual(list(saved['files']), sorted(expected['files']))
+
+    def test_memory_per_file_entry(self) -> None:
+        count = 20000
+        digests = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(count)]
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            index = CompactIndex()
+            dir_ids = [index.add_dir(f'dir_{d:03d}/sub') for d in range(200)]
+            for i in range(count):
+                index.add_file(dir_ids[i % 200], f'file_{i:06d}.pdf', i, 1.7e9 + i, digests[i], 'sha256')
+            used = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertLess(used / count, 150)
+        self.assertEqual(index['files']['dir_007/sub/file_000007.pdf']['hash'], digests[7])
+
+    def test_path_lookup_keeps_one_array(self) -> None:
+        count = 20000
+        index = CompactIndex()
+        dir_ids = [index.add_dir(f'dir_{d:03d}') for d in range(200)]
+        # interleaved dirs and names added out of order
+        for i in reversed(range(count)):
+            index.add_file(dir_ids[i % 200], f'file_{i:06d}.pdf', i, 1.0, None, None)
+        index.add_file(0, 'top.pdf', 1, 1.0, None, None)
+        index.add_placeholder(dir_ids[3], 'clip.mp4(PH)', '(PH)')
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            self.assertEqual(index['files']['dir_007/file_000207.pdf']['size'], 207)
+            used = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        # an ordinal and a name reference per file are kept, not a dict of full paths
+        self.assertLess(used / count, 16)
+        for i in (0, 199, 200, count - 1):
+            self.assertEqual(index.file_ordinal(f'dir_{i % 200:03d}/file_{i:06d}.pdf'), count - 1 - i)
+        self.assertEqual(index.file_ordinal('top.pdf'), count)
+        for missing in ('dir_007/file_000208.pdf', 'nowhere/top.pdf', 'dir_007', 'dir_199/zzz', 7):
+            self.assertNotIn(missing, index['files'])
+        self.assertIn('dir_003/clip.mp4(PH)', index['placeholders'])
+        self.assertNotIn('dir_004/clip.mp4(PH)', index['placeholders'])
+        index.add_file(dir_ids[7], 'file_000208.pdf', 5, 1.0, None, None)
+        self.assertEqual(index['files']['dir_007/file_000208.pdf']['size'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from kb_folder_manager.indexer import IndexReader, build_index, load_index, write_index
+from kb_folder_manager.utils import Logger, write_json
+from kb_folder_manager.validator import compare_index_files, compare_indexes
+
+
+class TestIndexStream(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _snapshots(self) -> tuple[Path, Path]:
+        old = self.tmp / 'old'
+        for rel_path, data in [('a.md', 'a'), ('b/c.md', 'c'), ('b/gone.bin', 'g'), ('z/é.md', 'e'), ('B.md', 'B')]:
+            (old / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (old / rel_path).write_text(data, encoding='utf-8')
+        (old / 'b' / 'clip.mp4(PH)').mkdir()
+        new = self.tmp / 'new'
+        for rel_path, data in [('a.md', 'A'), ('b/c.md', 'c'), ('b/new.bin', 'n'), ('z/é.md', 'ee'), ('B.md', 'B')]:
+            (new / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (new / rel_path).write_text(data, encoding='utf-8')
+        (new / 'y').mkdir()
+        return old, new
+
+    def _lines(self, name: str, check) -> list[str]:
+        logger = Logger(self.tmp / f'{name}.log', also_console=False)
+        check(logger)
+        logger.close()
+        return (self.tmp / f'{name}.log').read_text(encoding='utf-8').splitlines()
+
+    def test_reader_streams_sections(self) -> None:
+        old, _new = self._snapshots()
+        index = build_index(old, '(PH)', 'sha256')
+        write_index(self.tmp / 'old.json', index)
+        saved = load_index(self.tmp / 'old.json')
+        # tiny chunks force refills inside keys, strings and numbers
+        with mock.patch.object(IndexReader, 'CHUNK_CHARS', 7):
+            with IndexReader(self.tmp / 'old.json') as reader:
+                self.assertTrue(reader.is_sorted)
+                self.assertEqual(reader.metadata, saved['metadata'])
+                sections = {name: list(reader.section(name)) for name in ('files', 'dirs', 'placeholders')}
+        for name, items in sections.items():
+            self.assertEqual(items, sorted(saved[name].items()), name)
+
+    def test_streaming_compare_matches_in_memory_compare(self) -> None:
+        old, new = self._snapshots()
+        old_index = build_index(old, '(PH)', 'sha256')
+        new_index = build_index(new, '(PH)', 'sha256')
+        write_index(self.tmp / 'old.json', old_index)
+        write_index(self.tmp / 'new.json', new_index)
+        expected = self._lines('memory', lambda log: compare_indexes(old_index, new_index, log))
+        self.assertGreater(len(expected), 4)
+
+        streamed = self._lines('stream', lambda log: compare_index_files(self.tmp / 'old.json', self.tmp / 'new.json', log))
+        self.assertIn('compare: streamed sorted indexes', streamed[0])
+        self.assertEqual(streamed[1:], expected)
+        # messages spilled to temporary files replay the same
+        with mock.patch('kb_folder_manager.validator.DEFERRED_LOG_MEMORY', 1):
+            spilled = self._lines('spill', lambda log: compare_index_files(self.tmp / 'old.json', self.tmp / 'new.json', log))
+        self.assertEqual(spilled[1:], expected)
+
+        # indexes saved by older versions (unsorted, metadata last) fall back to loading both
+        write_json(self.tmp / 'plain.json', old_index.to_dict())
+        fallback = self._lines('plain', lambda log: compare_index_files(self.tmp / 'plain.json', self.tmp / 'new.json', log))
+        self.assertIn('loading both indexes', fallback[0])
+        self.assertEqual(fallback[1:], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from kb_folder_manager.mkdirs import make_dirs
+
+REL_DIRS = ['a/b/c', 'a', 'a b', 'a/b/c(PH)', 'z/y', 'a/b/c', 'z/y/x.md(PH)']
+
+
+def _tree(root: Path) -> set[str]:
+    return {Path(dirpath, d).relative_to(root).as_posix() for dirpath, dirs, _files in os.walk(root) for d in dirs}
+
+
+class TestMakeDirs(unittest.TestCase):
+    def test_creates_each_directory_once(self) -> None:
+        expected = {'a', 'a/b', 'a/b/c', 'a b', 'a/b/c(PH)', 'z', 'z/y', 'z/y/x.md(PH)'}
+        with tempfile.TemporaryDirectory() as tmp:
+            for workers in (1, 4):
+                root = Path(tmp) / f'w{workers}' / 'KB'
+                self.assertEqual(make_dirs(root, REL_DIRS, workers), len(expected))
+                self.assertEqual(_tree(root), expected)
+                # re-running over existing directories is harmless
+                self.assertEqual(make_dirs(root, REL_DIRS, workers), 0)
+
+    def test_file_in_the_way_is_an_error(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / 'a').write_text('not a dir', encoding='utf-8')
+            with self.assertRaises(OSError):
+                make_dirs(root, ['a/b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
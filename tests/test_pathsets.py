@@ -0,0 +1,129 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from kb_folder_manager.config import Config
+from kb_folder_manager.operations import _merge_post_check
+from kb_folder_manager.pathsets import PathUniverse, placeholder_original
+from kb_folder_manager.utils import Logger, derive_placeholder_original
+from kb_folder_manager.validator import validate_mutual
+
+SUFFIX = '(PH)'
+
+
+def _path_original(rel_path: str, placeholder_suffix: str) -> str:
+    # the Path-based mapping the validators used before
+    p = Path(rel_path)
+    original = derive_placeholder_original(p.name, placeholder_suffix)
+    return (p.parent / original).as_posix() if p.parent != Path('.') else original
+
+
+def _reference_mutual(doc_index: dict, res_index: dict, logger: Logger) -> None:
+    doc_files = set(doc_index['files'])
+    res_files = set(res_index['files'])
+    doc_originals = {_path_original(p, SUFFIX) for p in doc_index['placeholders']}
+    res_originals = {_path_original(p, SUFFIX) for p in res_index['placeholders']}
+    for rel_path in sorted(doc_files & res_files):
+        logger.error(f'conflict: file exists in both doc and res: {rel_path}')
+    for rel_path in sorted(doc_originals & res_originals):
+        logger.error(f'missing file: placeholder on both sides for {rel_path}')
+    for rel_path in sorted(doc_files - res_originals):
+        logger.error(f'doc file missing placeholder in res: {rel_path}')
+    for rel_path in sorted(res_files - doc_originals):
+        logger.error(f'res file missing placeholder in doc: {rel_path}')
+    for rel_path in sorted(doc_originals - res_files):
+        logger.error(f'doc placeholder has no file in res: {rel_path}')
+    for rel_path in sorted(res_originals - doc_files):
+        logger.error(f'res placeholder has no file in doc: {rel_path}')
+    logical_doc = doc_files | doc_originals
+    logical_res = res_files | res_originals
+    if logical_res - logical_doc or logical_doc - logical_res:
+        if logical_doc - logical_res:
+            logger.error(f'logical files missing in res: {len(logical_doc - logical_res)}')
+        if logical_res - logical_doc:
+            logger.error(f'logical files missing in doc: {len(logical_res - logical_doc)}')
+    if set(doc_index['dirs']) != set(res_index['dirs']):
+        logger.error(f"directory structure mismatch: doc={len(doc_index['dirs'])} res={len(res_index['dirs'])}")
+
+
+def _split_indexes(rng: random.Random, count: int) -> tuple[dict, dict, dict]:
+    complete = {'files': {}, 'dirs': {'d0': {}, 'd1': {}}, 'placeholders': {}}
+    doc = {'files': {}, 'dirs': dict(complete['dirs']), 'placeholders': {}}
+    res = {'files': {}, 'dirs': dict(complete['dirs']), 'placeholders': {}}
+    for i in range(count):
+        rel_path = f'd{i % 2}/f{i}.{"md" if i % 3 else "bin"}'
+        complete['files'][rel_path] = {}
+        keep, other = (doc, res) if i % 3 else (res, doc)
+        keep['files'][rel_path] = {}
+        other['placeholders'][rel_path + SUFFIX] = {}
+    # damage both sides in every way the validators report
+    for side in (doc, res):
+        for key in ('files', 'placeholders'):
+            for rel_path in rng.sample(sorted(side[key]), 3):
+                del side[key][rel_path]
+        side['files'][f'd0/stray{rng.randrange(1000)}.md'] = {}
+    res['files'][next(iter(doc['files']))] = {}
+    doc['placeholders'][next(iter(doc['files'])) + SUFFIX] = {}
+    doc['placeholders'][SUFFIX] = {}
+    res['placeholders']['d1/' + SUFFIX] = {}
+    res['dirs']['extra'] = {}
+    return complete, doc, res
+
+
+class TestPathSets(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.config = Config(specified_types={'.md'}, placeholder_suffix=SUFFIX, hash_algorithm='sha256', use_7zip=False)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _lines(self, name: str, check) -> list[str]:
+        logger = Logger(Path(self._tmp.name) / f'{name}.log', also_console=False)
+        check(logger)
+        logger.close()
+        return (Path(self._tmp.name) / f'{name}.log').read_text(encoding='utf-8').splitlines()
+
+    def test_placeholder_original_matches_path_mapping(self) -> None:
+        for rel_path in ['a(PH)', 'x/y/clip.mp4(PH)', 'plain', '(PH)', 'x/(PH)', 'x/a(PH)(PH)', 'a.(PH)']:
+            self.assertEqual(placeholder_original(rel_path, SUFFIX), _path_original(rel_path, SUFFIX), rel_path)
+
+    def test_set_operations(self) -> None:
+        universe = PathUniverse()
+        a = universe.add(['x', 'b', 'a', 'b'])
+        b = universe.add(['b', 'c'])
+        self.assertEqual((a & b).sorted(), ['b'])
+        self.assertEqual((a | b).sorted(), ['a', 'b', 'c', 'x'])
+        self.assertEqual((a - b).sorted(), ['a', 'x'])
+        self.assertEqual(len(a), 3)
+        self.assertFalse(a - a)
+        self.assertEqual(universe.add_placeholders(['c(PH)', 'b(PH)'], SUFFIX), b)
+
+    def test_mutual_output_unchanged(self) -> None:
+        for seed in range(5):
+            _complete, doc, res = _split_indexes(random.Random(seed), 60)
+            expected = self._lines('reference', lambda log: _reference_mutual(doc, res, log))
+            actual = self._lines('mutual', lambda log: validate_mutual(doc, res, self.config, log))
+            self.assertGreater(len(expected), 10)
+            self.assertEqual(actual, expected)
+
+    def test_merge_post_check(self) -> None:
+        complete, doc, res = _split_indexes(random.Random(0), 30)
+        lines = self._lines('post', lambda log: _merge_post_check(complete, doc, res, self.config, log))
+        self.assertEqual(lines, [
+            '[ERROR] post-check mismatch: doc files expected 20 got 18',
+            '[ERROR] post-check mismatch: res files expected 10 got 9',
+            '[ERROR] post-check mismatch: doc placeholders do not match expected',
+            '[ERROR] post-check mismatch: res placeholders do not match expected',
+            '[ERROR] post-check mismatch: res dirs do not match complete dirs',
+        ])
+
+        complete = {'files': {'a.md': {}, 'd/b.bin': {}}, 'dirs': {'d': {}}, 'placeholders': {}}
+        doc = {'files': {'a.md': {}}, 'dirs': {'d': {}}, 'placeholders': {'d/b.bin' + SUFFIX: {}}}
+        res = {'files': {'d/b.bin': {}}, 'dirs': {'d': {}}, 'placeholders': {'a.md' + SUFFIX: {}}}
+        self.assertEqual(self._lines('clean', lambda log: _merge_post_check(complete, doc, res, self.config, log)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from kb_folder_manager.config import Config
+from kb_folder_manager.indexer import build_index
+from kb_folder_manager.operations import convert_placeholders_operation, merge_operation, split_operation
+from kb_folder_manager.utils import PLACEHOLDER_MANIFEST_NAME, FatalError, Logger
+from kb_folder_manager.validator import validate_class1
+
+SUFFIX = '(PH)'
+
+
+def _placeholder_dirs(root: Path) -> list[str]:
+    return sorted(p.relative_to(root).as_posix() for p in root.rglob('*' + SUFFIX) if p.is_dir())
+
+
+def _entries(root: Path, manifests: bool = False) -> dict:
+    data = build_index(root, SUFFIX, 'sha256', placeholder_manifests=manifests).to_dict()
+    return {key: data[key] for key in ('files', 'dirs', 'placeholders')}
+
+
+class TestPlaceholderManifest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.complete = self.tmp / 'Complete'
+        (self.complete / 'nested' / 'deep').mkdir(parents=True)
+        (self.complete / 'empty_dir').mkdir()
+        (self.complete / 'top.md').write_text('top', encoding='utf-8')
+        (self.complete / 'nested' / 'a.md').write_text('hello', encoding='utf-8')
+        (self.complete / 'nested' / 'b.bin').write_bytes(b'\x00\x01')
+        (self.complete / 'nested' / 'deep' / 'c.bin').write_bytes(b'\x02')
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _config(self, mode: str) -> Config:
+        return Config(
+            specified_types={'.md'}, placeholder_suffix=SUFFIX, hash_algorithm='sha256', use_7zip=False,
+            placeholder_mode=mode,
+        )
+
+    def test_manifest_split_is_equivalent_and_merges_back(self) -> None:
+        split_operation(self.complete, self.tmp / 'dirs', self._config('dirs'), force=False, auto_yes=True)
+        split_operation(self.complete, self.tmp / 'manifest', self._config('manifest'), force=False, auto_yes=True)
+        for side in ('doc', 'res'):
+            with_dirs = self.tmp / 'dirs' / side / 'Complete'
+            with_manifest = self.tmp / 'manifest' / side / 'Complete'
+            self.assertEqual(_placeholder_dirs(with_manifest), [])
+            self.assertTrue(_placeholder_dirs(with_dirs))
+            self.assertEqual(_entries(with_manifest, manifests=True), _entries(with_dirs))
+        manifest = json.loads(
+            (self.tmp / 'manifest' / 'doc' / 'Complete' / 'nested' / PLACEHOLDER_MANIFEST_NAME).read_text(encoding='utf-8')
+        )
+        self.assertEqual(manifest['placeholders'], ['b.bin' + SUFFIX])
+
+        out = self.tmp / 'merged'
+        doc = self.tmp / 'manifest' / 'doc' / 'Complete'
+        res = self.tmp / 'manifest' / 'res' / 'Complete'
+        merge_operation(doc, res, out, self._config('manifest'), force=False, auto_yes=True)
+        merged = out / 'complete' / 'Complete'
+        self.assertEqual(_entries(merged, manifests=True)['files'].keys(), _entries(self.complete)['files'].keys())
+        self.assertEqual(list(merged.rglob(PLACEHOLDER_MANIFEST_NAME)), [])
+
+    def test_convert_round_trip(self) -> None:
+        split_operation(self.complete, self.tmp / 'out', self._config('dirs'), force=False, auto_yes=True)
+        res = self.tmp / 'out' / 'res' / 'Complete'
+        before = _entries(res)
+        config = self._config('dirs')
+        convert_placeholders_operation(res, 'manifest', config, self.tmp / 'logs1')
+        self.assertEqual(_placeholder_dirs(res), [])
+        self.assertEqual(_entries(res, manifests=True), before)
+        convert_placeholders_operation(res, 'dirs', config, self.tmp / 'logs2')
+        self.assertEqual(list(res.rglob(PLACEHOLDER_MANIFEST_NAME)), [])
+        self.assertEqual(_placeholder_dirs(res), sorted(before['placeholders']))
+        self.assertEqual(_entries(res), before)
+
+    def _class1(self, root: Path, mode: str) -> list[str]:
+        log_path = self.tmp / 'class1.log'
+        logger = Logger(log_path, also_console=False)
+        try:
+            validate_class1(root, self._config(mode), allow_placeholders=True, logger=logger)
+        finally:
+            logger.close()
+        return log_path.read_text(encoding='utf-8').splitlines()
+
+    def test_class1_reports_manifest_entry_without_suffix(self) -> None:
+        root = self.tmp / 'res'
+        root.mkdir()
+        (root / PLACEHOLDER_MANIFEST_NAME).write_text(
+            json.dumps({'format': 1, 'placeholder_suffix': SUFFIX, 'placeholders': ['a.md' + SUFFIX, 'b.md']}),
+            encoding='utf-8',
+        )
+        with mock.patch('kb_folder_manager.validator.dir_is_empty', side_effect=AssertionError('probed')):
+            self.assertEqual(self._class1(root, 'manifest'), ['[ERROR] placeholder manifest entry without suffix: b.md'])
+
+    def test_manifest_read_only_in_manifest_mode(self) -> None:
+        root = self.tmp / 'res'
+        (root / 'sub').mkdir(parents=True)
+        (root / 'sub' / PLACEHOLDER_MANIFEST_NAME).write_text('{"not": "a manifest"}', encoding='utf-8')
+        (root / PLACEHOLDER_MANIFEST_NAME).write_text('{broken', encoding='utf-8')
+
+        # in dirs mode a file with that name is just a file
+        self.assertEqual(self._class1(root, 'dirs'), [])
+        self.assertEqual(len(_entries(root)['files']), 2)
+
+        lines = self._class1(root, 'manifest')
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith(f'[ERROR] invalid placeholder manifest: {PLACEHOLDER_MANIFEST_NAME} ('))
+        self.assertTrue(lines[1].startswith(f'[ERROR] invalid placeholder manifest: sub/{PLACEHOLDER_MANIFEST_NAME} ('))
+        self.assertEqual(_entries(root, manifests=True)['placeholders'], {})
+
+        with self.assertRaises(FatalError):
+            convert_placeholders_operation(root, 'dirs', self._config('dirs'), self.tmp / 'logs')
+        self.assertTrue((root / PLACEHOLDER_MANIFEST_NAME).exists())
+
+if __name__ == '__main__':
+    unittest.main()
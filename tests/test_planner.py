@@ -0,0 +1,82 @@
+import contextlib
+import io
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from kb_folder_manager import cli
+from kb_folder_manager.config import Config
+from kb_folder_manager.indexer import build_index
+from kb_folder_manager.operations import split_dry_run_operation, split_operation
+from kb_folder_manager.planner import SPLIT_PLAN_FILE_NAME, build_split_plan, estimate_seconds, load_plan, write_plan
+
+
+class TestSplitPlan(unittest.TestCase):
+    def _source(self, tmp_path: Path) -> Path:
+        source = tmp_path / 'KB'
+        (source / 'sub').mkdir(parents=True)
+        (source / 'a.md').write_text('doc', encoding='utf-8')
+        (source / 'sub' / 'clip.bin').write_bytes(b'x' * 5000)
+        (source / 'sub' / 'b.MD').write_text('doc2', encoding='utf-8')
+        return source
+
+    def test_plan_routes_files_and_round_trips(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            source = self._source(tmp_path)
+            index = build_index(source, '(PH)', 'sha256', hash_files=False)
+            self.assertIsNone(index['files']['a.md'].get('hash'))
+            plan = build_split_plan(source, index, {'.md'}, '(PH)')
+
+            sides = {rel_path: side for side, rel_path in plan.copies()}
+            self.assertEqual(sides, {'a.md': 'doc', 'sub/b.MD': 'doc', 'sub/clip.bin': 'res'})
+            self.assertEqual(
+                sorted(plan.placeholders()),
+                [('doc', 'sub/clip.bin(PH)'), ('res', 'a.md(PH)'), ('res', 'sub/b.MD(PH)')],
+            )
+            summary = plan.summary()
+            self.assertEqual((summary['files_doc'], summary['bytes_res'], summary['total_bytes']), (2, 5000, 5007))
+            self.assertEqual(estimate_seconds(plan, {'read_bytes_per_second': 5007, 'per_file_seconds': 0.0}), 1.0)
+
+            write_plan(tmp_path / 'plan.json', plan)
+            self.assertEqual(load_plan(tmp_path / 'plan.json'), plan)
+
+    def test_dry_run_writes_nothing_and_split_saves_plan(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            source = self._source(tmp_path)
+            output = tmp_path / 'out'
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                plan = split_dry_run_operation(source, output, config)
+            self.assertFalse(output.exists())
+            self.assertIn('total bytes=5007', out.getvalue())
+
+            split_operation(source, output, config, force=False, auto_yes=True)
+            self.assertEqual(load_plan(output / 'index' / SPLIT_PLAN_FILE_NAME), plan)
+            self.assertTrue((output / 'doc' / 'KB' / 'sub' / 'clip.bin(PH)').is_dir())
+            self.assertTrue((output / 'res' / 'KB' / 'sub' / 'clip.bin').is_file())
+
+    def test_conflicting_split_flags_are_fatal(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            source = self._source(tmp_path)
+            output = tmp_path / 'out'
+            for flags, message in (
+                (['--plan', str(tmp_path / 'plan.json')], 'split --plan requires --dry-run'),
+                (['--archive', '--dry-run'], 'split --archive cannot be combined with --dry-run'),
+            ):
+                argv = ['kb_folder_manager', 'split', '--source', str(source), '--output-root', str(output), *flags]
+                out = io.StringIO()
+                with mock.patch.object(sys, 'argv', argv), contextlib.redirect_stdout(out):
+                    self.assertEqual(cli.main(), 2)
+                self.assertIn(f'[FATAL] {message}', out.getvalue())
+                self.assertFalse(output.exists())
+                self.assertFalse((tmp_path / 'plan.json').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
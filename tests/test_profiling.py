@@ -0,0 +1,76 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from kb_folder_manager.config import Config
+from kb_folder_manager.operations import index_operation, split_operation
+from kb_folder_manager.profiling import PSTATS_FILE_NAME, TIMING_FILE_NAME, Profiler, active
+
+
+class TestProfiling(unittest.TestCase):
+    def test_index_profile_writes_timing_and_pstats(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            target = root / 'Complete'
+            (target / 'nested').mkdir(parents=True)
+            (target / 'a.md').write_text('hello', encoding='utf-8')
+            (target / 'nested' / 'b.bin').write_bytes(b'\x00' * 100)
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+
+            log_dir = root / 'logs'
+            index_operation(target, root / 'index.json', config, log_dir, profile=True)
+
+            timing = json.loads((log_dir / TIMING_FILE_NAME).read_text(encoding='utf-8'))
+            self.assertEqual([p['name'] for p in timing['phases']], ['index'])
+            self.assertEqual(timing['counters']['files_hashed'], 2)
+            self.assertEqual(timing['counters']['bytes_read'], 105)
+            self.assertEqual(timing['counters']['dirs_walked'], 2)
+            self.assertTrue((log_dir / PSTATS_FILE_NAME).is_file())
+            self.assertIn('timing: phase=index', (log_dir / 'Index.log').read_text(encoding='utf-8'))
+
+    def test_no_timing_file_without_profile(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            target = root / 'Complete'
+            target.mkdir()
+            (target / 'a.md').write_text('hello', encoding='utf-8')
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+
+            log_dir = root / 'logs'
+            index_operation(target, root / 'index.json', config, log_dir)
+            self.assertFalse((log_dir / TIMING_FILE_NAME).exists())
+
+
+    def test_paused_block_is_not_timed(self) -> None:
+        profiler = Profiler()
+        profiler.start()
+        with profiler.paused():
+            time.sleep(0.2)
+        profiler.stop()
+        self.assertLess(profiler.total_seconds(), 0.1)
+
+    def test_confirm_prompt_runs_outside_profiling(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            source = root / 'Complete'
+            source.mkdir()
+            (source / 'a.md').write_text('hello', encoding='utf-8')
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+            seen: list[float] = []
+
+            def confirm(_message: str, _auto_yes: bool) -> None:
+                seen.append(active().total_seconds())
+                time.sleep(0.05)
+                seen.append(active().total_seconds())
+
+            with mock.patch('kb_folder_manager.operations.prompt_confirm', side_effect=confirm):
+                split_operation(source, root / 'out', config, force=False, auto_yes=False, profile=True)
+            self.assertEqual(len(seen), 2)
+            self.assertEqual(seen[0], seen[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
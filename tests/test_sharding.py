@@ -0,0 +1,165 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from kb_folder_manager.config import Config
+from kb_folder_manager.index_model import CompactIndex
+from kb_folder_manager.indexer import build_index, load_index
+from kb_folder_manager.operations import split_operation
+from kb_folder_manager.sharding import sharded_scan
+from kb_folder_manager.utils import Logger
+from kb_folder_manager.validator import validate_class1
+
+SUFFIX = '(PH)'
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def _without_timestamp(index) -> dict:
+    data = index.to_dict()
+    data['metadata'].pop('generated_at')
+    return data
+
+
+class TestShardedScan(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'KB'
+        for rel_dir in ['Docs/a', 'docs/a', 'x/y/z', 'x/q' + SUFFIX, 'empty']:
+            (self.root / rel_dir).mkdir(parents=True)
+        for rel_path in ['top.md', 'Docs/a/1.md', 'docs/a/2.bin', 'x/y/z/3.md', 'x/4.md', 'x/q' + SUFFIX + '/junk']:
+            (self.root / rel_path).write_text(rel_path, encoding='utf-8')
+        self.config = Config(specified_types={'.md'}, placeholder_suffix=SUFFIX, hash_algorithm='sha256', use_7zip=False)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _lines(self, name: str) -> list[str]:
+        lines = (self.tmp / f'{name}.log').read_text(encoding='utf-8').splitlines()
+        return [line for line in lines if 'progress' not in line]
+
+    def test_matches_single_process(self) -> None:
+        for allow_placeholders in (False, True):
+            single = Logger(self.tmp / 'single.log', also_console=False)
+            try:
+                expected = build_index(self.root, SUFFIX, 'sha256', single)
+                validate_class1(self.root, self.config, allow_placeholders, single)
+            finally:
+                single.close()
+            sharded = Logger(self.tmp / 'sharded.log', also_console=False)
+            try:
+                index, run_class1 = sharded_scan(self.root, SUFFIX, 'sha256', 3, allow_placeholders, sharded)
+                run_class1()
+            finally:
+                sharded.close()
+            self.assertEqual(_without_timestamp(index), _without_timestamp(expected))
+            self.assertEqual(list(index.to_dict()['files']), list(expected.to_dict()['files']))
+            self.assertEqual(index.metadata['root_hash'], expected.metadata['root_hash'])
+            lines = self._lines('sharded')
+            self.assertEqual(lines, self._lines('single'))
+            # the case conflict spans two top-level shards
+            self.assertIn('[FATAL] case conflict: Docs vs docs', lines)
+
+    def test_extend_remaps_tables(self) -> None:
+        left = CompactIndex()
+        left.add_file(left.add_dir('a'), 'f', 1, 1.0, None, None)
+        right = CompactIndex()
+        d = right.add_dir('b')
+        right.add_file(d, 'g', 2, 2.0, 'ab' * 32, 'sha256')
+        right.add_file(d, 'h', 3, 3.0, 'cd' * 16, 'md5')
+        right.add_placeholder(d, 'p' + SUFFIX, SUFFIX)
+        left.extend(right)
+        self.assertIsNone(left['files']['a/f'].get('hash'))
+        self.assertEqual(left['files']['b/g']['hash'], 'ab' * 32)
+        self.assertEqual(left['files']['b/h'], {'kind': 'file', 'size': 3, 'mtime': 3.0, 'hash': 'cd' * 16, 'hash_alg': 'md5'})
+        self.assertIn('b/p' + SUFFIX, left['placeholders'])
+
+    def test_split_with_processes(self) -> None:
+        (self.root / 'docs').rename(self.root / 'other')
+        (self.root / 'x' / ('q' + SUFFIX) / 'junk').unlink()
+        (self.root / 'x' / ('q' + SUFFIX)).rmdir()
+        self.config.processes = 2
+        out = self.tmp / 'out'
+        split_operation(self.root, out, self.config, force=False, auto_yes=True)
+        self.assertTrue((out / 'doc' / 'KB' / 'x' / 'y' / 'z' / '3.md').is_file())
+        self.assertTrue((out / 'res' / 'KB' / 'other' / 'a' / '2.bin').is_file())
+        self.assertTrue((out / 'doc' / 'KB' / 'other' / 'a' / ('2.bin' + SUFFIX)).is_dir())
+
+
+class TestShardIndexMerge(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'KB'
+        for rel_dir in ['a/b/deep', 'c', 'a/q' + SUFFIX]:
+            (self.root / rel_dir).mkdir(parents=True)
+        for rel_path in ['top.md', 'a/1.md', 'a/b/2.bin', 'a/b/deep/3.md', 'c/4.md']:
+            (self.root / rel_path).write_text(rel_path, encoding='utf-8')
+        self.config_path = self.tmp / 'config.yaml'
+        self.config_path.write_text(
+            f'specified_types: [".md"]\nplaceholder_suffix: "{SUFFIX}"\nhash_algorithm: "sha256"\n', encoding='utf-8'
+        )
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _cli(self, *args: str) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, 'kb_folder_manager.py', '--config', str(self.config_path), *args,
+             '--log-dir', str(self.tmp / 'logs')],
+            cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def _shards(self, *specs: tuple[str, Path, list[str]]) -> list[str]:
+        # one process per shard, standing in for the hosts that own each subtree
+        outputs = [str(self.tmp / f'shard{i}.json') for i in range(len(specs))]
+        procs = []
+        for output, (subtree, target, excluded) in zip(outputs, specs):
+            args = ['index', '--target', str(target), '--output', output, '--subtree', subtree]
+            for rel_path in excluded:
+                args += ['--exclude', rel_path]
+            procs.append(self._cli(*args))
+        self.assertEqual([proc.wait() for proc in procs], [0] * len(procs))
+        return outputs
+
+    def test_merged_shards_match_full_index(self) -> None:
+        shards = self._shards(
+            ('.', self.root, ['a/b', 'c']),
+            ('a/b', self.root / 'a' / 'b', []),
+            ('c', self.root / 'c', []),
+        )
+        merged_path = self.tmp / 'merged.json'
+        self.assertEqual(self._cli('index-merge', *shards, '--output', str(merged_path)).wait(), 0)
+        merged = load_index(merged_path)
+        full = build_index(self.root, SUFFIX, 'sha256').to_dict()
+        for section in ('files', 'dirs', 'placeholders'):
+            self.assertEqual(merged[section], full[section], section)
+        self.assertEqual(merged['metadata']['root_hash'], full['metadata']['root_hash'])
+        self.assertEqual(merged['metadata']['root_path'], str(self.root))
+        self.assertEqual([s['subtree'] for s in merged['metadata']['shards']], ['', 'a/b', 'c'])
+
+    def test_overlap_and_gaps_are_rejected(self) -> None:
+        shards = self._shards(('.', self.root, ['c']), ('a', self.root / 'a', []))
+        merged_path = self.tmp / 'merged.json'
+        self.assertNotEqual(self._cli('index-merge', *shards, '--output', str(merged_path)).wait(), 0)
+        self.assertFalse(merged_path.exists())
+        log = next((self.tmp / 'logs').glob('*/IndexMerge.log')).read_text(encoding='utf-8')
+        self.assertIn('[ERROR] overlapping shards: shard0.json (subtree /) and shard1.json (subtree a)', log)
+        self.assertIn('[ERROR] conflicting shards: a/1.md in shard0.json and shard1.json', log)
+        self.assertIn('[ERROR] excluded subtree not covered by any shard: c (shard0.json)', log)
+
+    def test_partial_coverage_is_rejected(self) -> None:
+        # a/b is indexed, but a/1.md and a/q are left to no shard
+        shards = self._shards(('.', self.root, ['a']), ('a/b', self.root / 'a' / 'b', []))
+        merged_path = self.tmp / 'merged.json'
+        self.assertNotEqual(self._cli('index-merge', *shards, '--output', str(merged_path)).wait(), 0)
+        self.assertFalse(merged_path.exists())
+        log = next((self.tmp / 'logs').glob('*/IndexMerge.log')).read_text(encoding='utf-8')
+        self.assertIn('[ERROR] excluded subtree not covered by any shard: a (shard0.json)', log)
+
+
+if __name__ == '__main__':
+    unittest.main()
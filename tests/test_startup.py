@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from kb_folder_manager.config import _cache_path, load_config
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+# cumulative microseconds for importing the CLI entry point; generous enough for slow CI machines
+CLI_IMPORT_BUDGET_US = 250_000
+DEFERRED_MODULES = {
+    'yaml',
+    'zipfile',
+    'tarfile',
+    'subprocess',
+    'concurrent.futures',
+    'kb_folder_manager.operations',
+    'kb_folder_manager.indexer',
+    'kb_folder_manager.validator',
+    'kb_folder_manager.dedup',
+    'kb_folder_manager.archive',
+}
+
+
+def _import_times(code: str) -> dict[str, int]:
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'},
+    )
+    times: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartup(unittest.TestCase):
+    def test_cli_import_defers_subcommand_modules(self) -> None:
+        times = _import_times('import kb_folder_manager.cli')
+        self.assertEqual(DEFERRED_MODULES & times.keys(), set())
+        self.assertLess(times['kb_folder_manager.cli'], CLI_IMPORT_BUDGET_US)
+
+    def test_config_sidecar_skips_yaml(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'config.yaml'
+            path.write_text("specified_types: ['.md']\nplaceholder_suffix: '(PH)'\n", encoding='utf-8')
+            self.assertEqual(load_config(path).specified_types, {'.md'})
+            self.assertTrue(_cache_path(path).exists())
+
+            code = f'from pathlib import Path; from kb_folder_manager.config import load_config; load_config(Path({str(path)!r}))'
+            self.assertNotIn('yaml', _import_times(code))
+
+            # any edit changes size or mtime and invalidates the sidecar
+            path.write_text("specified_types: ['.md', '.pdf']\nplaceholder_suffix: '(PH)'\n", encoding='utf-8')
+            self.assertEqual(load_config(path).specified_types, {'.md', '.pdf'})
+
+
+if __name__ == '__main__':
+    unittest.main()
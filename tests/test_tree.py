@@ -0,0 +1,180 @@
+import copy
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from kb_folder_manager.config import Config
+from kb_folder_manager.index_model import CompactIndex
+from kb_folder_manager.indexer import build_index, load_index, write_index
+from kb_folder_manager.operations import verify_operation
+from kb_folder_manager.tree import (
+    build_tree,
+    changed_dirs,
+    index_tree,
+    iter_changed_files,
+    record_tree_hashes,
+    subtree_files,
+)
+from kb_folder_manager.utils import FatalError, Logger
+from kb_folder_manager.validator import compare_indexes
+
+
+def _file(size: int, digest: str, mtime: float = 1.0) -> dict:
+    return {'kind': 'file', 'size': size, 'mtime': mtime, 'hash': digest, 'hash_alg': 'sha256'}
+
+
+def _index(files: dict, dirs: list[str], placeholders: list[str] = ()) -> dict:
+    return {
+        'files': files,
+        'dirs': {d: {'kind': 'dir'} for d in dirs},
+        'placeholders': {p: {'kind': 'placeholder_dir'} for p in placeholders},
+        'metadata': {},
+    }
+
+
+def _compact(index: dict) -> CompactIndex:
+    compact = CompactIndex()
+    for rel_dir in index['dirs']:
+        compact.add_dir(rel_dir)
+    for rel_path, entry in index['files'].items():
+        parent, _, name = rel_path.rpartition('/')
+        compact.add_file(compact.dir_id(parent), name, entry['size'], entry['mtime'], entry['hash'], entry['hash_alg'])
+    return compact
+
+
+def _snapshots(rng: random.Random, count: int) -> tuple[dict, dict]:
+    dirs = [f'd{i}' for i in range(5)] + [f'd{i}/e{j}' for i in range(5) for j in range(3)]
+    old = _index({f'{rng.choice(dirs)}/f{i}.md': _file(i, f'{i:02x}') for i in range(count)}, dirs)
+    new = copy.deepcopy(old)
+    paths = sorted(old['files'])
+    for rel_path in rng.sample(paths, 3):
+        del new['files'][rel_path]
+    for rel_path in rng.sample(paths, 3):
+        new['files'][rel_path]['hash'] = 'ff'
+    for rel_path in rng.sample(paths, 3):
+        new['files'][rel_path]['mtime'] = 2.0
+    new['files']['d1/e2/added.md'] = _file(1, 'ee')
+    new['dirs']['d9'] = {'kind': 'dir'}
+    new['files']['d9/only.md'] = _file(1, 'ee')
+    return old, new
+
+
+class TestTree(unittest.TestCase):
+    def setUp(self) -> None:
+        self.old = _index(
+            {
+                'top.md': _file(1, 'aa'),
+                'Projects/Archive/a.pdf': _file(10, 'bb'),
+                'Projects/Archive/deep/b.bin': _file(20, 'cc'),
+                'Projects/Live/c.md': _file(5, 'dd'),
+            },
+            ['Projects', 'Projects/Archive', 'Projects/Archive/deep', 'Projects/Live'],
+            ['Projects/Live/x.bin(PH)'],
+        )
+
+    def test_aggregates(self) -> None:
+        root = build_tree(self.old)
+        archive = root.find('Projects/Archive')
+        self.assertEqual(archive.file_count, 2)
+        self.assertEqual(archive.total_bytes, 30)
+        self.assertEqual(root.file_count, 4)
+        self.assertEqual(
+            sorted(p for p, _ in subtree_files(self.old, 'Projects/Archive')),
+            ['Projects/Archive/a.pdf', 'Projects/Archive/deep/b.bin'],
+        )
+
+    def test_identical_subtrees_are_skipped(self) -> None:
+        new = _index(dict(self.old['files']), list(self.old['dirs']), list(self.old['placeholders']))
+        new['files']['Projects/Live/c.md'] = _file(5, 'ee')
+        old_root, new_root = build_tree(self.old), build_tree(new)
+
+        self.assertEqual(old_root.find('Projects/Archive').digest, new_root.find('Projects/Archive').digest)
+        self.assertNotEqual(old_root.digest, new_root.digest)
+        changes = list(iter_changed_files(old_root, new_root))
+        self.assertEqual([c[0] for c in changes], ['Projects/Live/c.md'])
+        self.assertEqual(changed_dirs(old_root, new_root), ['Projects/Live'])
+
+    def test_mtime_changes_stamp_but_not_digest(self) -> None:
+        new = _index(dict(self.old['files']), list(self.old['dirs']), list(self.old['placeholders']))
+        new['files']['top.md'] = _file(1, 'aa', mtime=2.0)
+        old_root, new_root = build_tree(self.old), build_tree(new)
+        self.assertEqual(old_root.digest, new_root.digest)
+        self.assertNotEqual(old_root.stamp, new_root.stamp)
+        self.assertEqual([c[0] for c in iter_changed_files(old_root, new_root)], ['top.md'])
+
+    def test_compare_by_recorded_stamps_matches_flat_diff(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            def lines(name: str, old: dict, new: dict) -> list[str]:
+                logger = Logger(Path(tmp) / f'{name}.log', also_console=False)
+                compare_indexes(old, new, logger)
+                logger.close()
+                return (Path(tmp) / f'{name}.log').read_text(encoding='utf-8').splitlines()
+
+            for seed in range(5):
+                old, new = _snapshots(random.Random(seed), 200)
+                expected = lines('flat', old, new)
+                self.assertGreater(len(expected), 9)
+                old_compact, new_compact = _compact(old), _compact(new)
+                self.assertEqual(lines('compact-flat', old_compact, new_compact), expected)
+                for index in (old, new, old_compact, new_compact):
+                    record_tree_hashes(index)
+                self.assertEqual(lines('dict', old, new), expected)
+                self.assertEqual(lines('compact', old_compact, new_compact), expected)
+                same = _compact(old)
+                record_tree_hashes(same)
+                self.assertEqual(lines('same', old_compact, same), [])
+
+
+class TestRootHash(unittest.TestCase):
+    def test_root_hash_recorded_and_verified(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            complete = root / 'Complete'
+            (complete / 'nested' / 'empty').mkdir(parents=True)
+            (complete / 'nested' / 'a.md').write_text('hello', encoding='utf-8')
+            (complete / 'b.bin').write_bytes(b'\x00\x01')
+            copy = root / 'Copy'
+            shutil.copytree(complete, copy)
+            config = Config(specified_types={'.md'}, placeholder_suffix='(PH)', hash_algorithm='sha256', use_7zip=False)
+
+            index = build_index(complete, '(PH)', 'sha256')
+            write_index(root / 'index.json', index)
+            saved = load_index(root / 'index.json')
+            self.assertEqual(saved['metadata']['root_hash'], build_tree(saved).digest)
+            self.assertEqual(saved['dirs']['nested']['tree_hash'], build_tree(saved).find('nested').digest)
+
+            verify_operation(root / 'index.json', config, root / 'logs1', against=copy)
+            verify_operation(copy, config, root / 'logs2', expected_root_hash=saved['metadata']['root_hash'])
+
+            (copy / 'nested' / 'a.md').write_text('changed', encoding='utf-8')
+            with self.assertRaises(FatalError):
+                verify_operation(root / 'index.json', config, root / 'logs3', against=copy)
+            log_text = next((root / 'logs3').glob('Verify.log')).read_text(encoding='utf-8')
+            self.assertIn('file content differs: nested/a.md', log_text)
+
+    def test_compact_tree_reuses_recorded_hashes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / 'a' / 'b').mkdir(parents=True)
+            (root / 'a' / 'b' / 'x.md').write_text('x', encoding='utf-8')
+            (root / 'a' / 'y.md').write_text('y', encoding='utf-8')
+            (root / 'a' / 'c.pdf(PH)').mkdir()
+            (root / 'z.bin').write_bytes(b'z')
+            index = build_index(root, '(PH)', 'sha256')
+        expected = build_tree(index.to_dict())
+        with mock.patch('kb_folder_manager.tree._combine', side_effect=AssertionError('rehashed')):
+            tree = index_tree(index)
+        self.assertEqual(
+            [(n.path, n.digest, n.stamp, n.file_count, n.total_bytes, n.files, n.placeholders) for n in tree.iter_nodes()],
+            [(n.path, n.digest, n.stamp, n.file_count, n.total_bytes, n.files, n.placeholders)
+             for n in expected.iter_nodes()],
+        )
+        self.assertEqual(index['metadata']['root_stamp'], expected.stamp)
+        self.assertEqual(index['dirs']['a/b']['tree_stamp'], expected.find('a/b').stamp)
+
+
+if __name__ == '__main__':
+    unittest.main()